@@ -0,0 +1,63 @@
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import orjson
+
+from llmMetrics import llm_metrics
+
+# Server-sent-event streaming of chatbot answers. The SQL step runs first and its rows go out
+# as a `table` event, so the UI can render them while the prose is still being generated; the
+# answer follows as `token` events and a closing `done` event carries the request's timings.
+# Time to first byte (the table) is tracked separately from time to first token and total time.
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+
+# Per endpoint: "<endpoint>.ttfb", "<endpoint>.firstToken" and "<endpoint>.total" latencies.
+stream_stats = llm_metrics.feature("streams")
+
+
+async def stream_answer(
+    endpoint: str,
+    get_rows: Callable[[], Awaitable[Any]],
+    stream_tokens: Callable[[Any], AsyncIterator[str]],
+) -> AsyncIterator[bytes]:
+    """
+    SSE body for one chatbot answer. `get_rows` runs the SQL step and returns the rows, or the
+    gatekeeper's reply as a string; `stream_tokens` turns the rows into a stream of markdown.
+    """
+    started = time.perf_counter()
+    ttfb_ms = first_token_ms = None
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    try:
+        rows = await get_rows()
+        ttfb_ms = elapsed_ms()
+        if isinstance(rows, str):
+            # Rejected by the gatekeeper: its reply is the whole answer and there is no table.
+            yield sse_event("token", {"content": rows})
+        else:
+            yield sse_event("table", {"content": rows})
+            async for token in stream_tokens(rows):
+                if first_token_ms is None:
+                    first_token_ms = elapsed_ms()
+                yield sse_event("token", {"content": token})
+    except Exception as e:
+        print(f"⚠️ {endpoint} stream failed: {e}")
+        yield sse_event("error", {"detail": f"An internal error occurred: {e}"})
+        if ttfb_ms is None:
+            ttfb_ms = elapsed_ms()
+
+    total_ms = elapsed_ms()
+    stream_stats.observe(f"{endpoint}.ttfb", ttfb_ms)
+    if first_token_ms is not None:
+        stream_stats.observe(f"{endpoint}.firstToken", first_token_ms)
+    stream_stats.observe(f"{endpoint}.total", total_ms)
+    print(f"⏱️ {endpoint}: first byte {ttfb_ms} ms, first token {first_token_ms} ms, total {total_ms} ms")
+    yield sse_event("done", {"ttfbMs": ttfb_ms, "firstTokenMs": first_token_ms, "totalMs": total_ms})
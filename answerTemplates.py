@@ -0,0 +1,120 @@
+import re
+from typing import Any, Optional
+
+from llmMetrics import llm_metrics
+
+# Markdown answers for results that don't need an LLM to explain them: no rows, a single
+# value ("how many claims were rejected in July 2025?"), a single record, or a handful of
+# rows. The wording is picked from the aggregate the question asks for (count, total,
+# average, highest/lowest). Questions asking for an explanation always go to the LLM.
+
+TINY_RESULT_ROWS = 5
+TINY_RESULT_COLUMNS = 4
+
+# Checked in order; the first match names the aggregate.
+AGGREGATE_PATTERNS = [
+    ("average", r"\b(average|avg|mean|typical)\b"),
+    ("count", r"\b(how many|count|number of)\b"),
+    ("total", r"\b(total|sum|overall|combined|spent|spend|cost of all)\b"),
+    ("highest", r"\b(highest|most|max|maximum|top|largest|biggest|greatest)\b"),
+    ("lowest", r"\b(lowest|least|min|minimum|fewest|smallest|bottom)\b"),
+]
+SCALAR_TEMPLATES = {
+    "count": "The count is **{value}**.",
+    "total": "The total is **{value}**.",
+    "average": "The average is **{value}**.",
+    "highest": "The highest value is **{value}**.",
+    "lowest": "The lowest value is **{value}**.",
+    None: "The answer is **{value}**.",
+}
+# Questions that want interpretation rather than a number.
+NEEDS_EXPLANATION = re.compile(
+    r"\b(why|explain|analy[sz]e|analysis|insight|trend|compare|comparison|recommend|summari[sz]e|pattern|reason)",
+    re.IGNORECASE,
+)
+MONEY_COLUMN = re.compile(r"(_AM$|AMOUNT|COST|PRICE|USD|SPEND|REVENUE)", re.IGNORECASE)
+# Codes, identifiers, years and dates are shown as stored: dealer 40300, not 40,300.
+RAW_COLUMN = re.compile(r"(_CD$|_ID$|^ID$|CODE|_NO$|VIN|YEAR|_YR$|MONTH|DATE|_DT$|DAY$)", re.IGNORECASE)
+# Unaliased aggregates come back named after the expression, e.g. "MAX(CLM_EST_AM)".
+AGGREGATE_COLUMN = re.compile(r"\s*(\w+)\s*\(\s*(?:DISTINCT\s+)?(.*?)\s*(?:,\s*\d+\s*)?\)\s*", re.IGNORECASE)
+AGGREGATE_LABELS = {"count": "Count", "sum": "Total", "total": "Total", "avg": "Average", "max": "Max", "min": "Min"}
+
+
+def aggregate_type(question: str) -> Optional[str]:
+    for name, pattern in AGGREGATE_PATTERNS:
+        if re.search(pattern, question or "", flags=re.IGNORECASE):
+            return name
+    return None
+
+
+def _unwrap(column: str) -> tuple:
+    """(outermost aggregate or None, the column inside any function calls)."""
+    aggregate, inner = None, str(column)
+    while (match := AGGREGATE_COLUMN.fullmatch(inner)) is not None:
+        function = match.group(1).lower()
+        if aggregate is None and function in AGGREGATE_LABELS:
+            aggregate = function
+        inner = match.group(2)
+    return aggregate, inner
+
+
+def _label(column: str) -> str:
+    aggregate, inner = _unwrap(column)
+    words = re.sub(r"[^\w-]+|_", " ", inner).strip()
+    label = " ".join(part for part in (AGGREGATE_LABELS.get(aggregate, ""), words) if part).title()
+    return re.sub(r"([*|`\\])", r"\\\1", label or str(column))
+
+
+def _format(column: str, value: Any) -> str:
+    if value is None:
+        return "—"
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return str(value).replace("|", "\\|")
+    aggregate, inner = _unwrap(column)
+    if aggregate != "count":
+        if RAW_COLUMN.search(inner):
+            return str(value)
+        if MONEY_COLUMN.search(inner):
+            return f"${value:,.2f}"
+    if isinstance(value, float) and not value.is_integer():
+        return f"{value:,.2f}"
+    return f"{value:,.0f}"
+
+
+def render_answer(question: str, rows: Any) -> Optional[str]:
+    """Markdown answer for an empty, single-value or tiny result; None if it needs the LLM."""
+    if not isinstance(rows, list) or NEEDS_EXPLANATION.search(question or ""):
+        return None
+    if not rows:
+        return "No matching records were found for this question."
+    if not isinstance(rows[0], dict) or len(rows) > TINY_RESULT_ROWS or len(rows[0]) > TINY_RESULT_COLUMNS:
+        return None
+
+    kind = aggregate_type(question)
+    columns = list(rows[0].keys())
+    if len(rows) == 1 and len(columns) == 1:
+        column = columns[0]
+        answer = SCALAR_TEMPLATES[kind].format(value=_format(column, rows[0][column]))
+        return f"{answer}\n\n*{_label(column)}*"
+
+    if len(rows) == 1:
+        lines = ["Here is the matching record:", ""]
+        lines += [f"- **{_label(column)}**: {_format(column, rows[0][column])}" for column in columns]
+        return "\n".join(lines)
+
+    lines = []
+    if kind in ("highest", "lowest"):
+        # SQL for these questions orders the rows, so the first one is the answer.
+        first = rows[0]
+        lines += [f"The {kind} is **{_format(columns[0], first[columns[0]])}**"
+                  + (f" with **{_format(columns[-1], first[columns[-1]])}** ({_label(columns[-1])})." if len(columns) > 1 else "."),
+                  ""]
+    lines += [f"{len(rows)} results:", "",
+              "| " + " | ".join(_label(column) for column in columns) + " |",
+              "|" + "---|" * len(columns)]
+    lines += ["| " + " | ".join(_format(column, row.get(column)) for column in columns) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+# Chatbot answers rendered from templates (LLM calls avoided) vs written by the LLM.
+answer_stats = llm_metrics.feature("answers")
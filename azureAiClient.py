@@ -1,18 +1,254 @@
+import asyncio
+import hashlib
 import json
 import os
-from typing import Optional, Any, Dict
-from openai import AzureOpenAI
+import random
+import time
+from typing import AsyncIterator, Optional, Any, Dict
+import httpx
+import openai
+from openai import AsyncAzureOpenAI, AzureOpenAI
 from dotenv import load_dotenv
 import pandas as pd
-import tiktoken
+from contextPacker import count_tokens, pack_rows
+from llmMetrics import track_llm_call
 from dto import ChartInput, WarrantyClaimData
 from dto import OutputResponse,ResponseType
 
+# The settings below may come from .env, so it is loaded before any of them are read.
+load_dotenv()
 
 # Import your Pydantic model from your codebase
 # from your_package.models import WarrantyClaimData
 # For type hints only (optional), uncomment the import above or replace with your path.
 
+# Settings for the async client shared by the API. Timeouts are per call; retries use
+# full-jitter exponential backoff on throttling (429), 5xx and transport errors, and each
+# deployment gets its own concurrency cap so one busy model cannot starve the others.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 0.5))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 8))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+LLM_MAX_CONCURRENCY_PER_DEPLOYMENT = int(os.getenv("LLM_MAX_CONCURRENCY_PER_DEPLOYMENT", 8))
+
+def mock_llm_url() -> Optional[str]:
+    """
+    MOCK_LLM_URL points every model client (Azure and OpenAI) at the local stand-in from
+    mockLlmServer.py instead of the real services, e.g. MOCK_LLM_URL=http://127.0.0.1:9100.
+    Read when a client is built, so it can be set in .env or the environment.
+    """
+    return os.getenv("MOCK_LLM_URL") or None
+
+
+def openai_base_url() -> Optional[str]:
+    """base_url for OpenAI() clients: the mock server when enabled, else the SDK's default."""
+    url = mock_llm_url()
+    return f"{url.rstrip('/')}/v1" if url else None
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than a Retry-After the service sent."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+# ---------- Request builders and parsers shared by the sync and async clients ----------
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "gpt-4o")
+EXTRACTION_SYSTEM_PROMPT = (
+    "You are an expert AI assistant specializing in extracting structured information "
+    "from vehicle warranty claim documents. Strictly extract data that conforms to the "
+    "WarrantyClaimData model, including the vehicle's PurchasingYear if available. "
+    "Do not hallucinate or infer missing data. If a field is not present, omit it."
+)
+EXTRACTION_USER_PROMPT = "Extract all warranty claim data from the attached image into the provided tool's schema."
+
+
+def extraction_messages(base64_image_data: str, mime_type: str) -> list:
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": EXTRACTION_USER_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image_data}"}}
+            ]
+        }
+    ]
+
+
+EXTRACTION_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "claim_data_extractor",
+        "parameters": WarrantyClaimData.model_json_schema(),
+    },
+}]
+
+
+# Changes whenever the prompts or the WarrantyClaimData schema change; keys cached extractions.
+EXTRACTION_PROMPT_VERSION = hashlib.sha256(
+    json.dumps([EXTRACTION_SYSTEM_PROMPT, EXTRACTION_USER_PROMPT, EXTRACTION_TOOLS], sort_keys=True).encode()
+).hexdigest()[:16]
+
+
+def parse_extraction(response) -> WarrantyClaimData:
+    # Access the tool call arguments (JSON string)
+    tool_calls = response.choices[0].message.tool_calls
+    if not tool_calls or not tool_calls[0].function or not tool_calls[0].function.arguments:
+        raise ValueError("No function tool call with arguments found in the response.")
+
+    args_json = tool_calls[0].function.arguments
+    # Validate with your Pydantic model
+    return WarrantyClaimData.model_validate_json(args_json)
+
+
+def chart_messages(prompt: str, data) -> list:
+    # Rows or DataFrame as CSV, or a statistical summary when that would exceed the token budget
+    df_str = pack_rows(data, label="chart").text
+
+    system_msg = (
+        "You are a JavaScript Chart.js expert. Read the user prompt and generate Chart.js code. "
+        "If the user specifies a chart type, use it; otherwise, choose the most suitable chart based on the data. "
+        "Return your response strictly as a JSON object matching the ChartInput schema. "
+        "Create a professional, interactive Chart.js chart using a modern and visually distinct color scheme. "
+        "Ensure it is responsive, easy to interpret, and includes useful features like legends, tooltips, and hover effects. "
+        "The chart should be polished and presentation-ready."
+    )
+
+    return [
+        {"role": "system", "content": system_msg},
+        {
+            "role": "user",
+            "content": f"User prompt: {prompt}\n\nHere is the data:\n{df_str}\n",
+        },
+    ]
+
+
+CHART_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "chart_input_builder",
+            "description": "Return a JSON object matching the ChartInput schema for Chart.js rendering.",
+            "parameters": ChartInput.model_json_schema(),
+        },
+    }
+]
+
+
+def parse_chart(response) -> OutputResponse:
+    choice = response.choices[0].message
+
+    # Primary path: tool call with JSON arguments
+    if getattr(choice, "tool_calls", None):
+        args_json = choice.tool_calls[0].function.arguments
+        chart_obj = ChartInput.model_validate_json(args_json)
+    else:
+        # Fallback path: try to parse message content as JSON (in case model didn't do tool-calling)
+        content = (choice.content or "").strip()
+        if not content:
+            raise ValueError("Empty response content and no tool_calls present.")
+        try:
+            chart_obj = ChartInput.model_validate_json(content)
+        except Exception:
+            # If content isn't raw JSON, try to extract a JSON block
+            start = content.find("{")
+            end = content.rfind("}")
+            if start == -1 or end == -1 or end < start:
+                raise ValueError("No JSON object found in response content.")
+            snippet = content[start : end + 1]
+            chart_obj = ChartInput.model_validate_json(snippet)
+
+    # If your OutputResponse expects a string, convert the Pydantic model
+    generated_code = chart_obj.to_string() if hasattr(chart_obj, "to_string") else chart_obj.model_dump_json()
+
+    # Print (optional debug)
+    print("Generated Chart.js code:", generated_code)
+
+    return OutputResponse(
+        type=ResponseType.chart,
+        content=generated_code,
+    )
+
+
+CHART_FAILED_RESPONSE = OutputResponse(
+    type=ResponseType.language,
+    content="Failed to generate chart configuration. Please refine the prompt or try again.",
+)
+
+
+GATEKEEPER_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "classify_prompt",
+            "description": (
+                "Decide if the user's message is a valid SQLite data/SQL question. "
+                "If valid, set isValidQuestion=true and reply=\"\". "
+                "If not valid, set isValidQuestion=false and provide a short reply."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "isValidQuestion": {
+                        "type": "boolean",
+                        "description": "True if the user asks a data/SQL question; otherwise false."
+                    },
+                    "reply": {
+                        "type": "string",
+                        "description": "Short friendly reply for non-questions. Empty when valid."
+                    }
+                },
+                "required": ["isValidQuestion", "reply"],
+                "additionalProperties": False
+            }
+        }
+    }
+]
+
+
+def gatekeeper_messages(prompt: str) -> list:
+    system = (
+        "You are a strict gatekeeper for a SQLite Query Assistant. "
+        "Determine if the user's message is a valid data/SQL question about the database. "
+        "Valid examples: 'total claims this year', 'list claims between two dates', "
+        "'group by model and count'. Invalid: greetings, thanks, small talk, unrelated text. "
+        "ALWAYS call the function 'classify_prompt' exactly once. "
+        "If valid: isValidQuestion=true and reply=\"\". "
+        "If not valid: isValidQuestion=false with a brief, helpful reply. "
+        "Do NOT answer the question yourself."
+    )
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt or ""},
+    ]
+
+
+def parse_gatekeeper(resp) -> tuple[bool, str]:
+    tool_calls = resp.choices[0].message.tool_calls
+    if not tool_calls:
+        # Defensive fallback
+        return False, "I can help with SQL/data questions. Try: 'count claims by month for 2025'."
+
+    args = json.loads(tool_calls[0].function.arguments or "{}")
+    return bool(args.get("isValidQuestion", False)), (args.get("reply") or "")
+
 
 class AzureAiClient:
     def __init__(self):
@@ -20,7 +256,7 @@ class AzureAiClient:
         load_dotenv()
 
         # Configuration from .env
-        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.endpoint = mock_llm_url() or os.getenv("AZURE_OPENAI_ENDPOINT")
         self.model_name = os.getenv("MODEL_NAME")       # optional / informational
         self.deployment = os.getenv("DEPLOYMENT")       # Azure deployment ID (must support vision + tools, e.g., gpt-4o)
         self.subscription_key = os.getenv("AZURE_OPENAI_KEY")
@@ -36,8 +272,7 @@ class AzureAiClient:
     # ---------- Utility ----------
     @staticmethod
     def estimate_token_count(prompt: str) -> int:
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(prompt))
+        return count_tokens(prompt)
 
     # ---------- Simple helpers ----------
     def get_gpt_response(self, prompt: str) -> Optional[str]:
@@ -89,47 +324,14 @@ class AzureAiClient:
             WarrantyClaimData instance on success.
             Raises Exception on failure.
         """
-        system_prompt = (
-            "You are an expert AI assistant specializing in extracting structured information "
-            "from vehicle warranty claim documents. Strictly extract data that conforms to the "
-            "WarrantyClaimData model, including the vehicle's PurchasingYear if available. "
-            "Do not hallucinate or infer missing data. If a field is not present, omit it."
-        )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Extract all warranty claim data from the attached image into the provided tool's schema."},
-                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image_data}"}}
-                ]
-            }
-        ]
-
         try:
             response = self.client.chat.completions.create(
-                model="gpt-4o",   # your Azure deployment (e.g., gpt-4o)
-                messages=messages,
-                tools=[{
-                    "type": "function",
-                    "function": {
-                        "name": "claim_data_extractor",
-                        "parameters": WarrantyClaimData.model_json_schema(),
-                    },
-                }],
+                model=EXTRACTION_MODEL,   # your Azure deployment (e.g., gpt-4o)
+                messages=extraction_messages(base64_image_data, mime_type),
+                tools=EXTRACTION_TOOLS,
                 tool_choice={"type": "function", "function": {"name": "claim_data_extractor"}},
             )
-
-            # Access the tool call arguments (JSON string)
-            tool_calls = response.choices[0].message.tool_calls
-            if not tool_calls or not tool_calls[0].function or not tool_calls[0].function.arguments:
-                raise ValueError("No function tool call with arguments found in the response.")
-
-            args_json = tool_calls[0].function.arguments
-            # Validate with your Pydantic model
-            extracted = WarrantyClaimData.model_validate_json(args_json)
-            return extracted
+            return parse_extraction(response)
 
         except Exception as e:
             # Bubble up so your FastAPI handler can map to HTTPException if needed
@@ -146,26 +348,7 @@ class AzureAiClient:
         Forces structured JSON via function-calling that matches ChartInput schema.
         Returns an OutputResponse with type=ResponseType.chart on success.
         """
-
-        # Convert DataFrame to a compact, readable string for LLM context
-        df_str = '\n'.join(data)
-
-        system_msg = (
-            "You are a JavaScript Chart.js expert. Read the user prompt and generate Chart.js code. "
-            "If the user specifies a chart type, use it; otherwise, choose the most suitable chart based on the data. "
-            "Return your response strictly as a JSON object matching the ChartInput schema. "
-            "Create a professional, interactive Chart.js chart using a modern and visually distinct color scheme. "
-            "Ensure it is responsive, easy to interpret, and includes useful features like legends, tooltips, and hover effects. "
-            "The chart should be polished and presentation-ready."
-        )
-
-        messages = [
-            {"role": "system", "content": system_msg},
-            {
-                "role": "user",
-                "content": f"User prompt: {prompt}\n\nHere is the data:\n{df_str}\n",
-            },
-        ]
+        messages = chart_messages(prompt, data)
 
         try:
             # Use function-calling to enforce the ChartInput JSON shape
@@ -174,59 +357,15 @@ class AzureAiClient:
             response = self.client.chat.completions.create(
                 model=self.deployment,  # your Azure deployment (e.g., gpt-4o or gpt-4o-mini)
                 messages=messages,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "chart_input_builder",
-                            "description": "Return a JSON object matching the ChartInput schema for Chart.js rendering.",
-                            "parameters": ChartInput.model_json_schema(),
-                        },
-                    }
-                ],
+                tools=CHART_TOOLS,
                 tool_choice={"type": "function", "function": {"name": "chart_input_builder"}}
             )
-
-            choice = response.choices[0].message
-
-            # Primary path: tool call with JSON arguments
-            if getattr(choice, "tool_calls", None):
-                args_json = choice.tool_calls[0].function.arguments
-                chart_obj = ChartInput.model_validate_json(args_json)
-            else:
-                # Fallback path: try to parse message content as JSON (in case model didn't do tool-calling)
-                content = (choice.content or "").strip()
-                if not content:
-                    raise ValueError("Empty response content and no tool_calls present.")
-                try:
-                    chart_obj = ChartInput.model_validate_json(content)
-                except Exception:
-                    # If content isn't raw JSON, try to extract a JSON block
-                    start = content.find("{")
-                    end = content.rfind("}")
-                    if start == -1 or end == -1 or end < start:
-                        raise ValueError("No JSON object found in response content.")
-                    snippet = content[start : end + 1]
-                    chart_obj = ChartInput.model_validate_json(snippet)
-
-            # If your OutputResponse expects a string, convert the Pydantic model
-            generated_code = chart_obj.to_string() if hasattr(chart_obj, "to_string") else chart_obj.model_dump_json()
-
-            # Print (optional debug)
-            print("Generated Chart.js code:", generated_code)
-
-            return OutputResponse(
-                type=ResponseType.chart,
-                content=generated_code,
-            )
+            return parse_chart(response)
 
         except Exception as e:
             print(f"Error generating Chart.js code: {e}")
             # Safe fallback: return a message (you can embed a minimal Chart.js config if desired)
-            return OutputResponse(
-                type=ResponseType.language,
-                content="Failed to generate chart configuration. Please refine the prompt or try again.",
-            )
+            return CHART_FAILED_RESPONSE
 
         # ---------- NEW: Gatekeep prompts via function-calling ----------
     
@@ -238,64 +377,167 @@ class AzureAiClient:
         - If isValidQuestion is False: reply_text contains a short friendly message; STOP further processing.
         - If isValidQuestion is True: reply_text is "", proceed with your pipeline.
         """
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "classify_prompt",
-                    "description": (
-                        "Decide if the user's message is a valid SQLite data/SQL question. "
-                        "If valid, set isValidQuestion=true and reply=\"\". "
-                        "If not valid, set isValidQuestion=false and provide a short reply."
-                    ),
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "isValidQuestion": {
-                                "type": "boolean",
-                                "description": "True if the user asks a data/SQL question; otherwise false."
-                            },
-                            "reply": {
-                                "type": "string",
-                                "description": "Short friendly reply for non-questions. Empty when valid."
-                            }
-                        },
-                        "required": ["isValidQuestion", "reply"],
-                        "additionalProperties": False
-                    }
-                }
-            }
-        ]
-
-        system = (
-            "You are a strict gatekeeper for a SQLite Query Assistant. "
-            "Determine if the user's message is a valid data/SQL question about the database. "
-            "Valid examples: 'total claims this year', 'list claims between two dates', "
-            "'group by model and count'. Invalid: greetings, thanks, small talk, unrelated text. "
-            "ALWAYS call the function 'classify_prompt' exactly once. "
-            "If valid: isValidQuestion=true and reply=\"\". "
-            "If not valid: isValidQuestion=false with a brief, helpful reply. "
-            "Do NOT answer the question yourself."
-        )
-
         resp = self.client.chat.completions.create(
             model=model or self.deployment,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": prompt or ""},
-            ],
-            tools=tools,
+            messages=gatekeeper_messages(prompt),
+            tools=GATEKEEPER_TOOLS,
             tool_choice={"type": "function", "function": {"name": "classify_prompt"}},
             temperature=0
         )
+        return parse_gatekeeper(resp)
+
+
+class AsyncAzureAiClient:
+    """
+    Non-blocking counterpart of AzureAiClient for the API handlers. All instances obtained
+    through shared() use one HTTP connection pool; calls go through _create, which applies
+    the per-call timeout, the per-deployment concurrency cap and the retry policy.
+    """
 
-        tool_calls = resp.choices[0].message.tool_calls
-        if not tool_calls:
-            # Defensive fallback
-            return False, "I can help with SQL/data questions. Try: 'count claims by month for 2025'."
+    _shared: Optional["AsyncAzureAiClient"] = None
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        load_dotenv()
+
+        self.endpoint = mock_llm_url() or os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.deployment = os.getenv("DEPLOYMENT")
+        self.subscription_key = os.getenv("AZURE_OPENAI_KEY")
+        self.api_version = os.getenv("API_VERSION")
 
-        args = json.loads(tool_calls[0].function.arguments or "{}")
-        return bool(args.get("isValidQuestion", False)), (args.get("reply") or "")
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        )
+        # Retries are handled in _create so they respect the concurrency cap and jitter.
+        self.client = AsyncAzureOpenAI(
+            api_version=self.api_version,
+            azure_endpoint=self.endpoint,
+            api_key=self.subscription_key,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def shared(cls) -> "AsyncAzureAiClient":
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+    def _semaphore(self, deployment: str) -> asyncio.Semaphore:
+        if deployment not in self._semaphores:
+            self._semaphores[deployment] = asyncio.Semaphore(LLM_MAX_CONCURRENCY_PER_DEPLOYMENT)
+        return self._semaphores[deployment]
+
+    async def _create(self, model: str, timeout: float = LLM_TIMEOUT_SECONDS, operation: str = "chat", **kwargs):
+        with track_llm_call(operation, model) as call:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    queued = time.perf_counter()
+                    async with self._semaphore(model):
+                        call.queue_seconds += time.perf_counter() - queued
+                        response = await self.client.chat.completions.create(model=model, timeout=timeout, **kwargs)
+                    call.add_usage(response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    call.retries += 1
+                    delay = retry_delay(attempt, e)
+                    print(f"⚠️ {model} call failed ({type(e).__name__}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                    # Sleep outside the semaphore so waiting retries don't hold a slot.
+                    await asyncio.sleep(delay)
+
+    async def send_system_and_user_message(self, messeges, model="gpt-4o-mini", temperature=0.3, timeout: float = LLM_TIMEOUT_SECONDS,
+                                           operation: str = "chat") -> Optional[str]:
+        """Send system + user together (no max_tokens)."""
+        try:
+            response = await self._create(model, timeout=timeout, operation=operation, messages=messeges)
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+    async def stream_system_and_user_message(self, messeges, model="gpt-4o-mini", timeout: float = LLM_TIMEOUT_SECONDS,
+                                             operation: str = "chat") -> AsyncIterator[str]:
+        """Like send_system_and_user_message, but yields the text as it is generated."""
+        with track_llm_call(operation, model) as call:
+            started = time.perf_counter()
+            semaphore = self._semaphore(model)
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                queued = time.perf_counter()
+                await semaphore.acquire()
+                call.queue_seconds += time.perf_counter() - queued
+                try:
+                    # The last chunk carries the token usage.
+                    stream = await self.client.chat.completions.create(model=model, timeout=timeout, messages=messeges,
+                                                                       stream=True, stream_options={"include_usage": True})
+                    break
+                except BaseException as e:
+                    semaphore.release()
+                    if not isinstance(e, RETRYABLE_ERRORS) or attempt == LLM_MAX_RETRIES:
+                        raise
+                    call.retries += 1
+                    delay = retry_delay(attempt, e)
+                    print(f"⚠️ {model} stream failed ({type(e).__name__}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+                    # Sleep outside the semaphore so waiting retries don't hold a slot.
+                    await asyncio.sleep(delay)
+
+            # Once open, the slot is held for the whole stream, since the connection is busy until it ends.
+            try:
+                async for chunk in stream:
+                    call.add_usage(getattr(chunk, "usage", None))
+                    # Azure sends content-filter chunks with no choices.
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if call.first_token_seconds is None:
+                            call.first_token_seconds = time.perf_counter() - started
+                        yield chunk.choices[0].delta.content
+            finally:
+                semaphore.release()
+
+    async def extract_warranty_claim_from_base64(self, base64_image_data: str, mime_type: str, timeout: float = LLM_TIMEOUT_SECONDS) -> WarrantyClaimData:
+        try:
+            response = await self._create(
+                EXTRACTION_MODEL,
+                timeout=timeout,
+                operation="vision",
+                messages=extraction_messages(base64_image_data, mime_type),
+                tools=EXTRACTION_TOOLS,
+                tool_choice={"type": "function", "function": {"name": "claim_data_extractor"}},
+            )
+            return parse_extraction(response)
+        except Exception as e:
+            raise RuntimeError(f"Azure OpenAI extraction error: {e}") from e
+
+    async def generate_chart_js_code(self, prompt: str, data, timeout: float = LLM_TIMEOUT_SECONDS) -> OutputResponse:
+        try:
+            response = await self._create(
+                self.deployment,
+                timeout=timeout,
+                operation="chart",
+                messages=chart_messages(prompt, data),
+                tools=CHART_TOOLS,
+                tool_choice={"type": "function", "function": {"name": "chart_input_builder"}},
+            )
+            return parse_chart(response)
+        except Exception as e:
+            print(f"Error generating Chart.js code: {e}")
+            return CHART_FAILED_RESPONSE
+
+    async def gatekeep_question(self, prompt: str, model: Optional[str] = None, timeout: float = LLM_TIMEOUT_SECONDS) -> tuple[bool, str]:
+        resp = await self._create(
+            model or self.deployment,
+            timeout=timeout,
+            operation="gatekeeper",
+            messages=gatekeeper_messages(prompt),
+            tools=GATEKEEPER_TOOLS,
+            tool_choice={"type": "function", "function": {"name": "classify_prompt"}},
+            temperature=0,
+        )
+        return parse_gatekeeper(resp)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,260 @@
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dto import ChartInput, OutputResponse, ResponseType
+from llmMetrics import llm_metrics
+
+# Deterministic Chart.js configs for the result shapes most questions produce, so
+# /ai-data-provider/ only needs the LLM for the unusual ones:
+#   - category-count: one label column and one or more measures   -> bar (or pie/doughnut)
+#   - time-series: a date-like column and one or more measures     -> line
+#   - category x series: two label columns and one measure         -> grouped bar / multi-line
+# The output is the same ChartInput JSON and styling the LLM is asked to produce.
+
+MAX_CATEGORIES = 100
+MAX_SERIES = 12
+MAX_POINTS = 1000
+
+PALETTE = [
+    (54, 162, 235), (255, 99, 132), (75, 192, 192), (255, 159, 64), (153, 102, 255),
+    (255, 205, 86), (201, 203, 207), (0, 123, 255), (40, 167, 69), (220, 53, 69),
+    (23, 162, 184), (108, 117, 125),
+]
+
+DATE_VALUE = re.compile(r"^\d{4}(-\d{2}(-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?)?)?$")
+DATE_NAME = re.compile(r"(date|day|week|month|year|period|_dt$)", re.IGNORECASE)
+# Chart types the prompt can ask for that this builder renders; any other named type goes to the LLM.
+REQUESTED_TYPES = {"pie": "pie", "doughnut": "doughnut", "donut": "doughnut", "line": "line",
+                   "trend": "line", "bar": "bar", "column": "bar", "horizontal": "horizontalBar"}
+UNSUPPORTED_TYPES = ("radar", "scatter", "bubble", "polar", "area", "stacked", "heatmap", "histogram")
+
+
+def _rgba(index: int, alpha: float) -> str:
+    r, g, b = PALETTE[index % len(PALETTE)]
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def _humanize(column: str) -> str:
+    return re.sub(r"[_\s]+", " ", str(column)).strip().title()
+
+
+def _title(prompt: str) -> str:
+    title = re.sub(r"\s+", " ", prompt or "").strip().rstrip("?.!")
+    title = title[:1].upper() + title[1:]
+    return title if len(title) <= 80 else title[:77] + "..."
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_date_column(name: str, values: List[Any]) -> bool:
+    present = [value for value in values if value is not None]
+    if not present:
+        return False
+    if all(isinstance(value, str) and DATE_VALUE.match(value) for value in present):
+        return True
+    # Years come back as integers.
+    return bool(DATE_NAME.search(str(name))) and all(
+        isinstance(value, int) and 1900 <= value <= 2100 for value in present
+    )
+
+
+def _requested_type(prompt: str) -> Optional[str]:
+    words = (prompt or "").lower()
+    if any(name in words for name in UNSUPPORTED_TYPES):
+        return "unsupported"
+    for word, chart_type in REQUESTED_TYPES.items():
+        if re.search(rf"\b{word}\b", words):
+            return chart_type
+    return None
+
+
+def _options(x_title: str, y_title: str, show_legend: bool, horizontal: bool = False, axes: bool = True,
+             rotate_labels: bool = False) -> dict:
+    options = {
+        "responsive": True,
+        "maintainAspectRatio": False,
+        "interaction": {"mode": "index", "intersect": False},
+        "plugins": {
+            "legend": {"display": show_legend, "position": "top"},
+            "tooltip": {"enabled": True, "mode": "index", "intersect": False},
+        },
+    }
+    if axes:
+        value_axis, label_axis = ("x", "y") if horizontal else ("y", "x")
+        options["scales"] = {
+            label_axis: {"title": {"display": True, "text": x_title}},
+            value_axis: {"beginAtZero": True, "title": {"display": True, "text": y_title}},
+        }
+        if rotate_labels and not horizontal:
+            options["scales"][label_axis]["ticks"] = {"maxRotation": 45, "minRotation": 45}
+        if horizontal:
+            options["indexAxis"] = "y"
+    return options
+
+
+def _dataset(label: str, data: list, index: int, chart_type: str, labels_count: int, single: bool) -> dict:
+    if chart_type == "line":
+        return {
+            "label": label, "data": data, "fill": False, "tension": 0.3,
+            "borderColor": _rgba(index, 1), "backgroundColor": _rgba(index, 0.2),
+            "pointRadius": 3 if labels_count <= 60 else 0, "pointHoverRadius": 6, "borderWidth": 2,
+        }
+    if chart_type in ("pie", "doughnut"):
+        return {
+            "label": label, "data": data,
+            "backgroundColor": [_rgba(i, 0.7) for i in range(labels_count)],
+            "borderColor": [_rgba(i, 1) for i in range(labels_count)],
+            "borderWidth": 1, "hoverOffset": 8,
+        }
+    if single:
+        # One series: a colour per bar, as in the charts the LLM produces.
+        return {
+            "label": label, "data": data,
+            "backgroundColor": [_rgba(i, 0.6) for i in range(labels_count)],
+            "borderColor": [_rgba(i, 1) for i in range(labels_count)],
+            "borderWidth": 1,
+        }
+    return {
+        "label": label, "data": data,
+        "backgroundColor": _rgba(index, 0.6), "borderColor": _rgba(index, 1),
+        "borderWidth": 1, "hoverBackgroundColor": _rgba(index, 0.8),
+    }
+
+
+def _config(chart_type: str, labels: list, datasets: List[tuple], x_title: str, y_title: str) -> dict:
+    horizontal = chart_type == "horizontalBar"
+    js_type = "bar" if horizontal else chart_type
+    return {
+        "type": js_type,
+        "data": {
+            "labels": labels,
+            "datasets": [_dataset(label, data, i, js_type, len(labels), single=len(datasets) == 1)
+                         for i, (label, data) in enumerate(datasets)],
+        },
+        "options": _options(x_title, y_title, show_legend=len(datasets) > 1 or js_type in ("pie", "doughnut"),
+                            horizontal=horizontal, axes=js_type not in ("pie", "doughnut"),
+                            rotate_labels=len(labels) > 8),
+    }
+
+
+def build_chart(prompt: str, rows: Any) -> Optional[OutputResponse]:
+    """A chart for the result if its shape is one of the common ones; None to fall back to the LLM."""
+    if not isinstance(rows, list) or not rows or not isinstance(rows[0], dict) or len(rows) > MAX_POINTS:
+        return None
+    requested = _requested_type(prompt)
+    if requested == "unsupported":
+        return None
+
+    columns = list(rows[0].keys())
+    values = {column: [row.get(column) for row in rows] for column in columns}
+    measures = [c for c in columns if all(_is_number(v) or v is None for v in values[c])
+                and any(_is_number(v) for v in values[c]) and not _is_date_column(c, values[c])]
+    dimensions = [c for c in columns if c not in measures]
+    date_columns = [c for c in dimensions if _is_date_column(c, values[c])]
+
+    if len(dimensions) == 1 and measures:
+        label_column = dimensions[0]
+        # A result with a date column but no order would draw a zigzag; sort it.
+        if label_column in date_columns:
+            rows = sorted(rows, key=lambda row: str(row.get(label_column)))
+            chart_type = requested if requested in ("bar", "line") else "line"
+        else:
+            if len(rows) > MAX_CATEGORIES:
+                return None
+            chart_type = requested or "bar"
+            if chart_type in ("pie", "doughnut") and len(measures) > 1:
+                return None
+        labels = ["(blank)" if row.get(label_column) is None else str(row.get(label_column)) for row in rows]
+        datasets = [(_humanize(m), [row.get(m) for row in rows]) for m in measures]
+        y_title = _humanize(measures[0]) if len(measures) == 1 else "Value"
+        config = _config(chart_type, labels, datasets, _humanize(label_column), y_title)
+
+    elif len(dimensions) == 2 and len(measures) == 1:
+        # Put dates (or else the column with more distinct values) on the x axis; the other becomes series.
+        x_column, series_column = dimensions
+        if series_column in date_columns or (
+            x_column not in date_columns and len(set(values[series_column])) > len(set(values[x_column]))
+        ):
+            x_column, series_column = series_column, x_column
+        labels = sorted({str(v) for v in values[x_column]}) if x_column in date_columns \
+            else list(dict.fromkeys(str(v) for v in values[x_column]))
+        series = list(dict.fromkeys(str(v) for v in values[series_column]))
+        if len(series) > MAX_SERIES or len(labels) > MAX_POINTS or (x_column not in date_columns and len(labels) > MAX_CATEGORIES):
+            return None
+        cells: Dict[tuple, Any] = {(str(row.get(x_column)), str(row.get(series_column))): row.get(measures[0]) for row in rows}
+        datasets = [(name, [cells.get((label, name), 0) for label in labels]) for name in series]
+        default = "line" if x_column in date_columns else "bar"
+        chart_type = requested if requested in ("bar", "line", "horizontalBar") else default
+        config = _config(chart_type, labels, datasets, _humanize(x_column), _humanize(measures[0]))
+
+    else:
+        return None
+
+    chart = ChartInput(title=_title(prompt), config=json.dumps(config))
+    return OutputResponse(type=ResponseType.chart, content=chart.to_string())
+
+
+# How many charts were built locally vs by the LLM, and how long each path took.
+chart_stats = llm_metrics.feature("charts")
+
+
+async def chart_or_llm(prompt: str, rows: Any, llm_chart: Callable[[str, Any], Awaitable[OutputResponse]]) -> OutputResponse:
+    started = time.perf_counter()
+    try:
+        chart = build_chart(prompt, rows)
+    except Exception as e:
+        print(f"⚠️ Local chart builder failed ({e}); using the LLM.")
+        chart = None
+    if chart is not None:
+        chart_stats.count(local=1)
+        chart_stats.observe("local", (time.perf_counter() - started) * 1000)
+        return chart
+    chart = await llm_chart(prompt, rows)
+    chart_stats.count(llm=1)
+    chart_stats.observe("llm", (time.perf_counter() - started) * 1000)
+    return chart
+
+
+if __name__ == "__main__":
+    # Which typical chart questions the builder serves locally, and (with --llm) how long
+    # the LLM takes for the same rows.
+    import asyncio
+    import sqlite3
+    import sys
+
+    from azureAiClient import AsyncAzureAiClient
+
+    conn = sqlite3.connect(next((arg for arg in sys.argv[1:] if not arg.startswith("--")), "warrenty2.db"))
+    conn.row_factory = sqlite3.Row
+    questions = {
+        "Claims by status": "SELECT STS_CD, COUNT(*) AS claims FROM warrenty_table GROUP BY STS_CD",
+        "Claim cost per month": "SELECT substr(RPR_DT, 1, 7) AS month, SUM(CLM_EST_AM) AS cost "
+                                "FROM warrenty_table GROUP BY 1",
+        "Claims per month by status": "SELECT substr(RPR_DT, 1, 7) AS month, STS_CD, COUNT(*) AS claims "
+                                      "FROM warrenty_table GROUP BY 1, 2",
+        "Claim count and cost by car line": "SELECT CRLN_CD, COUNT(*) AS claims, SUM(CLM_EST_AM) AS cost "
+                                            "FROM warrenty_table GROUP BY 1",
+        "Scatter of odometer vs cost": "SELECT RPR_ODO_QT, CLM_EST_AM FROM warrenty_table LIMIT 200",
+    }
+
+    async def main():
+        client = AsyncAzureAiClient.shared()
+        for question, sql in questions.items():
+            rows = [dict(row) for row in conn.execute(sql).fetchall()]
+            started = time.perf_counter()
+            chart = build_chart(question, rows)
+            local_ms = (time.perf_counter() - started) * 1000
+            llm = ""
+            if "--llm" in sys.argv:
+                started = time.perf_counter()
+                await client.generate_chart_js_code(question, rows)
+                llm = f"  llm {(time.perf_counter() - started) * 1000:8.1f} ms"
+            served = f"local {local_ms:6.2f} ms" if chart else "-> llm         "
+            print(f"{question:<36} rows {len(rows):>5}  {served}{llm}")
+        await client.aclose()
+
+    asyncio.run(main())
@@ -1,26 +1,61 @@
 from dto import ChartInput;
 import os
 import json
+import time
 import pandas as pd
 from openai import OpenAI
 from dto import OutputResponse,ResponseType
+from contextPacker import pack_rows
+from pandasSandbox import PandasSandbox, SandboxError
+from azureAiClient import openai_base_url
+from llmMetrics import track_llm_call
+
+CSV_FILE_PATH = './Mazda_Warranty_Synthetic_10000.csv'
+SCHEMA_FILE_PATH = './schema.json'
 
 # Initialize the OpenAI client
 # The client automatically looks for the OPENAI_API_KEY environment variable.
 try:
-    client = OpenAI()
+    client = OpenAI(base_url=openai_base_url())
 except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
     print("Please make sure you have set the OPENAI_API_KEY environment variable.")
     exit()
 
+_dataset: pd.DataFrame = None
+_schema: dict = None
+
+
+def load_dataset() -> pd.DataFrame:
+    """The warranty CSV, read from disk on first use only. Treat it as read-only."""
+    global _dataset
+    if _dataset is None:
+        print(f"Loading data from {CSV_FILE_PATH}...")
+        _dataset = pd.read_csv(CSV_FILE_PATH)
+        print("Data loaded successfully.")
+    return _dataset
+
+
+def load_schema() -> dict:
+    global _schema
+    if _schema is None:
+        with open(SCHEMA_FILE_PATH, 'r') as f:
+            _schema = json.load(f)
+    return _schema
+
+
+# Generated pandas code runs in worker processes that share the dataset, never in the server.
+sandbox = PandasSandbox(load_dataset)
+
+
 def get_relevant_data(user_prompt: str, df: pd.DataFrame, schema: dict) -> pd.DataFrame:
     """
     Generates and executes pandas code to extract data from a DataFrame based on a user prompt.
 
     Args:
         user_prompt (str): The user's question about the data.
-        df (pd.DataFrame): The pandas DataFrame containing the data.
+        df (pd.DataFrame): The pandas DataFrame containing the data; its head is shown to the model.
+                           The generated code runs against the sandbox's shared copy (load_dataset()).
         schema (dict): A dictionary representing the data schema.
 
     Returns:
@@ -65,14 +100,15 @@ def get_relevant_data(user_prompt: str, df: pd.DataFrame, schema: dict) -> pd.Da
 
     print("Sending request to OpenAI API...")
     try:
-        response = client.chat.completions.create(
-            model="o4-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": full_user_prompt}
-            ],
-           
-        )
+        with track_llm_call("pandas", "o4-mini") as call:
+            response = client.chat.completions.create(
+                model="o4-mini",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": full_user_prompt}
+                ],
+            )
+            call.add_usage(response.usage)
 
         # Extract the generated code from the response
         generated_code = response.choices[0].message.content.strip()
@@ -87,24 +123,13 @@ def get_relevant_data(user_prompt: str, df: pd.DataFrame, schema: dict) -> pd.Da
         print(generated_code)
         print("-----------------------------\n")
 
-        # Prepare a local namespace for exec to run in.
-        # This is safer than using exec on the global namespace.
-        local_namespace = {'df': df, 'pd': pd}
-
-        # Execute the generated code
+        # Run the generated code in the sandbox, against the shared copy of the dataset.
         print("Executing generated code...")
-        exec(generated_code, globals(), local_namespace)
-
-        # The result is expected to be in 'result_df' in the local_namespace
-        result_df = local_namespace.get('result_df', pd.DataFrame())
-
-        if not isinstance(result_df, pd.DataFrame):
-             print("Warning: The generated code did not produce a pandas DataFrame named 'result_df'.")
-             return pd.DataFrame()
-
-
-        return result_df
+        return sandbox.run(generated_code)
 
+    except SandboxError as e:
+        print(f"Generated code failed in the sandbox: {e}")
+        return pd.DataFrame()
     except Exception as e:
         print(f"An error occurred: {e}")
         return pd.DataFrame() # Return an empty DataFrame on error
@@ -114,20 +139,10 @@ def get_dataset(userPrompt: str) -> pd.DataFrame:
     """
     Wrapper function to get the dataset based on user prompt.
     """
-    csv_file_path = './Mazda_Warranty_Synthetic_10000.csv'
-    schema_file_path = './schema.json'
-
-    # --- Step 1: Load the data and schema ---
+    # --- Step 1: Load the data and schema (cached after the first call) ---
     try:
-        print(f"Loading data from {csv_file_path}...")
-        main_df = pd.read_csv(csv_file_path)
-        print("Data loaded successfully.")
-
-        print(f"Loading schema from {schema_file_path}...")
-        with open(schema_file_path, 'r') as f:
-            data_schema = json.load(f)
-        print("Schema loaded successfully.\n")
-
+        main_df = load_dataset()
+        data_schema = load_schema()
     except FileNotFoundError as e:
         print(f"Error: {e}. Please make sure the files are in the correct directory.")
         exit()
@@ -146,7 +161,8 @@ class OpenAIAssistant:
 
     def __init__(self, model="o4-mini"):
         self.model = model
-        self.client = OpenAI()
+        # Reuse the module-level client and its connection pool.
+        self.client = client
 
     def _df_to_string(self, df: pd.DataFrame) -> str:
         return df.to_csv(index=False)
@@ -175,11 +191,13 @@ class OpenAIAssistant:
         ]
 
         # Parse the structured JSON output directly into ChartInput
-        response = self.client.responses.parse(
-            model=self.model,
-            input=messages,
-            text_format=ChartInput,
-        )
+        with track_llm_call("chart", self.model) as call:
+            response = self.client.responses.parse(
+                model=self.model,
+                input=messages,
+                text_format=ChartInput,
+            )
+            call.add_usage(response.usage)
         print("Generated Chart.js code:", response.output_parsed.to_string())
         try:
             generated_code= response.output_parsed.to_string();
@@ -198,22 +216,43 @@ class OpenAIAssistant:
 
 
     # ----------- Function 2: Natural Language Explanation -----------
-    def dataframe_to_natural_language(self, question: str, df: pd.DataFrame):
-        df_str = self._df_to_string(df)
+    def _natural_language_messages(self, question: str, df: pd.DataFrame) -> list:
+        df_str = pack_rows(df, label="answer").text
 
-        messages = [
+        return [
             {"role": "developer", "content": "You are a assitant for mazda dealer, you are responsible for answering questions about the warranty claims data,you are expert in datasets and you can explain datasets in plain English based on user's question, make sure you return output in markdown format."},
             {"role": "user", "content": f"Question:{question}\n\nData:\n{df_str}"}
         ]
 
-        response =self.client.responses.create(
-            model="gpt-4o-mini",
-            input=messages,
-            temperature=0.3
-        )
+    def dataframe_to_natural_language(self, question: str, df: pd.DataFrame):
+        with track_llm_call("answer", "gpt-4o-mini") as call:
+            response = self.client.responses.create(
+                model="gpt-4o-mini",
+                input=self._natural_language_messages(question, df),
+                temperature=0.3
+            )
+            call.add_usage(response.usage)
 
         return response.output_text
 
+    def stream_dataframe_to_natural_language(self, question: str, df: pd.DataFrame):
+        """Same answer as dataframe_to_natural_language, yielded as text deltas while it is generated."""
+        with track_llm_call("answer", "gpt-4o-mini") as call:
+            started = time.perf_counter()
+            stream = self.client.responses.create(
+                model="gpt-4o-mini",
+                input=self._natural_language_messages(question, df),
+                temperature=0.3,
+                stream=True
+            )
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    if call.first_token_seconds is None:
+                        call.first_token_seconds = time.perf_counter() - started
+                    yield event.delta
+                elif event.type == "response.completed":
+                    call.add_usage(event.response.usage)
+
     # ----------- Function 3: Excel.js Generator -----------
     def generate_exceljs_code(self, prompt: str, df: pd.DataFrame):
         df_str = self._df_to_string(df)
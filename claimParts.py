@@ -0,0 +1,154 @@
+import sqlite3
+
+# Normalized one-row-per-part view of warrenty_table. PART_CD / PART_QT are stored on the
+# claim as parallel comma-separated strings; exploding them once at ingestion lets the
+# forecast endpoint aggregate parts in SQL instead of splitting strings in Python. It is
+# synced at ingestion and by the forecast job; triggers keep edits and deletes in step.
+
+PARTS_TABLE = "claim_parts"
+SOURCE_TABLE = "warrenty_table"
+
+# Sync bookkeeping: the highest warrenty_table rowid already scanned, and claims whose parts
+# changed in place and wait to be exploded again.
+PARTS_STATE_TABLE = "claim_parts_state"
+PARTS_PENDING_TABLE = "claim_parts_pending"
+UPDATE_TRIGGER = "trg_claim_parts_update"
+DELETE_TRIGGER = "trg_claim_parts_delete"
+PART_COLUMNS = ("PART_CD", "PART_QT", "RPR_DT", "CRLN_CD")
+
+
+def _explode_parts_sql(claims: str) -> str:
+    """
+    Explode the claims matching a WHERE condition on warrenty_table into claim_parts.
+    SQLite does not allow CTEs inside triggers, so this runs from sync_claim_parts: on new
+    claims by rowid watermark, and on claims the triggers queued after an in-place edit.
+    """
+    return f"""
+    WITH RECURSIVE split(CLAIM_ID, RPR_DAY, CRLN_CD, PART_SEQ, PART_CD, PART_QT, CD_REST, QT_REST) AS (
+        SELECT rowid, date(RPR_DT), CRLN_CD, 0, NULL, NULL, PART_CD || ',', PART_QT || ','
+        FROM {SOURCE_TABLE}
+        WHERE {claims}
+        AND date(RPR_DT) IS NOT NULL
+        AND PART_CD IS NOT NULL AND PART_QT IS NOT NULL
+        AND length(PART_CD) - length(replace(PART_CD, ',', ''))
+            = length(PART_QT) - length(replace(PART_QT, ',', ''))
+        UNION ALL
+        SELECT
+            CLAIM_ID, RPR_DAY, CRLN_CD, PART_SEQ + 1,
+            substr(CD_REST, 1, instr(CD_REST, ',') - 1),
+            CAST(substr(QT_REST, 1, instr(QT_REST, ',') - 1) AS INTEGER),
+            substr(CD_REST, instr(CD_REST, ',') + 1),
+            substr(QT_REST, instr(QT_REST, ',') + 1)
+        FROM split
+        WHERE CD_REST <> ''
+    )
+    INSERT OR IGNORE INTO {PARTS_TABLE} (CLAIM_ID, PART_SEQ, RPR_DAY, CRLN_CD, PART_CD, PART_QT)
+    SELECT CLAIM_ID, PART_SEQ, RPR_DAY, CRLN_CD, PART_CD, PART_QT
+    FROM split
+    WHERE PART_SEQ > 0
+"""
+
+
+def _exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def create_claim_parts(conn: sqlite3.Connection):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PARTS_TABLE} (
+            CLAIM_ID INTEGER NOT NULL,
+            PART_SEQ INTEGER NOT NULL,
+            RPR_DAY TEXT NOT NULL,
+            CRLN_CD TEXT,
+            PART_CD TEXT NOT NULL,
+            PART_QT INTEGER NOT NULL,
+            PRIMARY KEY (CLAIM_ID, PART_SEQ)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{PARTS_TABLE}_day_model ON {PARTS_TABLE} (RPR_DAY, CRLN_CD, PART_CD)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{PARTS_TABLE}_part ON {PARTS_TABLE} (PART_CD)")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {PARTS_PENDING_TABLE} (CLAIM_ID INTEGER PRIMARY KEY)")
+    if not _exists(conn, PARTS_STATE_TABLE):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {PARTS_STATE_TABLE} (ID INTEGER PRIMARY KEY CHECK (ID = 1), SCANNED_ROWID INTEGER NOT NULL)")
+        # Tables exploded before the watermark was stored resume from their highest claim.
+        conn.execute(f"INSERT OR IGNORE INTO {PARTS_STATE_TABLE} SELECT 1, IFNULL(MAX(CLAIM_ID), 0) FROM {PARTS_TABLE}")
+        conn.commit()
+    # An edit to a claim's parts, date or car line takes its part rows out at once and queues
+    # the claim to be exploded again by the next sync; a delete just takes them out.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {UPDATE_TRIGGER}
+        AFTER UPDATE OF {", ".join(PART_COLUMNS)} ON {SOURCE_TABLE}
+        BEGIN
+            DELETE FROM {PARTS_TABLE} WHERE CLAIM_ID IN (OLD.rowid, NEW.rowid);
+            INSERT OR IGNORE INTO {PARTS_PENDING_TABLE} VALUES (NEW.rowid);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {DELETE_TRIGGER}
+        AFTER DELETE ON {SOURCE_TABLE}
+        BEGIN
+            DELETE FROM {PARTS_TABLE} WHERE CLAIM_ID = OLD.rowid;
+            DELETE FROM {PARTS_PENDING_TABLE} WHERE CLAIM_ID = OLD.rowid;
+        END
+    """)
+
+
+def _scanned(conn: sqlite3.Connection) -> int:
+    return conn.execute(f"SELECT SCANNED_ROWID FROM {PARTS_STATE_TABLE}").fetchone()[0]
+
+
+def _latest(conn: sqlite3.Connection) -> int:
+    return conn.execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {SOURCE_TABLE}").fetchone()[0]
+
+
+def _is_current(conn: sqlite3.Connection) -> bool:
+    if conn.execute(f"SELECT 1 FROM {PARTS_PENDING_TABLE} LIMIT 1").fetchone():
+        return False
+    return _latest(conn) <= _scanned(conn)
+
+
+def sync_claim_parts(conn: sqlite3.Connection) -> int:
+    """
+    Explode claims added since the last sync, and claims edited in place, into claim_parts.
+    Returns the number of part rows written (0 when already current or no source table).
+    """
+    if not _exists(conn, SOURCE_TABLE):
+        return 0
+
+    create_claim_parts(conn)
+    if _is_current(conn):
+        return 0
+
+    # Ingest (on the server's connection) and the scheduled forecast job (on its own) both
+    # sync, so the watermark is re-read under the write lock; OR IGNORE covers any caller
+    # that arrives already inside a transaction.
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    if _is_current(conn):
+        conn.commit()
+        return 0
+
+    scanned, latest = _scanned(conn), _latest(conn)
+    # cursor.rowcount is -1 for statements that start with WITH, so diff total_changes.
+    before = conn.total_changes
+    conn.execute(_explode_parts_sql(f"rowid IN (SELECT CLAIM_ID FROM {PARTS_PENDING_TABLE})"))
+    conn.execute(_explode_parts_sql("rowid > ? AND rowid <= ?"), (scanned, latest))
+    written = conn.total_changes - before
+    conn.execute(f"DELETE FROM {PARTS_PENDING_TABLE}")
+    # Up to the last claim scanned, not the last one with parts: claims with no or malformed
+    # parts above it would otherwise be scanned again on every sync.
+    conn.execute(f"UPDATE {PARTS_STATE_TABLE} SET SCANNED_ROWID = ?", (latest,))
+    conn.commit()
+    if written:
+        print(f"✅ Exploded {written} part rows into '{PARTS_TABLE}'.")
+    return written
+
+
+def rebuild_claim_parts(conn: sqlite3.Connection) -> int:
+    """Drop and re-explode every claim. Needed after warrenty_table is replaced, as rowids restart."""
+    for table in (PARTS_TABLE, PARTS_STATE_TABLE, PARTS_PENDING_TABLE):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    return sync_claim_parts(conn)
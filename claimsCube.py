@@ -0,0 +1,172 @@
+import sqlite3
+from itertools import product
+
+# Materialized daily rollup of warrenty_table at (repair date, model, status, dealer) grain.
+# It is rebuilt when warrenty_table is (re)loaded and kept current by triggers: an insert
+# adds the row to its key, a delete takes it off, and an update does both, so status changes
+# move claims between keys. The dashboard queries stay flat as the raw claims table grows.
+
+CUBE_TABLE = "claims_daily_cube"
+CUBE_TRIGGER = "trg_claims_daily_cube_insert"
+CUBE_UPDATE_TRIGGER = "trg_claims_daily_cube_update_v2"
+CUBE_DELETE_TRIGGER = "trg_claims_daily_cube_delete_v2"
+CUBE_TRIGGERS = (CUBE_TRIGGER, CUBE_UPDATE_TRIGGER, CUBE_DELETE_TRIGGER)
+# Earlier versions of the update/delete triggers; dropped when the cube is rebuilt.
+LEGACY_CUBE_TRIGGERS = ("trg_claims_daily_cube_update", "trg_claims_daily_cube_delete")
+SOURCE_TABLE = "warrenty_table"
+SOURCE_COLUMNS = ("RPR_DT", "CRLN_CD", "STS_CD", "DLR_CD", "CLM_EST_AM")
+
+
+def _exists(conn: sqlite3.Connection, kind: str, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+    ).fetchone()
+    return row is not None
+
+
+def _source_has_columns(conn: sqlite3.Connection) -> bool:
+    if not _exists(conn, "table", SOURCE_TABLE):
+        return False
+    columns = {col[1] for col in conn.execute(f"PRAGMA table_info({SOURCE_TABLE});")}
+    return all(col in columns for col in SOURCE_COLUMNS)
+
+
+def _cube_key(row: str) -> str:
+    """The cube key of a NEW or OLD trigger row, in the order of the primary key."""
+    return (f"IFNULL(date({row}.RPR_DT), ''), IFNULL({row}.CRLN_CD, ''), IFNULL({row}.STS_CD, ''), "
+            f"IFNULL(CAST({row}.DLR_CD AS TEXT), '')")
+
+
+def _add_row(row: str) -> str:
+    return f"""
+            INSERT INTO {CUBE_TABLE}
+                (RPR_DAY, CRLN_CD, STS_CD, DLR_CD, CLAIM_CT, CLM_EST_SUM, CLM_EST_MIN, CLM_EST_MAX)
+            VALUES ({_cube_key(row)}, 1, IFNULL({row}.CLM_EST_AM, 0), {row}.CLM_EST_AM, {row}.CLM_EST_AM)
+            ON CONFLICT (RPR_DAY, CRLN_CD, STS_CD, DLR_CD) DO UPDATE SET
+                CLAIM_CT = CLAIM_CT + 1,
+                CLM_EST_SUM = CLM_EST_SUM + excluded.CLM_EST_SUM,
+                CLM_EST_MIN = MIN(IFNULL(CLM_EST_MIN, excluded.CLM_EST_MIN), IFNULL(excluded.CLM_EST_MIN, CLM_EST_MIN)),
+                CLM_EST_MAX = MAX(IFNULL(CLM_EST_MAX, excluded.CLM_EST_MAX), IFNULL(excluded.CLM_EST_MAX, CLM_EST_MAX));"""
+
+
+def _key_amounts(row: str) -> str:
+    """
+    CLM_EST_AM of the claims under a trigger row's cube key. The key's IFNULL/date() folding
+    can't use an index, so it is split into branches that can: idx_warrenty_crln_rpr_dt
+    (created with the other claim indexes in SQLiteClient) serves a car line and a day's range of RPR_DT, with NULL car lines and undated claims
+    (both keyed '') in branches of their own. Branches that don't apply to the row are
+    skipped before they scan anything.
+    """
+    car_lines = (f"src.CRLN_CD = IFNULL({row}.CRLN_CD, '')",
+                 f"IFNULL({row}.CRLN_CD, '') = '' AND src.CRLN_CD IS NULL")
+    days = (f"src.RPR_DT >= date({row}.RPR_DT) AND src.RPR_DT < date({row}.RPR_DT, '+1 day') "
+            f"AND date(src.RPR_DT) = date({row}.RPR_DT)",
+            f"date({row}.RPR_DT) IS NULL AND date(src.RPR_DT) IS NULL")
+    rest = (f"IFNULL(src.STS_CD, '') = IFNULL({row}.STS_CD, '') "
+            f"AND IFNULL(CAST(src.DLR_CD AS TEXT), '') = IFNULL(CAST({row}.DLR_CD AS TEXT), '')")
+    return "\n                UNION ALL ".join(
+        f"SELECT CLM_EST_AM FROM {SOURCE_TABLE} AS src WHERE {car_line} AND {day} AND {rest}"
+        for car_line, day in product(car_lines, days)
+    )
+
+
+def _remove_row(row: str) -> str:
+    # MIN/MAX can't be taken back incrementally; they are recomputed from the claims still
+    # under the key, and only when the removed amount was one of them.
+    key = f"(RPR_DAY, CRLN_CD, STS_CD, DLR_CD) = ({_cube_key(row)})"
+    return f"""
+            UPDATE {CUBE_TABLE}
+            SET CLAIM_CT = CLAIM_CT - 1, CLM_EST_SUM = CLM_EST_SUM - IFNULL({row}.CLM_EST_AM, 0)
+            WHERE {key};
+            DELETE FROM {CUBE_TABLE} WHERE {key} AND CLAIM_CT <= 0;
+            UPDATE {CUBE_TABLE}
+            SET (CLM_EST_MIN, CLM_EST_MAX) = (
+                SELECT MIN(CLM_EST_AM), MAX(CLM_EST_AM) FROM (
+                {_key_amounts(row)})
+            )
+            WHERE {key} AND {row}.CLM_EST_AM IN (CLM_EST_MIN, CLM_EST_MAX);"""
+
+
+def create_claims_cube(conn: sqlite3.Connection):
+    """Create the rollup table and the triggers that maintain it."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CUBE_TABLE} (
+            RPR_DAY TEXT NOT NULL,
+            CRLN_CD TEXT NOT NULL,
+            STS_CD TEXT NOT NULL,
+            DLR_CD TEXT NOT NULL,
+            CLAIM_CT INTEGER NOT NULL,
+            CLM_EST_SUM REAL NOT NULL,
+            CLM_EST_MIN REAL,
+            CLM_EST_MAX REAL,
+            PRIMARY KEY (RPR_DAY, CRLN_CD, STS_CD, DLR_CD)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CUBE_TABLE}_sts_day ON {CUBE_TABLE} (STS_CD, RPR_DAY)")
+    for name in LEGACY_CUBE_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CUBE_TRIGGER}
+        AFTER INSERT ON {SOURCE_TABLE}
+        BEGIN{_add_row("NEW")}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CUBE_UPDATE_TRIGGER}
+        AFTER UPDATE OF {", ".join(SOURCE_COLUMNS)} ON {SOURCE_TABLE}
+        BEGIN{_remove_row("OLD")}{_add_row("NEW")}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {CUBE_DELETE_TRIGGER}
+        AFTER DELETE ON {SOURCE_TABLE}
+        BEGIN{_remove_row("OLD")}
+        END
+    """)
+
+
+def rebuild_claims_cube(conn: sqlite3.Connection) -> bool:
+    """
+    Recompute the rollup from scratch. Used at ingestion, when warrenty_table has been
+    replaced (which also drops the triggers). Returns False if warrenty_table is missing
+    or lacks the columns the cube is keyed on.
+    """
+    if not _source_has_columns(conn):
+        return False
+
+    create_claims_cube(conn)
+    conn.execute(f"DELETE FROM {CUBE_TABLE}")
+    conn.execute(f"""
+        INSERT INTO {CUBE_TABLE}
+            (RPR_DAY, CRLN_CD, STS_CD, DLR_CD, CLAIM_CT, CLM_EST_SUM, CLM_EST_MIN, CLM_EST_MAX)
+        SELECT
+            IFNULL(date(RPR_DT), ''), IFNULL(CRLN_CD, ''), IFNULL(STS_CD, ''),
+            IFNULL(CAST(DLR_CD AS TEXT), ''), COUNT(*), IFNULL(SUM(CLM_EST_AM), 0),
+            MIN(CLM_EST_AM), MAX(CLM_EST_AM)
+        FROM {SOURCE_TABLE}
+        GROUP BY 1, 2, 3, 4
+    """)
+    conn.commit()
+    print(f"✅ Rebuilt '{CUBE_TABLE}' from '{SOURCE_TABLE}'.")
+    return True
+
+
+def claims_cube_is_current(conn: sqlite3.Connection) -> bool:
+    """The cube can answer queries only while all of its triggers are attached to warrenty_table."""
+    return _exists(conn, "table", CUBE_TABLE) and all(_exists(conn, "trigger", name) for name in CUBE_TRIGGERS)
+
+
+def _cube_matches_source(conn: sqlite3.Connection) -> bool:
+    cube = conn.execute(f"SELECT IFNULL(SUM(CLAIM_CT), 0) FROM {CUBE_TABLE}").fetchone()[0]
+    source = conn.execute(f"SELECT COUNT(*) FROM {SOURCE_TABLE}").fetchone()[0]
+    return cube == source
+
+
+def ensure_claims_cube(conn: sqlite3.Connection) -> bool:
+    """
+    Build the cube if it is missing, was detached by a table replace, or has drifted from
+    warrenty_table (e.g. updates and deletes made before the cube had triggers for them).
+    """
+    if claims_cube_is_current(conn) and _cube_matches_source(conn):
+        return True
+    return rebuild_claims_cube(conn)
@@ -0,0 +1,128 @@
+import gzip
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Negotiated brotli/gzip compression for API responses. Payloads like /forecast-claims/
+# are hundreds of KB of highly repetitive JSON and shrink by more than an order of magnitude.
+
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5   # brotli's speed/size sweet spot for on-the-fly responses
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "image/")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best encoding the client accepts: brotli, then gzip, else identity (None)."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressionMiddleware:
+    """
+    Compresses single-chunk responses of at least `minimum_size` bytes. Streaming responses,
+    excluded content types and responses that already set Content-Encoding (e.g. cached
+    dashboard payloads that were compressed once up front) pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if not message.get("more_body", False) and len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            await send(start_message)
+            start_message = None
+            passthrough = True
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+if __name__ == "__main__":
+    # Serialization CPU time and bytes on the wire for the /forecast-claims/ sized payload.
+    import json
+    import time
+
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+
+    with open("smart_icps/public/mazda_daily_claims_2025.json", "rb") as f:
+        payload = {"success": True, "data": json.loads(f.read())}
+
+    def timed(label, fn, repeat=20):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        print(f"{label:<42} {(time.perf_counter() - started) / repeat * 1000:8.2f} ms")
+        return result
+
+    print("-- serialization --")
+    before = timed("jsonable_encoder + json.dumps (FastAPI)", lambda: json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode())
+    after = timed("orjson.dumps", lambda: orjson.dumps(payload))
+
+    print("-- bytes on the wire --")
+    print(f"{'identity':<42} {len(before):>10,d}")
+    for encoding in ("gzip", "br"):
+        compressed = timed(f"{encoding} compress", lambda: compress(after, encoding), repeat=5)
+        print(f"{encoding:<42} {len(compressed):>10,d}")
@@ -0,0 +1,184 @@
+import functools
+import os
+import re
+from typing import Any, Optional
+
+import pandas as pd
+import tiktoken
+
+from llmMetrics import llm_metrics
+
+# Fits query results into a token budget before they are pasted into an LLM prompt. Results
+# under the budget go in whole, as CSV; larger ones are replaced by a summary computed over
+# all rows (per-column statistics, the top rows by the main measure and an evenly spaced
+# sample), shrunk until it fits. The model still sees the shape and extremes of the data
+# without paying for every row.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", 10))
+CONTEXT_SAMPLE_ROWS = int(os.getenv("CONTEXT_SAMPLE_ROWS", 20))
+ENCODING_NAME = "cl100k_base"
+# Results with more rows than this are never rendered in full; their raw size is
+# extrapolated from the first rows instead.
+EXACT_COUNT_ROWS = 2000
+
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoder(name: str = ENCODING_NAME) -> Optional[tiktoken.Encoding]:
+    """Loaded once per process; None if the encoding cannot be loaded (e.g. offline)."""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding '{name}' unavailable ({e}); estimating tokens from length.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoder = get_encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+class PackedContext:
+    __slots__ = ("text", "row_count", "raw_tokens", "tokens", "summarized")
+
+    def __init__(self, text: str, row_count: int, raw_tokens: int, tokens: int, summarized: bool):
+        self.text = text
+        self.row_count = row_count
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+        self.summarized = summarized
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+packer_stats = llm_metrics.feature("contextPacking", info=lambda: {"budget": CONTEXT_TOKEN_BUDGET})
+
+
+def _as_frame(data: Any) -> pd.DataFrame:
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.DataFrame(list(data or []))
+
+
+def _format_number(value) -> str:
+    if pd.isna(value):
+        return "null"
+    value = float(value)
+    return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+
+
+def _describe_column(name: str, column: pd.Series, top_k: int) -> str:
+    nulls = int(column.isna().sum())
+    values = column.dropna()
+    null_note = f", nulls {nulls:,}" if nulls else ""
+
+    if pd.api.types.is_bool_dtype(column) or not pd.api.types.is_numeric_dtype(column):
+        values = values.astype(str)
+        if len(values) and values.head(20).str.match(DATE_PATTERN).all():
+            return f"- {name} (date): {values.min()} .. {values.max()}{null_note}"
+        counts = values.value_counts()
+        if len(counts) and counts.iloc[0] == 1:
+            examples = ", ".join(values.head(3))
+            return f"- {name} (text): {len(counts):,} distinct, all unique; e.g. {examples}{null_note}"
+        top = ", ".join(f"{value} ({count:,})" for value, count in counts.head(top_k).items())
+        return f"- {name} (text): {len(counts):,} distinct; top: {top}{null_note}"
+
+    return (
+        f"- {name} (number): min {_format_number(values.min())}, max {_format_number(values.max())}, "
+        f"mean {_format_number(values.mean())}, sum {_format_number(values.sum())}{null_note}"
+    )
+
+
+def _measure_column(df: pd.DataFrame) -> Optional[str]:
+    """The numeric column to rank rows by: the first one that is not a code or an id."""
+    for name in df.columns:
+        column = df[name]
+        if not pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            continue
+        if re.search(r"(_CD|_ID|CODE|^ID)$", str(name), flags=re.IGNORECASE):
+            continue
+        return name
+    return None
+
+
+def _summarize(df: pd.DataFrame, top_k: int, sample_rows: int) -> str:
+    lines = [
+        f"Result: {len(df):,} rows x {len(df.columns)} columns "
+        f"(too large to include in full; statistics below cover all rows).",
+        "Columns:",
+    ]
+    lines += [_describe_column(str(name), df[name], top_k) for name in df.columns]
+
+    measure = _measure_column(df)
+    if measure is not None and top_k:
+        top_rows = df.nlargest(top_k, measure)
+        lines += [f"Top {len(top_rows)} rows by {measure}:", top_rows.to_csv(index=False).strip()]
+
+    if sample_rows:
+        step = max(1, len(df) // sample_rows)
+        sample = df.iloc[::step].head(sample_rows)
+        lines += [f"Evenly spaced sample of {len(sample)} rows:", sample.to_csv(index=False).strip()]
+
+    return "\n".join(lines)
+
+
+def pack_rows(data: Any, budget: int = CONTEXT_TOKEN_BUDGET, label: str = "") -> PackedContext:
+    """Render rows (list of dicts or DataFrame) for a prompt within `budget` tokens."""
+    df = _as_frame(data)
+    if not len(df.columns):
+        raw_text, raw_tokens = "(no rows)", count_tokens("(no rows)")
+    elif len(df) <= EXACT_COUNT_ROWS:
+        raw_text = df.to_csv(index=False).strip()
+        raw_tokens = count_tokens(raw_text)
+    else:
+        raw_text = None
+        head_tokens = count_tokens(df.head(EXACT_COUNT_ROWS).to_csv(index=False))
+        raw_tokens = round(head_tokens * len(df) / EXACT_COUNT_ROWS)
+
+    if raw_tokens <= budget:
+        if raw_text is None:
+            raw_text = df.to_csv(index=False).strip()
+        packed = PackedContext(raw_text, len(df), raw_tokens, raw_tokens, summarized=False)
+    else:
+        top_k, sample_rows = CONTEXT_TOP_K, CONTEXT_SAMPLE_ROWS
+        text = _summarize(df, top_k, sample_rows)
+        tokens = count_tokens(text)
+        # Wide or long-valued rows: trade sample and top rows for fitting in the budget.
+        while tokens > budget and (sample_rows or top_k):
+            sample_rows, top_k = sample_rows // 2, (top_k // 2 if not sample_rows else top_k)
+            text = _summarize(df, top_k, sample_rows)
+            tokens = count_tokens(text)
+        packed = PackedContext(text, len(df), raw_tokens, tokens, summarized=True)
+        print(f"📦 Packed {len(df):,} rows{' for ' + label if label else ''}: "
+              f"{raw_tokens:,} -> {tokens:,} tokens ({packed.tokens_saved:,} saved)")
+
+    packer_stats.count(requests=1, summarized=packed.summarized, rawTokens=packed.raw_tokens, sentTokens=packed.tokens)
+    return packed
+
+
+if __name__ == "__main__":
+    # Prompt tokens for raw vs packed results of a few typical questions.
+    import sqlite3
+    import sys
+    import time
+
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "warrenty2.db")
+    queries = {
+        "claims by status": "SELECT STS_CD, COUNT(*) AS claims FROM warrenty_table GROUP BY STS_CD",
+        "cost by model and day": "SELECT CRLN_CD, substr(RPR_DT, 1, 10) AS day, SUM(CLM_EST_AM) AS cost "
+                                 "FROM warrenty_table GROUP BY 1, 2",
+        "all pending claims": "SELECT * FROM warrenty_table WHERE STS_CD = 'P'",
+    }
+    for label, sql in queries.items():
+        df = pd.read_sql_query(sql, conn)
+        started = time.perf_counter()
+        packed = pack_rows(df)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{label:<24} rows {len(df):>7,}  raw {packed.raw_tokens:>10,}  sent {packed.tokens:>6,}  "
+              f"pack {elapsed:7.1f} ms")
@@ -75,6 +75,11 @@ class PromptInput(BaseModel):
     prompt: str
 
 
+class SessionPromptInput(BaseModel):
+    prompt: str
+    session_id: Optional[str] = Field(None, description="Conversation to continue; omit to start a new one.")
+
+
 class ChartInput(BaseModel):
     title:str = Field(
         ...,
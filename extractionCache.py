@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from pydantic import ValidationError
+
+from dto import WarrantyClaimData
+
+# Persistent cache of vision extractions, keyed on the SHA-256 of the uploaded file together
+# with the model and the extraction prompt version, so re-uploading the same scan (typically
+# after a failed submit) returns the stored WarrantyClaimData instead of another multi-second
+# vision call. Changing the model or the prompt/schema changes the key, so stale extractions
+# are never served. The least recently used entries are evicted beyond MAX_ENTRIES.
+
+CACHE_TABLE = "extraction_cache"
+MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 5000))
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, conn: sqlite3.Connection, max_entries: int = MAX_ENTRIES):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_ms = 0.0
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+                CONTENT_HASH TEXT NOT NULL,
+                MODEL TEXT NOT NULL,
+                PROMPT_VERSION TEXT NOT NULL,
+                RESULT_JSON TEXT NOT NULL,
+                BYTES INTEGER NOT NULL,
+                LATENCY_MS REAL NOT NULL,
+                CREATED_AT REAL NOT NULL,
+                LAST_USED_AT REAL NOT NULL,
+                HIT_COUNT INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (CONTENT_HASH, MODEL, PROMPT_VERSION)
+            )
+        """)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_last_used ON {CACHE_TABLE} (LAST_USED_AT)")
+        self.conn.commit()
+
+    def get(self, digest: str, model: str, prompt_version: str) -> Optional[WarrantyClaimData]:
+        key = (digest, model, prompt_version)
+        row = self.conn.execute(
+            f"SELECT RESULT_JSON, LATENCY_MS FROM {CACHE_TABLE} WHERE CONTENT_HASH = ? AND MODEL = ? AND PROMPT_VERSION = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            result = WarrantyClaimData.model_validate_json(row[0])
+        except ValidationError:
+            # Stored under an older WarrantyClaimData; extract again.
+            self.conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE CONTENT_HASH = ? AND MODEL = ? AND PROMPT_VERSION = ?", key)
+            self.conn.commit()
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.saved_ms += row[1]
+        self.conn.execute(
+            f"UPDATE {CACHE_TABLE} SET HIT_COUNT = HIT_COUNT + 1, LAST_USED_AT = ? "
+            f"WHERE CONTENT_HASH = ? AND MODEL = ? AND PROMPT_VERSION = ?",
+            (time.time(), *key),
+        )
+        self.conn.commit()
+        return result
+
+    def put(self, digest: str, model: str, prompt_version: str, result: WarrantyClaimData, size: int, seconds: float):
+        now = time.time()
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {CACHE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (digest, model, prompt_version, result.model_dump_json(), size, seconds * 1000, now, now),
+        )
+        overflow = self.conn.execute(f"SELECT COUNT(*) FROM {CACHE_TABLE}").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                f"DELETE FROM {CACHE_TABLE} WHERE rowid IN "
+                f"(SELECT rowid FROM {CACHE_TABLE} ORDER BY LAST_USED_AT LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+        self.conn.commit()
+
+    def purge(self) -> int:
+        cursor = self.conn.execute(f"DELETE FROM {CACHE_TABLE}")
+        self.conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        entries, lifetime_hits, stored_bytes = self.conn.execute(
+            f"SELECT COUNT(*), IFNULL(SUM(HIT_COUNT), 0), IFNULL(SUM(BYTES), 0) FROM {CACHE_TABLE}"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "maxEntries": self.max_entries,
+            "uploadBytesCovered": stored_bytes,
+            "lifetimeHits": lifetime_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latencySavedMs": round(self.saved_ms, 1),
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,233 @@
+import asyncio
+import base64
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from dto import WarrantyClaimData
+from azureAiClient import EXTRACTION_MODEL, EXTRACTION_PROMPT_VERSION, AsyncAzureAiClient
+from extractionCache import ExtractionCache, content_hash
+from imagePreprocess import PREPROCESS_VERSION, PreparedImage, prepare_pdf_upload, prepare_upload
+from llmMetrics import llm_metrics
+
+# Background extraction of claim packets: several images and/or multi-page PDFs submitted as
+# one job. PDFs are rasterized locally, every page is extracted concurrently (at most
+# EXTRACTION_JOB_CONCURRENCY pages in flight across all jobs, on top of the client's
+# per-deployment cap), and the page results are merged into one WarrantyClaimData, so a
+# packet takes about as long as its slowest page rather than the sum of its pages. A file's
+# pages start as soon as that file is prepared, and each goes through the extraction cache,
+# so resubmitting a packet only extracts pages not seen before. Jobs are kept in memory for
+# EXTRACTION_JOB_TTL_SECONDS after they finish.
+
+EXTRACTION_JOB_CONCURRENCY = int(os.getenv("EXTRACTION_JOB_CONCURRENCY", 8))
+EXTRACTION_JOB_MAX_PAGES = int(os.getenv("EXTRACTION_JOB_MAX_PAGES", 50))
+EXTRACTION_JOB_TTL_SECONDS = int(os.getenv("EXTRACTION_JOB_TTL_SECONDS", 60 * 60))
+
+PROMPT_VERSION = f"{EXTRACTION_PROMPT_VERSION}:{PREPROCESS_VERSION}"
+
+
+class PageTask:
+    def __init__(self, source: str, file_index: int, page: int, digest: str):
+        self.source = source
+        self.file_index = file_index
+        self.page = page
+        self.digest = digest
+        self.status = "queued"
+        self.cached = False
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.result: Optional[WarrantyClaimData] = None
+
+    def summary(self) -> dict:
+        return {
+            "source": self.source, "page": self.page, "status": self.status, "cached": self.cached,
+            "ms": round(self.seconds * 1000, 1) if self.seconds is not None else None, "error": self.error,
+        }
+
+
+def _is_empty(value, default) -> bool:
+    return value is None or value == "" or value == [] or value == default
+
+
+def merge_claims(results: List[WarrantyClaimData]) -> tuple:
+    """
+    One claim from per-page extractions, in page order: a field takes the first page's value
+    that isn't empty, and list fields are concatenated without duplicates. Also returns the
+    fields where later pages disagreed with the chosen value.
+    """
+    merged, conflicts = {}, {}
+    for name, field in WarrantyClaimData.model_fields.items():
+        default = field.get_default(call_default_factory=True)
+        values = [getattr(result, name) for result in results if not _is_empty(getattr(result, name), default)]
+        if not values:
+            continue
+        if isinstance(default, list):
+            combined = []
+            for items in values:
+                combined += [item for item in items if item not in combined]
+            merged[name] = combined
+        else:
+            merged[name] = values[0]
+            distinct = []
+            for value in values:
+                if value not in distinct:
+                    distinct.append(value)
+            if len(distinct) > 1:
+                conflicts[name] = distinct
+    return WarrantyClaimData(**merged), conflicts
+
+
+class ExtractionJob:
+    def __init__(self, files: List[str]):
+        self.id = uuid.uuid4().hex
+        self.files = files
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.pages: List[PageTask] = []
+        self.result: Optional[WarrantyClaimData] = None
+        self.conflicts: Dict[str, list] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def summary(self) -> dict:
+        done = [page for page in self.pages if page.status in ("done", "failed")]
+        page_ms = [page.seconds * 1000 for page in self.pages if page.seconds is not None]
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "files": self.files,
+            "pagesTotal": len(self.pages),
+            "pagesDone": len(done),
+            "pagesFailed": sum(page.status == "failed" for page in self.pages),
+            "pages": [page.summary() for page in self.pages],
+            "wallMs": round(((self.finished_at or time.time()) - self.started_at) * 1000, 1) if self.started_at else None,
+            "slowestPageMs": round(max(page_ms), 1) if page_ms else None,
+            "sumPageMs": round(sum(page_ms), 1) if page_ms else None,
+            "conflicts": self.conflicts,
+            "error": self.error,
+        }
+
+
+class ExtractionJobs:
+    def __init__(self, client: AsyncAzureAiClient, cache: ExtractionCache,
+                 concurrency: int = EXTRACTION_JOB_CONCURRENCY, ttl_seconds: int = EXTRACTION_JOB_TTL_SECONDS):
+        self.client = client
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.concurrency = concurrency
+        self._pages = asyncio.Semaphore(concurrency)
+        self._jobs: "OrderedDict[str, ExtractionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[ExtractionJob]:
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit(self, uploads: List[tuple]) -> ExtractionJob:
+        """Start a job for (filename, mime_type, bytes) uploads; runs in the background."""
+        self._expire()
+        job = ExtractionJob([filename for filename, _, _ in uploads])
+        with self._lock:
+            self._jobs[job.id] = job
+        # The task inherits the request's trace ID and endpoint, so its model calls are logged under them.
+        job.task = asyncio.create_task(self._run(job, uploads))
+        return job
+
+    async def _run_file(self, job: ExtractionJob, index: int, filename: str, mime_type: str, data: bytes):
+        """Prepare one uploaded file and extract its pages, without waiting for the job's other files."""
+        digest = content_hash(data)
+        if mime_type != "application/pdf":
+            if len(job.pages) + 1 > EXTRACTION_JOB_MAX_PAGES:
+                raise ValueError(f"The job has more than {EXTRACTION_JOB_MAX_PAGES} pages.")
+            page = PageTask(filename, index, 1, digest)
+            job.pages.append(page)
+            # A cached image needs no preprocessing either.
+            if not self._from_cache(page):
+                await self._extract(page, await prepare_upload(data, mime_type))
+            return
+
+        prepared = await prepare_pdf_upload(data, EXTRACTION_JOB_MAX_PAGES)
+        if len(job.pages) + len(prepared) > EXTRACTION_JOB_MAX_PAGES:
+            raise ValueError(f"The job has more than {EXTRACTION_JOB_MAX_PAGES} pages.")
+        # PDF pages share the file's hash, so they are cached per page.
+        pages = [PageTask(filename, index, number, f"{digest}:p{number}" if len(prepared) > 1 else digest)
+                 for number in range(1, len(prepared) + 1)]
+        job.pages += pages
+        await asyncio.gather(*(self._extract(page, image) for page, image in zip(pages, prepared) if not self._from_cache(page)))
+
+    def _from_cache(self, page: PageTask) -> bool:
+        started = time.perf_counter()
+        cached = self.cache.get(page.digest, EXTRACTION_MODEL, PROMPT_VERSION)
+        if cached is None:
+            return False
+        llm_metrics.record_cache_hit("vision", EXTRACTION_MODEL)
+        page.result, page.cached, page.status = cached, True, "done"
+        page.seconds = time.perf_counter() - started
+        return True
+
+    async def _extract(self, page: PageTask, image: PreparedImage):
+        started = time.perf_counter()
+        try:
+            async with self._pages:
+                page.status = "running"
+                started = time.perf_counter()
+                page.result = await self.client.extract_warranty_claim_from_base64(
+                    base64.b64encode(image.data).decode("utf-8"), image.mime_type
+                )
+            self.cache.put(page.digest, EXTRACTION_MODEL, PROMPT_VERSION, page.result, image.original_bytes,
+                           time.perf_counter() - started)
+            page.status = "done"
+        except Exception as e:
+            page.status, page.error = "failed", str(e)
+            print(f"⚠️ Extraction of {page.source} page {page.page} failed: {e}")
+        finally:
+            page.seconds = time.perf_counter() - started
+
+    async def _run(self, job: ExtractionJob, uploads: List[tuple]):
+        job.status, job.started_at = "running", time.time()
+        try:
+            outcomes = await asyncio.gather(*(self._run_file(job, index, *upload) for index, upload in enumerate(uploads)),
+                                            return_exceptions=True)
+            # The raw uploads aren't needed any more.
+            uploads.clear()
+            errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+            if errors:
+                raise errors[0]
+            # Files finish in any order; merge in upload order, page by page.
+            job.pages.sort(key=lambda page: (page.file_index, page.page))
+            results = [page.result for page in job.pages if page.result is not None]
+            if not results:
+                raise RuntimeError(f"All {len(job.pages)} pages failed to extract.")
+            job.result, job.conflicts = merge_claims(results)
+            job.status = "completed"
+            print(f"✅ Extraction job {job.id[:12]}: {len(results)}/{len(job.pages)} pages in "
+                  f"{time.time() - job.started_at:.2f}s")
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            print(f"⚠️ Extraction job {job.id[:12]} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def stats(self) -> dict:
+        self._expire()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "jobs": len(jobs),
+            "running": sum(job.status in ("queued", "running") for job in jobs),
+            "completed": sum(job.status == "completed" for job in jobs),
+            "failed": sum(job.status == "failed" for job in jobs),
+            "concurrency": self.concurrency,
+        }
@@ -1,8 +1,46 @@
 from datetime import datetime, timedelta
+import base64
+import json
 import calendar
 from collections import defaultdict
 from sqliteClient import SQLiteClient
-import random
+from claimsCube import CUBE_TABLE
+from claimParts import PARTS_TABLE
+from forecastEngine import CLAIMS_SERIES_PART, FORECAST_TABLE, has_forecast
+
+
+def _count_claims_by_month(db: SQLiteClient, year: int):
+    """Claim counts for one year keyed on (month, status), from the rollup cube when available."""
+    if db.has_claims_cube():
+        query = f"""
+        SELECT CAST(substr(RPR_DAY, 6, 2) AS INTEGER), STS_CD, SUM(CLAIM_CT) FROM {CUBE_TABLE}
+        WHERE RPR_DAY BETWEEN '{year}-01-01' AND '{year}-12-31'
+        GROUP BY 1, 2
+        """
+    else:
+        query = f"""
+        SELECT CAST(strftime('%m', RPR_DT) AS INTEGER), STS_CD, COUNT(*) FROM warrenty_table
+        WHERE strftime('%Y', RPR_DT) = '{year}'
+        GROUP BY 1, 2
+        """
+    return {(month, status): count for month, status, count in db.query(query)}
+
+
+def _count_claims_by_status(db: SQLiteClient, year: int):
+    """Claim counts for one year keyed on status, from the rollup cube when available."""
+    if db.has_claims_cube():
+        query = f"""
+        SELECT STS_CD, SUM(CLAIM_CT) FROM {CUBE_TABLE}
+        WHERE RPR_DAY BETWEEN '{year}-01-01' AND '{year}-12-31'
+        GROUP BY STS_CD
+        """
+    else:
+        query = f"""
+        SELECT STS_CD, COUNT(*) FROM warrenty_table
+        WHERE strftime('%Y', RPR_DT) = '{year}'
+        GROUP BY STS_CD
+        """
+    return {status: count for status, count in db.query(query)}
 
 
 def get_claim_summary(db: SQLiteClient, status_code: str='T' ):
@@ -29,24 +67,24 @@ def get_claim_summary(db: SQLiteClient, status_code: str='T' ):
         return datetime(y, 1, 1).date(), datetime(y, 12, 31).date()
 
     def fetch_claims(start, end):
-        if status_code=='T':
+        # Returns (claim count, total claim amount) for the date range.
+        if db.has_claims_cube():
             query = f"""
-            SELECT CLM_EST_AM FROM warrenty_table
-            WHERE date(RPR_DT) BETWEEN date('{start}') AND date('{end}')
+            SELECT IFNULL(SUM(CLAIM_CT), 0), IFNULL(SUM(CLM_EST_SUM), 0) FROM {CUBE_TABLE}
+            WHERE RPR_DAY BETWEEN '{start}' AND '{end}'
             """
         else:
             query = f"""
-            SELECT CLM_EST_AM FROM warrenty_table
+            SELECT COUNT(*), IFNULL(SUM(CLM_EST_AM), 0) FROM warrenty_table
             WHERE date(RPR_DT) BETWEEN date('{start}') AND date('{end}')
-            AND STS_CD = '{status_code}'
             """
-        return db.query(query)
+        if status_code != 'T':
+            query += f" AND STS_CD = '{status_code}'"
+        return db.query(query)[0]
 
     def compute_metrics(so_far_data, full_period_data):
-        original_total = len(so_far_data)
-        projected_total = len(full_period_data)
-
-        cost = sum(row[0] for row in so_far_data)
+        original_total, cost = so_far_data
+        projected_total, _ = full_period_data
 
         diff = projected_total - original_total
         pct = round((diff / original_total) * 100, 1) if original_total > 0 else 0
@@ -94,17 +132,12 @@ def generate_claim_data_by_year(db: SQLiteClient, year: int):
     current_year = today.year
     current_month = today.month
 
-    def get_claims_by_month(y, m, status=None, from_day=1, to_day=31):
-        # Only query within the exact day range if needed (used for current month)
-        query = f"""
-        SELECT COUNT(*) FROM warrenty_table
-        WHERE strftime('%Y', RPR_DT) = '{y}' 
-        AND strftime('%m', RPR_DT) = '{str(m).zfill(2)}'
-        AND CAST(strftime('%d', RPR_DT) AS INTEGER) BETWEEN {from_day} AND {to_day}
-        """
+    monthly_counts = _count_claims_by_month(db, year)
+
+    def get_claims_by_month(y, m, status=None):
         if status:
-            query += f" AND STS_CD = '{status}'"
-        return db.query(query)[0][0]
+            return monthly_counts.get((m, status), 0)
+        return sum(count for (month, _), count in monthly_counts.items() if month == m)
 
     historical_total, historical_accepted, historical_rejected = [], [], []
     forecast_total, forecast_accepted, forecast_rejected = [], [], []
@@ -174,16 +207,10 @@ def get_claim_status_distribution_by_year(db: SQLiteClient, year: int):
     # Fetch total claims per status
     result = []
     total = 0
-    status_counts = {}
 
+    status_counts = _count_claims_by_status(db, year)
     for code in statuses:
-        query = f"""
-        SELECT COUNT(*) FROM warrenty_table
-        WHERE strftime('%Y', RPR_DT) = '{year}' AND STS_CD = '{code}'
-        """
-        count = db.query(query)[0][0]
-        status_counts[code] = count
-        total += count
+        total += status_counts.get(code, 0)
 
     # Calculate percentages and format output
     for code, meta in statuses.items():
@@ -199,21 +226,59 @@ def get_claim_status_distribution_by_year(db: SQLiteClient, year: int):
 
     return result
 
-def generate_claims_forecast(sql_client):
-    # Map car code to model
-    car_code_to_model = {
-        code: model.upper().replace(" ", "_")
-        for code, model, *_ in sql_client.query("SELECT Code, Model, Release_Year FROM car_table")
-    }
+# Code -> display-name lookups for the forecast, rebuilt only when db.data_version moves.
+_name_maps_cache = {"version": None, "maps": None}
 
-    # Map part codes to part names
-    part_code_to_name = {
-        code: name
-        for name, code, *_ in sql_client.query("SELECT partName, partCode, priceUSD FROM part_table")
-    }
 
-    # Get all records from warranty table
-    warranty_records = sql_client.query("SELECT RPR_DT, CRLN_CD, PART_CD, PART_QT FROM warrenty_table")
+def get_code_name_maps(sql_client: SQLiteClient):
+    version = sql_client.data_version
+    if _name_maps_cache["version"] != version:
+        car_code_to_model = {
+            code: model.upper().replace(" ", "_")
+            for code, model, *_ in sql_client.query("SELECT Code, Model, Release_Year FROM car_table")
+        }
+        part_code_to_name = {
+            code: name
+            for name, code, *_ in sql_client.query("SELECT partName, partCode, priceUSD FROM part_table")
+        }
+        _name_maps_cache["maps"] = (car_code_to_model, part_code_to_name)
+        _name_maps_cache["version"] = version
+    return _name_maps_cache["maps"]
+
+
+def generate_claims_forecast(sql_client, start_date: str = None, end_date: str = None, model: str = None):
+    """
+    Daily actual and predicted claims/parts per model. Optionally limited to an inclusive
+    YYYY-MM-DD date range and to one model, given as CRLN_CD code or the model key used in the output.
+    """
+    # Read-only: claim_parts is synced at ingestion and by the scheduled forecast job.
+    car_code_to_model, part_code_to_name = get_code_name_maps(sql_client)
+
+    conditions, params = ["1 = 1"], []
+    for bound, op in ((start_date, ">="), (end_date, "<=")):
+        if bound:
+            try:
+                params.append(datetime.strptime(bound, "%Y-%m-%d").date().isoformat())
+            except ValueError:
+                raise ValueError(f"Invalid date '{bound}'. Use YYYY-MM-DD.")
+            conditions.append(f"{{day}} {op} ?")
+    if model:
+        codes = [code for code, name in car_code_to_model.items() if model in (code, name)]
+        if not codes:
+            raise ValueError(f"Unknown model '{model}'.")
+        conditions.append(f"CRLN_CD IN ({', '.join('?' * len(codes))})")
+        params += codes
+    where = " AND ".join(conditions)
+
+    # One pass over the normalized parts table: part quantities per day/model/part, and
+    # the number of claims (PART_SEQ = 1 marks each claim's first part) per group.
+    daily_parts = sql_client.query(f"""
+        SELECT RPR_DAY, CRLN_CD, PART_CD, SUM(PART_QT), SUM(PART_SEQ = 1)
+        FROM {PARTS_TABLE}
+        WHERE {where.format(day="RPR_DAY")}
+        GROUP BY RPR_DAY, CRLN_CD, PART_CD
+        ORDER BY RPR_DAY
+    """, tuple(params))
 
     # Initialize result structure
     forecast_data = defaultdict(lambda: defaultdict(lambda: {
@@ -223,73 +288,111 @@ def generate_claims_forecast(sql_client):
         "predicted_parts": defaultdict(int)
     }))
 
-    # Process each warranty record
-    for rpr_dt, crln_cd, part_cd_str, part_qt_str in warranty_records:
-        try:
-            date_str = rpr_dt.split()[0]
-            model_name = car_code_to_model.get(crln_cd)
-            if not model_name:
-                continue
+    for date_str, crln_cd, part_code, qty, claims in daily_parts:
+        model_name = car_code_to_model.get(crln_cd)
+        if not model_name:
+            continue
 
-            part_codes = part_cd_str.split(',')
-            part_qts = list(map(int, part_qt_str.split(',')))
+        daily_model_data = forecast_data[date_str][model_name]
+        daily_model_data["total_actual_claims"] += claims
+        daily_model_data["actual_parts"][part_code_to_name.get(part_code, part_code)] += qty
+
+    # Predictions come from the batch forecaster (forecastEngine), which the server runs at
+    # startup and then on a schedule. Until its first run has stored them, only actuals are
+    # returned; fitting here would hold up the request for the whole fit.
+    if has_forecast(sql_client.conn):
+        predictions = sql_client.query(f"""
+            SELECT FORECAST_DAY, CRLN_CD, PART_CD, PREDICTED FROM {FORECAST_TABLE}
+            WHERE {where.format(day="FORECAST_DAY")}
+        """, tuple(params))
+    else:
+        predictions = []
 
-            if len(part_codes) != len(part_qts):
-                continue  # Skip malformed rows
+    for date_str, crln_cd, part_code, predicted in predictions:
+        model_name = car_code_to_model.get(crln_cd)
+        if not model_name:
+            continue
 
-            # Update actual claims
-            daily_model_data = forecast_data[date_str][model_name]
-            daily_model_data["total_actual_claims"] += 1
+        daily_model_data = forecast_data[date_str][model_name]
+        if part_code == CLAIMS_SERIES_PART:
+            daily_model_data["total_predicted_claims"] = predicted
+        else:
+            daily_model_data["predicted_parts"][part_code_to_name.get(part_code, part_code)] += predicted
 
-            for code, qty in zip(part_codes, part_qts):
-                part_name = part_code_to_name.get(code, code)
-                daily_model_data["actual_parts"][part_name] += qty
+    return dict(forecast_data)
 
-        except Exception as e:
-            print(f"Skipping row due to error: {e}")
-            continue
 
-    # Add predictions with 10–15% error
-    for date_str, models in forecast_data.items():
-        for model, data in models.items():
-            actual_claims = data["total_actual_claims"]
-            predicted_claims = int(round(actual_claims * (1 + random.uniform(-0.15, 0.15))))
-            data["total_predicted_claims"] = max(0, predicted_claims)
 
-            for part, qty in data["actual_parts"].items():
-                predicted_qty = int(round(qty * (1 + random.uniform(-0.15, 0.15))))
-                data["predicted_parts"][part] = max(0, predicted_qty)
+RECENT_CLAIMS_DEFAULT_LIMIT = 100
+RECENT_CLAIMS_MAX_LIMIT = 500
+RECENT_CLAIM_FIELDS = ("claimId", "vincd", "claimAmount", "status", "model", "repair_date")
+
+
+def encode_claims_cursor(repair_dt: str, claim_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([repair_dt, claim_id]).encode()).decode()
 
-    return dict(forecast_data)
 
+def decode_claims_cursor(cursor: str):
+    try:
+        repair_dt, claim_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(repair_dt), int(claim_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
 
 
-def get_last_month_claims(db):
+def get_last_month_claims(db, limit: int = RECENT_CLAIMS_DEFAULT_LIMIT, cursor: str = None,
+                          status: str = None, model: str = None, dealer: str = None):
+    """
+    One page of the last 30 days of claims, newest first, ordered by (RPR_DT, rowid).
+    Pages are fetched by keyset: pass the returned cursor back to continue after the last row,
+    so a deep page costs the same index seek as the first one. Returns (rows, next_cursor).
+    """
+    if not (1 <= limit <= RECENT_CLAIMS_MAX_LIMIT):
+        raise ValueError(f"Invalid limit. Must be between 1 and {RECENT_CLAIMS_MAX_LIMIT}.")
+    if status is not None and status not in ['A', 'R', 'P']:
+        raise ValueError("Invalid status. Use 'A' for Approved, 'R' for Rejected, or 'P' for Pending.")
+
     today = datetime.today().date()
     one_month_ago = today - timedelta(days=30)
 
+    conditions = ["w.RPR_DT >= ?"]
+    params = [str(one_month_ago)]
+    if cursor:
+        # The plain upper bound on RPR_DT is what lets SQLite seek the index straight to the
+        # cursor; the row-value comparison then breaks ties on the same repair timestamp.
+        repair_dt, claim_id = decode_claims_cursor(cursor)
+        conditions += ["w.RPR_DT <= ?", "(w.RPR_DT, w.rowid) < (?, ?)"]
+        params += [repair_dt, repair_dt, claim_id]
+    else:
+        conditions.append("w.RPR_DT < ?")
+        params.append(str(today + timedelta(days=1)))
+    if status:
+        conditions.append("w.STS_CD = ?")
+        params.append(status)
+    if model:
+        # Accept either the CRLN_CD code or the model name shown in the feed.
+        conditions.append("w.CRLN_CD IN (SELECT Code FROM car_table WHERE Code = ? OR TRIM(Model) = ?)")
+        params += [model, model.strip()]
+    if dealer:
+        conditions.append("w.DLR_CD = ?")
+        params.append(dealer)
+
     query = f"""
-        SELECT w.VIN_CD, w.CLM_EST_AM, w.STS_CD, c.Model, w.RPR_DT
+        SELECT w.rowid, w.VIN_CD, printf('%.2f', w.CLM_EST_AM),
+            CASE w.STS_CD WHEN 'A' THEN 'Approved' WHEN 'R' THEN 'Rejected' ELSE 'Pending' END,
+            TRIM(c.Model), strftime('%d-%m-%Y', w.RPR_DT), w.RPR_DT
         FROM warrenty_table w
-        JOIN car_table c ON w.CRLN_CD = c.Code
-        WHERE DATE(w.RPR_DT) BETWEEN DATE('{one_month_ago}') AND DATE('{today}')
+        CROSS JOIN car_table c ON w.CRLN_CD = c.Code  -- CROSS JOIN pins warrenty_table as the outer, index-ordered loop
+        WHERE {" AND ".join(conditions)}
+        ORDER BY w.RPR_DT DESC, w.rowid DESC
+        LIMIT ?
     """
+    # One extra row tells us whether another page exists.
+    rows = db.query(query, tuple(params) + (limit + 1,))
 
-    rows = db.query(query)
-
-    result = []
-    for row in rows:
-        vin_cd, claim_amt, status, model_name, repair_date = row
-        formatted = {
-            "vincd": vin_cd,
-            "claimAmount": f"{claim_amt:.2f}",
-            "status": "Approved" if status == 'A' else ("Rejected" if status == 'R' else "Pending"),
-            "model": model_name.strip(),
-            "repair_date": datetime.strptime(repair_date, "%Y-%m-%d %H:%M:%S").strftime("%d-%m-%Y")
-        }
-        result.append(formatted)
-
-    return result
-
-
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_claims_cursor(rows[-1][6], rows[-1][0])
 
+    return [dict(zip(RECENT_CLAIM_FIELDS, row[:6])) for row in rows], next_cursor
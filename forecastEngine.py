@@ -0,0 +1,162 @@
+import sqlite3
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from claimParts import PARTS_TABLE, sync_claim_parts
+
+# Batch forecaster for the daily claims / parts-demand series behind /forecast-claims/.
+#
+# Every (model, part) series, plus one claim-count series per model, shares the same daily
+# calendar, so they are fitted together as columns of one matrix: a ridge regression on
+# trend + day-of-week dummies + annual Fourier terms, solved once for all columns with a
+# single np.linalg.solve. There is no per-series Python loop anywhere in the fit.
+
+FORECAST_TABLE = "claims_forecast"
+CLAIMS_SERIES_PART = ""          # PART_CD used for a model's claim-count series
+FORECAST_HORIZON_DAYS = 90
+TRAINING_WINDOW_DAYS = 3 * 365   # fit on recent history so old regimes don't dominate the trend
+ANNUAL_HARMONICS = 2
+RIDGE_ALPHA = 1.0
+MIN_STORED_VALUE = 0.005         # predictions that round to 0.00 are not stored
+
+
+def design_matrix(day_ordinals: np.ndarray, origin: int, span: int) -> np.ndarray:
+    """Regressors for the given days: intercept, linear trend, day-of-week dummies, annual Fourier terms."""
+    t = (day_ordinals - origin) / max(span, 1)
+    weekday = day_ordinals % 7
+    columns = [np.ones_like(t), t]
+    columns += [(weekday == d).astype(float) for d in range(1, 7)]
+    for h in range(1, ANNUAL_HARMONICS + 1):
+        angle = 2 * np.pi * h * day_ordinals / 365.25
+        columns += [np.sin(angle), np.cos(angle)]
+    return np.column_stack(columns)
+
+
+def fit_predict(day_ordinals: np.ndarray, Y: np.ndarray, horizon: int = FORECAST_HORIZON_DAYS):
+    """
+    Fit every column of Y (n_days x n_series, one row per consecutive day) at once and
+    return (ordinals, predictions) covering the history plus `horizon` future days.
+    """
+    origin, span = int(day_ordinals[0]), len(day_ordinals) - 1
+    X = design_matrix(day_ordinals, origin, span)
+
+    penalty = RIDGE_ALPHA * np.eye(X.shape[1])
+    penalty[0, 0] = 0.0  # never shrink the intercept
+    coefficients = np.linalg.solve(X.T @ X + penalty, X.T @ Y)
+
+    all_ordinals = np.arange(day_ordinals[0], day_ordinals[-1] + horizon + 1)
+    predictions = design_matrix(all_ordinals, origin, span) @ coefficients
+    return all_ordinals, np.clip(predictions, 0, None)
+
+
+def load_daily_series(conn: sqlite3.Connection, window_days: int = TRAINING_WINDOW_DAYS):
+    """
+    Build the dense day x series matrix from claim_parts.
+    Series keys are (CRLN_CD, PART_CD); PART_CD == CLAIMS_SERIES_PART is the model's claim count.
+    """
+    rows = conn.execute(f"""
+        SELECT RPR_DAY, CRLN_CD, PART_CD, SUM(PART_QT), SUM(PART_SEQ = 1)
+        FROM {PARTS_TABLE}
+        WHERE RPR_DAY >= date((SELECT MAX(RPR_DAY) FROM {PARTS_TABLE}), '-{window_days} days')
+        GROUP BY RPR_DAY, CRLN_CD, PART_CD
+    """).fetchall()
+    if not rows:
+        return None, [], None
+
+    days, models, parts, quantities, claims = zip(*rows)
+    ordinals = np.array([date.fromisoformat(d).toordinal() for d in days])
+    first = ordinals.min()
+    day_ordinals = np.arange(first, ordinals.max() + 1)
+    day_index = ordinals - first
+
+    keys = {}
+    part_series = np.array([keys.setdefault((m or "", p), len(keys)) for m, p in zip(models, parts)])
+    claim_series = np.array([keys.setdefault((m or "", CLAIMS_SERIES_PART), len(keys)) for m in models])
+
+    Y = np.zeros((len(day_ordinals), len(keys)))
+    np.add.at(Y, (day_index, part_series), np.array(quantities, dtype=float))
+    np.add.at(Y, (day_index, claim_series), np.array(claims, dtype=float))
+    return day_ordinals, list(keys), Y
+
+
+def run_forecast(conn: sqlite3.Connection, horizon: int = FORECAST_HORIZON_DAYS) -> int:
+    """Refit every series and replace the stored forecast. Returns the number of rows stored."""
+    sync_claim_parts(conn)
+    started = time.perf_counter()
+    day_ordinals, keys, Y = load_daily_series(conn)
+    if day_ordinals is None:
+        return 0
+
+    all_ordinals, predictions = fit_predict(day_ordinals, Y, horizon)
+    fit_seconds = time.perf_counter() - started
+
+    day_idx, series_idx = np.nonzero(predictions >= MIN_STORED_VALUE)
+    day_strings = [date.fromordinal(int(o)).isoformat() for o in all_ordinals]
+    rows = [
+        (day_strings[d], keys[s][0], keys[s][1], round(float(v), 2))
+        for d, s, v in zip(day_idx, series_idx, predictions[day_idx, series_idx])
+    ]
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (
+            FORECAST_DAY TEXT NOT NULL,
+            CRLN_CD TEXT NOT NULL,
+            PART_CD TEXT NOT NULL,
+            PREDICTED REAL NOT NULL,
+            GENERATED_AT TEXT NOT NULL,
+            PRIMARY KEY (FORECAST_DAY, CRLN_CD, PART_CD)
+        ) WITHOUT ROWID
+    """)
+    generated_at = datetime.now().isoformat(timespec="seconds")
+    with conn:
+        conn.execute(f"DELETE FROM {FORECAST_TABLE}")
+        conn.executemany(
+            f"INSERT INTO {FORECAST_TABLE} VALUES (?, ?, ?, ?, '{generated_at}')", rows
+        )
+    print(f"✅ Forecast {len(keys)} series x {len(all_ordinals)} days in {fit_seconds:.3f}s, stored {len(rows)} rows.")
+    return len(rows)
+
+
+def run_forecast_job(db_path: str) -> int:
+    """Entry point for the scheduled refresh; uses its own connection so it can run off the event loop."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return run_forecast(conn)
+    finally:
+        conn.close()
+
+
+def has_forecast(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FORECAST_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+if __name__ == "__main__":
+    # Benchmark: batched fit vs one lstsq per series, on synthetic Poisson series.
+    rng = np.random.default_rng(0)
+    n_days = TRAINING_WINDOW_DAYS
+    day_ordinals = np.arange(date(2023, 1, 1).toordinal(), date(2023, 1, 1).toordinal() + n_days)
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * day_ordinals / 7)
+
+    print(f"{'series':>8} {'batched (s)':>12} {'per-series loop (s)':>20} {'speedup':>8}")
+    for n_series in (100, 1000, 5000, 20000):
+        rates = rng.uniform(0.1, 5.0, n_series)
+        Y = rng.poisson(np.outer(weekly, rates)).astype(float)
+
+        started = time.perf_counter()
+        fit_predict(day_ordinals, Y)
+        batched = time.perf_counter() - started
+
+        # Extrapolate the loop from a sample so the large sizes stay quick to run.
+        sample = min(n_series, 200)
+        X = design_matrix(day_ordinals, int(day_ordinals[0]), n_days - 1)
+        started = time.perf_counter()
+        for s in range(sample):
+            np.linalg.lstsq(X, Y[:, s], rcond=None)
+        looped = (time.perf_counter() - started) * n_series / sample
+
+        print(f"{n_series:>8} {batched:>12.4f} {looped:>20.4f} {looped / batched:>7.1f}x")
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from typing import Callable, List, NamedTuple, Optional, Set, Tuple
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from llmMetrics import llm_metrics
+from schemaSummary import keywords
+
+# Local first pass of the "is this a question about the data?" gate. Greetings and small talk
+# are rejected by rules, as are off-topic requests that don't mention the data; prompts that
+# use the database's vocabulary together with an analytic phrase are accepted by rules unless
+# they are also off-topic requests ("a poem about claims"), which go to the LLM; everything
+# else is scored by a TF-IDF + logistic regression model trained on seed examples and logged
+# LLM verdicts. Only verdicts below the confidence threshold go to the LLM gatekeeper. The
+# model is retrained in a worker thread, so requests keep using the previous one meanwhile.
+#
+# GATEKEEPER_MODE: "local" (default) decides confident cases locally, "shadow" always asks
+# the LLM and records how often the local verdict agreed, "llm" skips the local classifier.
+
+GATEKEEPER_MODE = os.getenv("GATEKEEPER_MODE", "local").lower()
+GATEKEEPER_CONFIDENCE = float(os.getenv("GATEKEEPER_CONFIDENCE", 0.9))
+LOG_TABLE = "gatekeeper_log"
+# The model is retrained after this many new LLM verdicts have been logged.
+RETRAIN_EVERY = int(os.getenv("GATEKEEPER_RETRAIN_EVERY", 50))
+
+GREETING = re.compile(
+    r"^\s*(hi|hello|hey|hiya|yo|thanks|thank you|thx|cheers|bye|goodbye|ok|okay|cool|great|nice|"
+    r"good (morning|afternoon|evening|night)|how are you)\b[\s\w]{0,12}[!.,?\s]*$",
+    re.IGNORECASE,
+)
+ANALYTIC = re.compile(
+    r"\b(how many|how much|count|number of|total|sum|average|avg|mean|list|show|top \d+|highest|lowest|"
+    r"most|least|per|group by|breakdown|distribution|between|trend|compare|percentage|share|ratio)\b",
+    re.IGNORECASE,
+)
+OFF_TOPIC = re.compile(
+    r"\b(weather|joke|poem|recipe|who are you|your name|story|song|lyrics|news|bitcoin|capital of|"
+    r"translate|movie|football|write (me )?(an? )?(email|essay|letter))\b",
+    re.IGNORECASE,
+)
+# Vocabulary words too generic to mark a prompt as being about the data.
+GENERIC_WORDS = {"what", "which", "show", "list", "all", "year", "month", "day", "number", "name", "code", "date"}
+
+GREETING_REPLY = "Hello! Ask me about the warranty claims data, e.g. 'how many claims were approved last month?'"
+REJECT_REPLY = "I can help with SQL/data questions. Try: 'count claims by month for 2025'."
+
+SEED_VALID = [
+    "total claims this year", "list claims between two dates", "group by model and count",
+    "how many claims were rejected in July 2025", "count claims by status", "average claim amount by dealer",
+    "which car model has the most claims", "top 10 dealers by claim cost", "show pending claims",
+    "claims per month for 2024", "what is the total labor cost", "sum of part amounts by part code",
+    "compare approved and rejected claims by month", "claim trend over the last 6 months",
+    "number of claims with sublet repairs", "highest estimate amount", "claims for VIN 1234",
+    "breakdown of claims by warranty type", "average odometer reading at repair",
+    "which parts cost the most", "distribution of claim status in 2025", "claims by distributor",
+]
+SEED_INVALID = [
+    "hi", "hello there", "thanks!", "thank you so much", "good morning", "how are you", "bye",
+    "tell me a joke", "what's the weather like", "write a poem about cars", "who are you",
+    "what is your name", "translate hello to french", "recommend a movie", "what is the capital of france",
+    "write me an email to my boss", "sing a song", "what's the news today", "asdfgh", "ok",
+    "can you help me", "what can you do",
+]
+
+
+class Verdict(NamedTuple):
+    is_valid: bool
+    reply: str
+    confidence: float
+    source: str  # "rule" or "model"
+
+
+def rejection_reply(prompt: str) -> str:
+    return GREETING_REPLY if GREETING.match(prompt or "") else REJECT_REPLY
+
+
+class LocalGatekeeper:
+    def __init__(self, conn: sqlite3.Connection, vocabulary: Callable[[], Set[str]]):
+        self.conn = conn
+        self.vocabulary = vocabulary
+        self.model = None
+        self.trained_on = 0
+        self._new_labels = 0
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LOG_TABLE} (
+                PROMPT TEXT NOT NULL,
+                IS_VALID INTEGER NOT NULL,
+                REPLY TEXT NOT NULL,
+                CREATED_AT REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.train()
+
+    def _training_data(self) -> Tuple[List[str], List[int]]:
+        # Only the LLM's verdicts are labels: prompts this gatekeeper let through itself would
+        # just reinforce its own mistakes.
+        texts = SEED_VALID + SEED_INVALID
+        labels = [1] * len(SEED_VALID) + [0] * len(SEED_INVALID)
+        logged = self.conn.execute(f"SELECT PROMPT, IS_VALID FROM {LOG_TABLE}").fetchall()
+        texts += [prompt for prompt, _ in logged]
+        labels += [int(is_valid) for _, is_valid in logged]
+        return texts, labels
+
+    @staticmethod
+    def _fit(texts: List[str], labels: List[int]) -> Pipeline:
+        model = Pipeline([
+            # Character n-grams cope with typos and code-like tokens (STS_CD, CX-5).
+            ("tfidf", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), lowercase=True, sublinear_tf=True)),
+            ("clf", LogisticRegression(C=4.0, class_weight="balanced", max_iter=1000)),
+        ])
+        return model.fit(texts, labels)
+
+    def train(self):
+        started = time.perf_counter()
+        texts, labels = self._training_data()
+        self._new_labels = 0
+        self.model, self.trained_on = self._fit(texts, labels), len(texts)
+        print(f"✅ Gatekeeper classifier trained on {len(texts)} prompts in {time.perf_counter() - started:.2f}s.")
+
+    async def retrain(self):
+        """train() with the fit in a worker thread; the log is read here, on the connection's thread."""
+        started = time.perf_counter()
+        texts, labels = self._training_data()
+        self._new_labels = 0
+        try:
+            model = await asyncio.to_thread(self._fit, texts, labels)
+        except Exception as e:
+            print(f"⚠️ Gatekeeper retraining failed: {e}")
+            return
+        self.model, self.trained_on = model, len(texts)
+        print(f"✅ Gatekeeper classifier retrained on {len(texts)} prompts in {time.perf_counter() - started:.2f}s.")
+
+    def log(self, prompt: str, is_valid: bool, reply: str) -> bool:
+        """Store an LLM verdict as a training label. Returns whether enough have accumulated to retrain."""
+        self.conn.execute(f"INSERT INTO {LOG_TABLE} VALUES (?, ?, ?, ?)", (prompt, int(is_valid), reply or "", time.time()))
+        self.conn.commit()
+        self._new_labels += 1
+        return self._new_labels >= RETRAIN_EVERY
+
+    def classify(self, prompt: str) -> Verdict:
+        text = (prompt or "").strip()
+        if not text or GREETING.match(text):
+            return Verdict(False, rejection_reply(text), 1.0, "rule")
+
+        mentions_data = bool((keywords(text) - GENERIC_WORDS) & self.vocabulary())
+        off_topic = OFF_TOPIC.search(text) is not None
+        if off_topic and not mentions_data:
+            return Verdict(False, REJECT_REPLY, 0.99, "rule")
+        if mentions_data and ANALYTIC.search(text) and not off_topic:
+            return Verdict(True, "", 0.99, "rule")
+
+        valid_probability = float(self.model.predict_proba([text])[0][1])
+        if off_topic:
+            # An off-topic request that mentions the data is the LLM's call either way.
+            return Verdict(valid_probability >= 0.5, "" if valid_probability >= 0.5 else REJECT_REPLY, 0.5, "model")
+        if valid_probability >= 0.5:
+            return Verdict(True, "", valid_probability, "model")
+        return Verdict(False, REJECT_REPLY, 1 - valid_probability, "model")
+
+
+# Verdicts made locally vs by the LLM, and in shadow mode how often the two agreed.
+gatekeeper_stats = llm_metrics.feature("gatekeeper", info=lambda: {"mode": GATEKEEPER_MODE, "threshold": GATEKEEPER_CONFIDENCE})
+
+
+class Gatekeeper:
+    """gatekeep_question with the local classifier in front of the LLM call."""
+
+    def __init__(self, conn: sqlite3.Connection, client, vocabulary: Callable[[], Set[str]],
+                 mode: str = GATEKEEPER_MODE, threshold: float = GATEKEEPER_CONFIDENCE):
+        self.client = client
+        self.mode = mode
+        self.threshold = threshold
+        self.local = LocalGatekeeper(conn, vocabulary) if mode in ("local", "shadow") else None
+        self._retraining: Optional[asyncio.Task] = None
+
+    async def _ask_llm(self, prompt: str) -> Tuple[bool, str]:
+        gatekeeper_stats.count(llmCalls=1)
+        is_valid, reply = await self.client.gatekeep_question(prompt)
+        if self.local and self.local.log(prompt, is_valid, reply):
+            if self._retraining is None or self._retraining.done():
+                self._retraining = asyncio.create_task(self.local.retrain())
+        return is_valid, reply
+
+    async def gatekeep(self, prompt: str) -> Tuple[bool, str]:
+        if self.local is None:
+            return await self._ask_llm(prompt)
+
+        started = time.perf_counter()
+        verdict = self.local.classify(prompt)
+        confident = verdict.confidence >= self.threshold
+        decided = self.mode == "local" and confident
+        gatekeeper_stats.count(requests=1, localAccepts=int(decided and verdict.is_valid),
+                               localRejects=int(decided and not verdict.is_valid))
+        gatekeeper_stats.observe("local", (time.perf_counter() - started) * 1000)
+        if decided:
+            return verdict.is_valid, verdict.reply
+
+        is_valid, reply = await self._ask_llm(prompt)
+        if self.mode == "shadow":
+            agreed = verdict.is_valid == is_valid
+            # False accepts: local said valid, the LLM rejected; false rejects the other way round.
+            gatekeeper_stats.count(shadowCompared=1, shadowAgreed=int(agreed), shadowConfident=int(confident),
+                                   shadowConfidentAgreed=int(confident and agreed),
+                                   falseAccepts=int(not agreed and verdict.is_valid),
+                                   falseRejects=int(not agreed and not verdict.is_valid))
+            if not agreed:
+                print(f"⚠️ Gatekeeper disagreement ({verdict.source}, {verdict.confidence:.2f}): "
+                      f"local={verdict.is_valid} llm={is_valid} for {prompt!r}")
+        return is_valid, reply
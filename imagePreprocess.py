@@ -0,0 +1,265 @@
+import asyncio
+import io
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pymupdf
+from fastapi import UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from llmMetrics import llm_metrics
+
+# Shrinks uploaded claim scans and phone photos before they are sent to the vision model. The
+# upload is read in chunks and rejected once it passes VISION_MAX_UPLOAD_MB; the image is then
+# decoded (JPEGs at a reduced scale straight away), rotated upright from its EXIF orientation,
+# turned grayscale, deskewed and downscaled to what the model actually looks at, and
+# re-encoded as a compact JPEG. The model fits high-detail images into 2048x2048 and then
+# scales the short side to 768 px, so anything larger only costs upload time. PDF pages are
+# rendered directly at that size and then go through the same steps.
+# The CPU work runs on a small dedicated thread pool, off the event loop.
+
+VISION_MAX_UPLOAD_MB = float(os.getenv("VISION_MAX_UPLOAD_MB", 20))
+VISION_MAX_LONG_SIDE = int(os.getenv("VISION_MAX_LONG_SIDE", 2048))
+VISION_MAX_SHORT_SIDE = int(os.getenv("VISION_MAX_SHORT_SIDE", 768))
+VISION_GRAYSCALE = os.getenv("VISION_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+VISION_DESKEW = os.getenv("VISION_DESKEW", "true").lower() in ("1", "true", "yes")
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", 80))
+VISION_PREPROCESS_WORKERS = int(os.getenv("VISION_PREPROCESS_WORKERS", 2))
+# Largest skew corrected, and the smallest worth a rotation, in degrees.
+MAX_SKEW_DEGREES = 10.0
+MIN_SKEW_DEGREES = 0.5
+READ_CHUNK_BYTES = 1024 * 1024
+
+# Part of the extraction cache key, since the settings change what the model is shown.
+PREPROCESS_VERSION = (f"v1-{VISION_MAX_LONG_SIDE}x{VISION_MAX_SHORT_SIDE}-q{VISION_JPEG_QUALITY}"
+                      f"-{'gray' if VISION_GRAYSCALE else 'rgb'}-{'deskew' if VISION_DESKEW else 'nodeskew'}")
+
+_executor = ThreadPoolExecutor(max_workers=VISION_PREPROCESS_WORKERS, thread_name_prefix="vision-preprocess")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    original_width: Optional[int]
+    original_height: Optional[int]
+    skew_degrees: float
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """Prompt tokens a high-detail image of this size costs: 85 plus 170 per 512 px tile after the model's own scaling."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = int(VISION_MAX_UPLOAD_MB * 1024 * 1024)) -> bytes:
+    """The upload's bytes, read in chunks; raises UploadTooLarge past `max_bytes`."""
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(f"Upload is {file.size / 1048576:.1f} MB; the limit is {max_bytes / 1048576:g} MB.")
+    buffer = bytearray()
+    while chunk := await file.read(READ_CHUNK_BYTES):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes / 1048576:g} MB limit.")
+    return bytes(buffer)
+
+
+def _target_size(width: int, height: int) -> tuple:
+    scale = min(1.0, VISION_MAX_LONG_SIDE / max(width, height), VISION_MAX_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_skew(image: Image.Image) -> float:
+    """
+    Skew of the text lines in degrees (positive = counter-clockwise), from the rotation that
+    makes the row profile of dark pixels sharpest, searched coarse then fine on a small copy.
+    """
+    small = image.convert("L")
+    small.thumbnail((800, 800))
+    pixels = np.asarray(small, dtype=np.float32)
+    ink = pixels < min(pixels.mean() - 2 * pixels.std() / 3, 160)
+    if ink.mean() < 0.002:
+        return 0.0
+    ink_image = Image.fromarray((ink * 255).astype(np.uint8))
+
+    def sharpness(angle: float) -> float:
+        rotated = np.asarray(ink_image.rotate(angle, resample=Image.NEAREST, expand=False), dtype=np.float32)
+        profile = rotated.sum(axis=1)
+        return float(np.square(np.diff(profile)).sum())
+
+    best = max(np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 0.01, 1.0), key=sharpness)
+    best = max(np.arange(best - 1.0, best + 1.01, 0.1), key=sharpness)
+    # Rotating by `best` straightens the page, so the page is skewed by -best.
+    return -round(float(best), 1)
+
+
+def prepare_image(data: bytes) -> PreparedImage:
+    """Decode, orient, grayscale, deskew, downscale and re-encode an uploaded image. Blocking."""
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, which is much cheaper than a full decode;
+    # draft never goes below the requested size.
+    if image.format == "JPEG":
+        image.draft("L" if VISION_GRAYSCALE else "RGB", _target_size(*original_size))
+    image = ImageOps.exif_transpose(image)
+    return _finish(image, len(data), original_size)
+
+
+def rasterize_pdf(data: bytes, max_pages: int) -> List[PreparedImage]:
+    """Each page of a PDF rendered straight at the vision target size and prepared like an image. Blocking."""
+    with pymupdf.open(stream=data, filetype="pdf") as document:
+        if document.page_count > max_pages:
+            raise ValueError(f"PDF has {document.page_count} pages; at most {max_pages} are accepted.")
+        pages = []
+        for page in document:
+            width, height = page.rect.width, page.rect.height
+            # Render at exactly the target size rather than rasterizing at print resolution and shrinking.
+            zoom = min(VISION_MAX_LONG_SIDE / max(width, height), VISION_MAX_SHORT_SIDE / min(width, height))
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom),
+                                     colorspace=pymupdf.csGRAY if VISION_GRAYSCALE else pymupdf.csRGB, alpha=False)
+            image = Image.frombytes("L" if VISION_GRAYSCALE else "RGB", (pixmap.width, pixmap.height), pixmap.samples)
+            # Each page is credited with an equal share of the file's bytes.
+            pages.append(_finish(image, len(data) // document.page_count, image.size))
+        return pages
+
+
+def _finish(image: Image.Image, original_bytes: int, original_size: tuple) -> PreparedImage:
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+    image = image.convert("L" if VISION_GRAYSCALE else "RGB")
+
+    # Downscale before deskewing: rotating the full-resolution photo costs more than everything else together.
+    size = _target_size(*image.size)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+
+    skew = 0.0
+    if VISION_DESKEW:
+        skew = estimate_skew(image)
+        if abs(skew) >= MIN_SKEW_DEGREES:
+            fill = 255 if image.mode == "L" else "white"
+            image = image.rotate(-skew, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+            # Expanding for the rotation can push the image just past the target again.
+            size = _target_size(*image.size)
+            if size != image.size:
+                image = image.resize(size, Image.LANCZOS)
+        else:
+            skew = 0.0
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    return PreparedImage(out.getvalue(), "image/jpeg", image.width, image.height, original_bytes,
+                         original_size[0], original_size[1], skew)
+
+
+# Bytes and estimated image tokens before vs after preprocessing, and preprocessing time.
+preprocess_stats = llm_metrics.feature("visionPreprocess", info=lambda: {"settings": PREPROCESS_VERSION})
+
+
+def _record(prepared: PreparedImage, seconds: float, passthrough: bool = False):
+    tokens_in = tokens_out = 0
+    if prepared.original_width:
+        tokens_in = vision_tokens(prepared.original_width, prepared.original_height)
+        tokens_out = vision_tokens(prepared.width, prepared.height)
+    preprocess_stats.count(images=1, passthrough=int(passthrough), bytesIn=prepared.original_bytes,
+                           bytesOut=len(prepared.data), estimatedTokensIn=tokens_in, estimatedTokensOut=tokens_out)
+    preprocess_stats.observe("preprocess", seconds * 1000)
+
+
+async def prepare_upload(data: bytes, mime_type: str) -> PreparedImage:
+    """prepare_image on the preprocessing pool; images Pillow can't decode are passed through unchanged."""
+    started = time.perf_counter()
+    try:
+        prepared = await asyncio.get_running_loop().run_in_executor(_executor, prepare_image, data)
+        passthrough = False
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"⚠️ Could not preprocess the image ({e}); sending it unchanged.")
+        prepared = PreparedImage(data, mime_type, 0, 0, len(data), None, None, 0.0)
+        passthrough = True
+    _record(prepared, time.perf_counter() - started, passthrough)
+    return prepared
+
+
+async def prepare_pdf_upload(data: bytes, max_pages: int) -> List[PreparedImage]:
+    """rasterize_pdf on the preprocessing pool; raises ValueError for unreadable or oversized PDFs."""
+    started = time.perf_counter()
+    try:
+        pages = await asyncio.get_running_loop().run_in_executor(_executor, rasterize_pdf, data, max_pages)
+    except pymupdf.FileDataError as e:
+        raise ValueError(f"Could not read the PDF: {e}") from e
+    for page in pages:
+        _record(page, (time.perf_counter() - started) / len(pages))
+    return pages
+
+
+if __name__ == "__main__":
+    # Bytes, image tokens, extraction latency and accuracy with and without preprocessing over
+    # a fixture set: every image in DIR, with the expected WarrantyClaimData in a .json of the
+    # same name where available (otherwise the two runs are compared with each other).
+    #   python imagePreprocess.py DIR
+    import base64
+    import json
+    import mimetypes
+    import sys
+    from pathlib import Path
+
+    from azureAiClient import AsyncAzureAiClient
+    from llmMetrics import llm_metrics
+
+    def same(a, b) -> bool:
+        return str(a).strip().lower() == str(b).strip().lower()
+
+    def accuracy(result: dict, expected: dict) -> float:
+        fields = [name for name, value in expected.items() if value not in (None, "")]
+        return sum(same(result.get(name), expected[name]) for name in fields) / len(fields) if fields else 1.0
+
+    async def extract(client, data: bytes, mime_type: str) -> tuple:
+        tokens = llm_metrics.stats()["totals"]["promptTokens"]
+        started = time.perf_counter()
+        result = await client.extract_warranty_claim_from_base64(base64.b64encode(data).decode("utf-8"), mime_type)
+        return result.model_dump(), time.perf_counter() - started, llm_metrics.stats()["totals"]["promptTokens"] - tokens
+
+    async def main(directory: Path):
+        client = AsyncAzureAiClient.shared()
+        rows = []
+        for path in sorted(directory.iterdir()):
+            mime_type, _ = mimetypes.guess_type(path.name)
+            if not mime_type or not mime_type.startswith("image/"):
+                continue
+            data = path.read_bytes()
+            started = time.perf_counter()
+            prepared = prepare_image(data)
+            prep_seconds = time.perf_counter() - started
+            raw, raw_seconds, raw_tokens = await extract(client, data, mime_type)
+            small, small_seconds, small_tokens = await extract(client, prepared.data, prepared.mime_type)
+            expected_path = path.with_suffix(".json")
+            expected = json.loads(expected_path.read_text()) if expected_path.exists() else raw
+            rows.append((path.name, len(data), len(prepared.data), raw_tokens, small_tokens, raw_seconds,
+                         small_seconds + prep_seconds, accuracy(raw, expected), accuracy(small, expected)))
+            print(f"{path.name:<28} {len(data) / 1024:>8.0f} KB -> {len(prepared.data) / 1024:>6.0f} KB  "
+                  f"tokens {raw_tokens:>5} -> {small_tokens:>5}  {raw_seconds * 1000:>6.0f} ms -> "
+                  f"{(small_seconds + prep_seconds) * 1000:>6.0f} ms (prep {prep_seconds * 1000:.0f} ms, "
+                  f"skew {prepared.skew_degrees:+.1f}°)  accuracy {rows[-1][7]:.2f} -> {rows[-1][8]:.2f}")
+        await client.aclose()
+        if rows:
+            totals = [sum(column) for column in list(zip(*rows))[1:]]
+            print(f"\n{len(rows)} images: {totals[0] / 1048576:.1f} MB -> {totals[1] / 1048576:.2f} MB, "
+                  f"tokens {totals[2]} -> {totals[3]}, avg latency {totals[4] / len(rows) * 1000:.0f} ms -> "
+                  f"{totals[5] / len(rows) * 1000:.0f} ms, accuracy {totals[6] / len(rows):.3f} -> {totals[7] / len(rows):.3f}")
+
+    asyncio.run(main(Path(sys.argv[1])))
@@ -0,0 +1,323 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Instrumentation for every model call: gatekeeper, SQL generation, chart, natural-language
+# answers and vision extraction. Each call records its wall time, the time it queued for a
+# deployment slot, prompt/completion/cached tokens, estimated cost and retries, labelled by
+# the endpoint that triggered it, the operation and the model. Calls answered from the SQL
+# cache are counted as cache hits. TraceMiddleware gives every request a trace ID (taken
+# from an incoming X-Trace-Id header or generated) that is echoed in the response and
+# prefixed to the per-call log lines.
+#
+# The same registry holds every other feature's counters (charts built locally, gatekeeper
+# verdicts, tokens saved by packing, ...): each feature gets a FeatureMetrics from
+# llm_metrics.feature(name), and all of them are reported together under /llm-metrics/.
+
+TRACE_HEADER = "X-Trace-Id"
+LLM_LOG_CALLS = os.getenv("LLM_LOG_CALLS", "true").lower() in ("1", "true", "yes")
+# Histogram bucket upper bounds, in milliseconds.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# USD per million tokens: (input, cached input, output). Override or extend with
+# LLM_PRICES='{"gpt-4o": [2.5, 1.25, 10]}'; models not listed are costed at 0.
+PRICES_PER_MILLION: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "o4-mini": (1.10, 0.275, 4.40),
+}
+PRICES_PER_MILLION.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+endpoint: ContextVar[str] = ContextVar("endpoint", default="-")
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    prices = PRICES_PER_MILLION.get(model)
+    if prices is None:
+        # Dated deployments such as gpt-4o-2024-08-06 are priced as their base model.
+        prices = next((p for name, p in sorted(PRICES_PER_MILLION.items(), key=lambda item: -len(item[0]))
+                       if model.startswith(name)), (0.0, 0.0, 0.0))
+    input_price, cached_price, output_price = prices
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+class LlmCall:
+    """What one model call cost; filled in by the caller inside track_llm_call."""
+
+    def __init__(self, operation: str, model: str):
+        self.operation = operation
+        self.model = model
+        self.endpoint = endpoint.get()
+        self.trace_id = trace_id.get()
+        self.queue_seconds = 0.0
+        self.first_token_seconds: Optional[float] = None
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+
+    def add_usage(self, usage):
+        """Token counts from a chat-completions or responses API `usage` object (None is ignored)."""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+    @property
+    def cost(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.cached_tokens, self.completion_tokens)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "samples")
+
+    def __init__(self, window: int):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, ms: float):
+        self.counts[int(np.searchsorted(LATENCY_BUCKETS_MS, ms))] += 1
+        self.total += ms
+        self.samples.append(ms)
+
+    def summary(self) -> dict:
+        count = sum(self.counts)
+        cumulative = np.cumsum(self.counts).tolist()
+        return {
+            "count": count,
+            "avg": round(self.total / count, 1) if count else None,
+            "p50": round(float(np.percentile(self.samples, 50)), 1) if self.samples else None,
+            "p95": round(float(np.percentile(self.samples, 95)), 1) if self.samples else None,
+            # Cumulative counts per upper bound, as in a Prometheus histogram.
+            "buckets": {**{str(bound): n for bound, n in zip(LATENCY_BUCKETS_MS, cumulative)}, "+Inf": cumulative[-1]},
+        }
+
+
+class _Series:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.wall = _Histogram(window)
+        self.queue = _Histogram(window)
+        self.first_token = _Histogram(window)
+
+
+class FeatureMetrics:
+    """Named counters and latency histograms of one feature, plus an optional callable for its current state."""
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self._window = window
+        self.counters: Dict[str, float] = defaultdict(int)
+        self.timers: Dict[str, _Histogram] = {}
+        self.info: Optional[Callable[[], dict]] = None
+
+    def count(self, **amounts: float):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def observe(self, timer: str, ms: float):
+        with self._lock:
+            if timer not in self.timers:
+                self.timers[timer] = _Histogram(self._window)
+            self.timers[timer].observe(ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"counters": dict(sorted(self.counters.items())),
+                     "latencyMs": {timer: histogram.summary() for timer, histogram in sorted(self.timers.items())}}
+        if self.info:
+            stats.update(self.info())
+        return stats
+
+
+class LlmMetrics:
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._series: Dict[Tuple[str, str, str], _Series] = defaultdict(lambda: _Series(self._window))
+        self._features: Dict[str, FeatureMetrics] = {}
+
+    def feature(self, name: str, info: Optional[Callable[[], dict]] = None) -> FeatureMetrics:
+        """The metrics of a feature, created on first use. `info` adds its current state (sizes, settings) to the report."""
+        with self._lock:
+            if name not in self._features:
+                self._features[name] = FeatureMetrics(self._window)
+            feature = self._features[name]
+        if info is not None:
+            feature.info = info
+        return feature
+
+    def record(self, call: LlmCall, seconds: float, error: bool):
+        with self._lock:
+            series = self._series[(call.endpoint, call.operation, call.model)]
+            series.calls += 1
+            series.errors += error
+            series.retries += call.retries
+            series.prompt_tokens += call.prompt_tokens
+            series.completion_tokens += call.completion_tokens
+            series.cached_tokens += call.cached_tokens
+            series.cost += call.cost
+            series.wall.observe(seconds * 1000)
+            series.queue.observe(call.queue_seconds * 1000)
+            if call.first_token_seconds is not None:
+                series.first_token.observe(call.first_token_seconds * 1000)
+        if LLM_LOG_CALLS:
+            status = "failed" if error else f"{call.prompt_tokens}+{call.completion_tokens} tokens, ${call.cost:.5f}"
+            retries = f", {call.retries} retries" if call.retries else ""
+            print(f"⏱️ [{call.trace_id or '-'}] {call.endpoint} {call.operation} ({call.model}): {seconds * 1000:.0f} ms "
+                  f"(queued {call.queue_seconds * 1000:.0f} ms{retries}), {status}")
+
+    def record_cache_hit(self, operation: str, model: str):
+        """A call that was skipped because its result came from a cache."""
+        with self._lock:
+            self._series[(endpoint.get(), operation, model)].cache_hits += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            series = [
+                {
+                    "endpoint": name, "operation": operation, "model": model,
+                    "calls": s.calls, "errors": s.errors, "retries": s.retries, "cacheHits": s.cache_hits,
+                    "promptTokens": s.prompt_tokens, "completionTokens": s.completion_tokens,
+                    "cachedPromptTokens": s.cached_tokens, "costUsd": round(s.cost, 6),
+                    "wallMs": s.wall.summary(), "queueMs": s.queue.summary(),
+                    **({"firstTokenMs": s.first_token.summary()} if sum(s.first_token.counts) else {}),
+                }
+                for (name, operation, model), s in sorted(self._series.items())
+            ]
+        totals = {key: sum(s[key] for s in series) for key in
+                  ("calls", "errors", "retries", "cacheHits", "promptTokens", "completionTokens", "cachedPromptTokens")}
+        totals["costUsd"] = round(sum(s["costUsd"] for s in series), 6)
+        with self._lock:
+            features = sorted(self._features.items())
+        return {"totals": totals, "series": series, "features": {name: feature.stats() for name, feature in features}}
+
+    def prometheus(self) -> str:
+        """The same metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+            for metric, kind, help_text in (
+                ("llm_calls_total", "counter", "Model calls"),
+                ("llm_errors_total", "counter", "Model calls that failed"),
+                ("llm_retries_total", "counter", "Retried attempts"),
+                ("llm_cache_hits_total", "counter", "Calls answered from a cache instead of the model"),
+                ("llm_prompt_tokens_total", "counter", "Prompt tokens"),
+                ("llm_completion_tokens_total", "counter", "Completion tokens"),
+                ("llm_cached_prompt_tokens_total", "counter", "Prompt tokens served from the provider's prompt cache"),
+                ("llm_cost_usd_total", "counter", "Estimated cost in USD"),
+            ):
+                attribute = metric[len("llm_"):-len("_total")]
+                attribute = {"cost_usd": "cost", "cached_prompt_tokens": "cached_tokens"}.get(attribute, attribute)
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+                lines += [f"{metric}{{{_labels(key)}}} {getattr(s, attribute):g}" for key, s in items]
+            for metric, attribute, help_text in (
+                ("llm_call_duration_ms", "wall", "Wall time of model calls"),
+                ("llm_queue_duration_ms", "queue", "Time spent waiting for a deployment slot"),
+                ("llm_first_token_ms", "first_token", "Time to the first streamed token"),
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for key, s in items:
+                    histogram = getattr(s, attribute)
+                    cumulative = np.cumsum(histogram.counts).tolist()
+                    for bound, n in zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], cumulative):
+                        lines.append(f'{metric}_bucket{{{_labels(key)},le="{bound}"}} {n}')
+                    lines.append(f"{metric}_sum{{{_labels(key)}}} {histogram.total:.1f}")
+                    lines.append(f"{metric}_count{{{_labels(key)}}} {cumulative[-1]}")
+            features = sorted(self._features.items())
+
+        lines += ["# HELP feature_events_total Feature counters", "# TYPE feature_events_total counter"]
+        histograms = ["# HELP feature_duration_ms Feature latencies", "# TYPE feature_duration_ms histogram"]
+        for name, feature in features:
+            with feature._lock:
+                for counter, value in sorted(feature.counters.items()):
+                    lines.append(f"feature_events_total{{{_feature_labels(name, counter=counter)}}} {value:g}")
+                for timer, histogram in sorted(feature.timers.items()):
+                    labels = _feature_labels(name, timer=timer)
+                    cumulative = np.cumsum(histogram.counts).tolist()
+                    for bound, n in zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], cumulative):
+                        histograms.append(f'feature_duration_ms_bucket{{{labels},le="{bound}"}} {n}')
+                    histograms.append(f"feature_duration_ms_sum{{{labels}}} {histogram.total:.1f}")
+                    histograms.append(f"feature_duration_ms_count{{{labels}}} {cumulative[-1]}")
+        return "\n".join(lines + histograms) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(key: Tuple[str, str, str]) -> str:
+    name, operation, model = (_escape(value) for value in key)
+    return f'endpoint="{name}",operation="{operation}",model="{model}"'
+
+
+def _feature_labels(feature: str, **labels: str) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in {"feature": feature, **labels}.items())
+
+
+llm_metrics = LlmMetrics()
+
+
+@contextmanager
+def track_llm_call(operation: str, model: str) -> Iterator[LlmCall]:
+    """Time the enclosed model call and record it; the caller adds usage, queue time and retries."""
+    call = LlmCall(operation, model)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield call
+    except Exception:
+        error = True
+        raise
+    finally:
+        llm_metrics.record(call, time.perf_counter() - started, error)
+
+
+class TraceMiddleware:
+    """Assigns each HTTP request a trace ID and the endpoint label its model calls are recorded under."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_trace_id = Headers(scope=scope).get(TRACE_HEADER) or uuid.uuid4().hex[:16]
+        trace_token = trace_id.set(request_trace_id)
+        endpoint_token = endpoint.set(scope["path"])
+
+        async def send_with_trace_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[TRACE_HEADER] = request_trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            trace_id.reset(trace_token)
+            endpoint.reset(endpoint_token)
@@ -0,0 +1,459 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from contextPacker import count_tokens
+from llmMetrics import llm_metrics
+
+# Local stand-in for Azure OpenAI and OpenAI, for load tests and benchmarks of the /ai-* and
+# /extract-warranty-claim endpoints without cost or network variance. It serves the surface
+# the app uses: Azure chat completions (plain, streamed, and tool calls for the gatekeeper,
+# chart and vision extraction) and OpenAI chat completions and Responses (create, parse,
+# stream) for OpenAIAssistant and the pandas code generator.
+#
+# MOCK_LLM_MODE:
+#   "synthetic" (default) answers from the request itself: tool calls get arguments built
+#               from the tool's JSON schema, SQL prompts get MOCK_LLM_SQL, pandas prompts get
+#               MOCK_LLM_PANDAS_CODE, anything else a markdown answer.
+#   "record"    forwards each request to the real service, returns its answer and stores it
+#               in the cassette (a SQLite file) keyed on a hash of the request.
+#   "replay"    answers from the cassette; requests that were never recorded get a synthetic
+#               answer, or a 404 with MOCK_LLM_REPLAY_STRICT=true.
+# Streamed requests are recorded as their non-streamed equivalent and replayed as a stream,
+# so one recording serves both.
+#
+# Latency per call is drawn from a per-model distribution, seeded for repeatable runs:
+#   MOCK_LLM_LATENCY='{"default": "lognormal:800:0.4", "o4-mini": "fixed:2500"}'
+# with "fixed:<ms>", "uniform:<low>:<high>", "normal:<mean>:<sd>" or "lognormal:<median>:<sigma>".
+# Replays use the latency measured when recording unless MOCK_LLM_REPLAY_LATENCY=distribution.
+#
+# Run it with `python mockLlmServer.py [port]` and start the app with MOCK_LLM_URL pointing at
+# it (see azureAiClient.py).
+
+MOCK_LLM_MODE = os.getenv("MOCK_LLM_MODE", "synthetic").lower()
+MOCK_LLM_PORT = int(os.getenv("MOCK_LLM_PORT", 9100))
+MOCK_LLM_CASSETTE = os.getenv("MOCK_LLM_CASSETTE", "llm_cassette.db")
+MOCK_LLM_REPLAY_STRICT = os.getenv("MOCK_LLM_REPLAY_STRICT", "false").lower() in ("1", "true", "yes")
+MOCK_LLM_REPLAY_LATENCY = os.getenv("MOCK_LLM_REPLAY_LATENCY", "recorded").lower()
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", 42))
+# Share of calls answered with a 429, to exercise the client's retry policy.
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", 0))
+# Share of a streamed call's latency spent before the first token.
+MOCK_LLM_FIRST_TOKEN_FRACTION = float(os.getenv("MOCK_LLM_FIRST_TOKEN_FRACTION", 0.35))
+MOCK_LLM_ANSWER_TOKENS = int(os.getenv("MOCK_LLM_ANSWER_TOKENS", 120))
+MOCK_LLM_SQL = os.getenv("MOCK_LLM_SQL", "SELECT STS_CD, COUNT(*) AS claims FROM warrenty_table GROUP BY STS_CD")
+MOCK_LLM_PANDAS_CODE = os.getenv("MOCK_LLM_PANDAS_CODE", "result_df = df.head(10)")
+# Where "record" forwards requests; the app's own settings by default.
+MOCK_LLM_AZURE_UPSTREAM = os.getenv("MOCK_LLM_AZURE_UPSTREAM", os.getenv("AZURE_OPENAI_ENDPOINT", ""))
+MOCK_LLM_OPENAI_UPSTREAM = os.getenv("MOCK_LLM_OPENAI_UPSTREAM", "https://api.openai.com")
+
+DEFAULT_LATENCY = {
+    "default": "lognormal:800:0.4",
+    "gpt-4o": "lognormal:1200:0.4",
+    "gpt-4o-mini": "lognormal:700:0.4",
+    "o4-mini": "lognormal:2500:0.5",
+}
+LATENCY = {**DEFAULT_LATENCY, **json.loads(os.getenv("MOCK_LLM_LATENCY", "{}"))}
+# Roughly what a high-detail image costs in prompt tokens.
+IMAGE_TOKENS = 765
+CASSETTE_TABLE = "llm_cassette"
+GREETING = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|bye|good (morning|afternoon|evening)|how are you)\b", re.IGNORECASE)
+
+_rng = random.Random(MOCK_LLM_SEED)
+_rng_lock = threading.Lock()
+
+
+def sample_latency_ms(model: str) -> float:
+    spec = LATENCY.get(model) or next((LATENCY[name] for name in sorted(LATENCY, key=len, reverse=True)
+                                       if name != "default" and model.startswith(name)), LATENCY["default"])
+    kind, *params = spec.split(":")
+    params = [float(p) for p in params]
+    with _rng_lock:
+        if kind == "fixed":
+            return params[0]
+        if kind == "uniform":
+            return _rng.uniform(params[0], params[1])
+        if kind == "normal":
+            return max(0.0, _rng.gauss(params[0], params[1]))
+        if kind == "lognormal":
+            return params[0] * _rng.lognormvariate(0, params[1])
+        raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+def request_key(api: str, model: str, body: dict) -> str:
+    """Hash of what determines the answer; streaming options don't, so streams share recordings."""
+    relevant = {k: v for k, v in body.items() if k not in ("stream", "stream_options", "user", "metadata")}
+    relevant["model"] = model
+    return hashlib.sha256(json.dumps([api, relevant], sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ---------- Synthetic answers ----------
+def _message_text(content) -> Tuple[str, int]:
+    """Text of a message's content and the number of images in it."""
+    if isinstance(content, str):
+        return content, 0
+    texts, images = [], 0
+    for part in content or []:
+        if part.get("type") in ("text", "input_text", "output_text"):
+            texts.append(part.get("text", ""))
+        elif part.get("type") in ("image_url", "input_image"):
+            images += 1
+    return "\n".join(texts), images
+
+
+def _prompt(messages: List[dict]) -> Tuple[str, str, int]:
+    """(system/developer text, user text, image count) of a conversation."""
+    system, user, images = [], [], 0
+    for message in messages:
+        text, count = _message_text(message.get("content"))
+        images += count
+        (system if message.get("role") in ("system", "developer") else user).append(text)
+    return "\n".join(system), "\n".join(user), images
+
+
+def _messages(body: dict) -> List[dict]:
+    """The conversation of a chat-completions or Responses request."""
+    if "messages" in body:
+        return body["messages"]
+    messages = body.get("input")
+    messages = [{"role": "user", "content": messages}] if isinstance(messages, str) else list(messages or [])
+    if body.get("instructions"):
+        messages.insert(0, {"role": "system", "content": body["instructions"]})
+    return messages
+
+
+def _resolve(schema: dict, definitions: dict) -> dict:
+    while "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+    return schema
+
+
+def sample_from_schema(schema: dict, definitions: Optional[dict] = None, name: str = "") -> Any:
+    """A plausible value for a JSON schema, so tool calls and structured outputs validate."""
+    definitions = definitions if definitions is not None else schema.get("$defs", schema.get("definitions", {}))
+    schema = _resolve(schema, definitions)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [option for option in schema[key] if _resolve(option, definitions).get("type") != "null"]
+            return sample_from_schema(options[0] if options else schema[key][0], definitions, name)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "object")
+    lowered = name.lower()
+    if kind == "object":
+        return {prop: sample_from_schema(sub, definitions, prop) for prop, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), definitions, name)]
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return 2021 if "year" in lowered else (15000 if "miledge" in lowered or "odo" in lowered else 1)
+    if kind == "number":
+        return 125.5
+    if "date" in lowered:
+        return "2025-01-15"
+    if lowered == "vin":
+        return "JM3KFBCM1N0000001"
+    return f"MOCK-{name}" if name else "mock"
+
+
+def _chart_config(user_text: str) -> str:
+    """A Chart.js bar config from the CSV data in a chart prompt, or a fixed one."""
+    labels, values, label = ["A", "B", "C"], [3, 5, 2], "value"
+    data = user_text.split("Here is the data:", 1)[-1].strip()
+    try:
+        rows = list(csv.reader(io.StringIO(data)))
+        header, body = rows[0], [row for row in rows[1:] if len(row) == len(rows[0])]
+        if body and len(header) >= 2:
+            labels = [row[0] for row in body]
+            values = [float(row[-1]) for row in body]
+            label = header[-1]
+    except (IndexError, ValueError):
+        pass
+    return json.dumps({
+        "type": "bar",
+        "data": {"labels": labels, "datasets": [{"label": label, "data": values, "backgroundColor": "rgba(54, 162, 235, 0.6)"}]},
+        "options": {"responsive": True, "maintainAspectRatio": False},
+    })
+
+
+def synthetic_arguments(function_name: str, schema: dict, user_text: str) -> dict:
+    if function_name == "classify_prompt":
+        valid = not GREETING.match(user_text)
+        return {"isValidQuestion": valid, "reply": "" if valid else "Hello! Ask me about the warranty claims data."}
+    if function_name == "chart_input_builder" or set(schema.get("properties", {})) == {"title", "config"}:
+        return {"title": "Mock chart", "config": _chart_config(user_text)}
+    return sample_from_schema(schema)
+
+
+def synthetic_text(system_text: str, user_text: str) -> str:
+    if "pandas" in system_text.lower():
+        return MOCK_LLM_PANDAS_CODE
+    if re.search(r"\b(sql|sqlite)\b", system_text, re.IGNORECASE):
+        return MOCK_LLM_SQL
+    question = user_text.split("Data:", 1)[0].replace("Question:", "").strip()
+    sentence = "The figures above are synthetic and only exercise the response path. "
+    filler = sentence * max(1, MOCK_LLM_ANSWER_TOKENS // max(1, count_tokens(sentence)))
+    return f"**Answer (mock)**\n\n{question[:200]}\n\n{filler.strip()}"
+
+
+def _usage(prompt_tokens: int, completion_tokens: int, api: str) -> dict:
+    if api == "responses":
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0}}
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0}, "completion_tokens_details": {"reasoning_tokens": 0}}
+
+
+def synthetic_chat(model: str, body: dict) -> dict:
+    system_text, user_text, images = _prompt(_messages(body))
+    prompt_tokens = count_tokens(system_text + user_text) + images * IMAGE_TOKENS
+    tools = body.get("tools") or []
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    if tools:
+        choice = body.get("tool_choice")
+        name = choice["function"]["name"] if isinstance(choice, dict) else tools[0]["function"]["name"]
+        function = next(t["function"] for t in tools if t["function"]["name"] == name)
+        arguments = json.dumps(synthetic_arguments(name, function.get("parameters", {}), user_text))
+        message["tool_calls"] = [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                                  "function": {"name": name, "arguments": arguments}}]
+        completion_tokens = count_tokens(arguments)
+    else:
+        message["content"] = synthetic_text(system_text, user_text)
+        completion_tokens = count_tokens(message["content"])
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if tools else "stop", "message": message}],
+        "usage": _usage(prompt_tokens, completion_tokens, "chat"),
+    }
+
+
+def synthetic_response(model: str, body: dict) -> dict:
+    system_text, user_text, images = _prompt(_messages(body))
+    text_format = (body.get("text") or {}).get("format") or {}
+    if text_format.get("type") == "json_schema":
+        text = json.dumps(synthetic_arguments(text_format.get("name", ""), text_format.get("schema", {}), user_text))
+    else:
+        text = synthetic_text(system_text, user_text)
+    return _response_object(model, text, count_tokens(system_text + user_text) + images * IMAGE_TOKENS, count_tokens(text))
+
+
+def _response_object(model: str, text: str, prompt_tokens: int, completion_tokens: int, status: str = "completed") -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex[:12]}", "object": "response", "created_at": int(time.time()), "model": model,
+        "status": status, "parallel_tool_calls": True, "tool_choice": "auto", "tools": [],
+        "output": [] if status != "completed" else [{
+            "type": "message", "id": f"msg_{uuid.uuid4().hex[:12]}", "status": "completed", "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "usage": _usage(prompt_tokens, completion_tokens, "responses") if status == "completed" else None,
+    }
+
+
+# ---------- Streams built from a complete answer ----------
+def _pieces(text: str) -> List[str]:
+    return re.findall(r"\S*\s*", text)[:-1] or [text]
+
+
+def _chat_chunks(completion: dict, include_usage: bool) -> List[dict]:
+    base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+    message = completion["choices"][0]["message"]
+    # Azure opens with a content-filter chunk that has no choices.
+    chunks = [{**base, "choices": [], "prompt_filter_results": []}]
+    if message.get("tool_calls"):
+        calls = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": calls}, "finish_reason": None}]})
+    for piece in _pieces(message.get("content") or ""):
+        chunks.append({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+    chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": completion["choices"][0]["finish_reason"]}]})
+    if include_usage:
+        chunks.append({**base, "choices": [], "usage": completion.get("usage")})
+    return chunks
+
+
+def _response_events(response: dict) -> List[dict]:
+    text = "".join(part.get("text", "") for item in response.get("output", []) if item.get("type") == "message"
+                   for part in item.get("content", []))
+    item_id = next((item["id"] for item in response.get("output", []) if item.get("type") == "message"), "msg_mock")
+    events = [{"type": "response.created", "response": {**response, "status": "in_progress", "output": [], "usage": None}}]
+    events += [{"type": "response.output_text.delta", "item_id": item_id, "output_index": 0, "content_index": 0,
+                "delta": piece, "logprobs": []} for piece in _pieces(text)]
+    events.append({"type": "response.output_text.done", "item_id": item_id, "output_index": 0, "content_index": 0,
+                   "text": text, "logprobs": []})
+    events.append({"type": "response.completed", "response": response})
+    return [{**event, "sequence_number": i} for i, event in enumerate(events)]
+
+
+async def _stream(events: List[dict], latency_ms: float, api: str):
+    """Send events so the first lands after MOCK_LLM_FIRST_TOKEN_FRACTION of the latency and the last at its end."""
+    first_wait = latency_ms * MOCK_LLM_FIRST_TOKEN_FRACTION / 1000
+    step = latency_ms * (1 - MOCK_LLM_FIRST_TOKEN_FRACTION) / 1000 / max(1, len(events) - 1)
+    await asyncio.sleep(first_wait)
+    for i, event in enumerate(events):
+        if i:
+            await asyncio.sleep(step)
+        if api == "responses":
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        else:
+            yield f"data: {json.dumps(event)}\n\n"
+    if api != "responses":
+        yield "data: [DONE]\n\n"
+
+
+# ---------- Cassette ----------
+class Cassette:
+    def __init__(self, path: str = MOCK_LLM_CASSETTE):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CASSETTE_TABLE} (
+                KEY TEXT PRIMARY KEY,
+                API TEXT NOT NULL,
+                MODEL TEXT NOT NULL,
+                PROMPT_PREVIEW TEXT,
+                STATUS INTEGER NOT NULL,
+                RESPONSE TEXT NOT NULL,
+                LATENCY_MS REAL NOT NULL,
+                RECORDED_AT REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[int, dict, float]]:
+        with self._lock:
+            row = self.conn.execute(f"SELECT STATUS, RESPONSE, LATENCY_MS FROM {CASSETTE_TABLE} WHERE KEY = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1]), row[2]) if row else None
+
+    def put(self, key: str, api: str, model: str, preview: str, status: int, response: dict, latency_ms: float):
+        with self._lock:
+            self.conn.execute(f"INSERT OR REPLACE INTO {CASSETTE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, api, model, preview[:300], status, json.dumps(response), latency_ms, time.time()))
+            self.conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {CASSETTE_TABLE}").fetchone()[0]
+
+
+app = FastAPI(title="Mock LLM server")
+cassette = Cassette() if MOCK_LLM_MODE in ("record", "replay") else None
+# Calls per model ("calls:<model>") and per answer source ("source:<mode>"), and injected errors.
+mock_stats = llm_metrics.feature("mock", info=lambda: {
+    "mode": MOCK_LLM_MODE, "recorded": cassette.count() if cassette else None, "latency": LATENCY,
+})
+_upstream: Optional[httpx.AsyncClient] = None
+
+
+async def _forward(request: Request, body: dict) -> Tuple[int, dict]:
+    """Send the request, without streaming, to the real service."""
+    global _upstream
+    if _upstream is None:
+        _upstream = httpx.AsyncClient(timeout=httpx.Timeout(120, connect=10))
+    path = request.url.path
+    base = MOCK_LLM_AZURE_UPSTREAM if path.startswith("/openai/") else MOCK_LLM_OPENAI_UPSTREAM
+    headers = {k: v for k, v in request.headers.items() if k.lower() in ("api-key", "authorization", "openai-organization")}
+    upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+    response = await _upstream.post(base.rstrip("/") + path, params=dict(request.query_params), headers=headers, json=upstream_body)
+    return response.status_code, response.json()
+
+
+async def _answer(request: Request, api: str, model: str, body: dict, synthesize):
+    if MOCK_LLM_ERROR_RATE:
+        with _rng_lock:
+            fail = _rng.random() < MOCK_LLM_ERROR_RATE
+        if fail:
+            mock_stats.count(injectedErrors=1)
+            return JSONResponse({"error": {"code": "429", "message": "Mock throttling."}}, status_code=429,
+                                headers={"retry-after": "0"})
+
+    key = request_key(api, model, body)
+    status, payload, latency_ms, source = 200, None, None, MOCK_LLM_MODE
+    if MOCK_LLM_MODE in ("record", "replay"):
+        recorded = cassette.get(key)
+        if recorded is not None:
+            status, payload, recorded_ms = recorded
+            source = "replay"
+            latency_ms = recorded_ms if MOCK_LLM_REPLAY_LATENCY == "recorded" else None
+        elif MOCK_LLM_MODE == "record":
+            started = time.perf_counter()
+            status, payload = await _forward(request, body)
+            latency_ms = 0.0  # already spent waiting on the real service
+            if status == 200:
+                cassette.put(key, api, model, _prompt(_messages(body))[1], status, payload, (time.perf_counter() - started) * 1000)
+            source = "record"
+        elif MOCK_LLM_REPLAY_STRICT:
+            mock_stats.count(**{f"calls:{model}": 1, "source:miss": 1})
+            return JSONResponse({"error": {"code": "404", "message": f"No recording for request {key[:12]}."}}, status_code=404)
+        else:
+            source = "miss"
+    if payload is None:
+        payload = synthesize(model, body)
+    if latency_ms is None:
+        latency_ms = sample_latency_ms(model)
+    mock_stats.count(**{f"calls:{model}": 1, f"source:{source}": 1})
+
+    if status != 200:
+        await asyncio.sleep(latency_ms / 1000)
+        return JSONResponse(payload, status_code=status)
+    if body.get("stream"):
+        if api == "responses":
+            events = _response_events(payload)
+        else:
+            events = _chat_chunks(payload, (body.get("stream_options") or {}).get("include_usage", False))
+        return StreamingResponse(_stream(events, latency_ms, api), media_type="text/event-stream")
+    await asyncio.sleep(latency_ms / 1000)
+    return JSONResponse(payload)
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    return await _answer(request, "chat", deployment, await request.json(), synthetic_chat)
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    body = await request.json()
+    return await _answer(request, "chat", body.get("model", "default"), body, synthetic_chat)
+
+
+@app.post("/v1/responses")
+async def openai_responses(request: Request):
+    body = await request.json()
+    return await _answer(request, "responses", body.get("model", "default"), body, synthetic_response)
+
+
+@app.get("/mock/stats")
+async def get_mock_stats():
+    return {"success": True, "data": mock_stats.stats()}
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _upstream is not None:
+        await _upstream.aclose()
+
+
+if __name__ == "__main__":
+    import sys
+
+    import uvicorn
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else MOCK_LLM_PORT
+    print(f"✅ Mock LLM server ({MOCK_LLM_MODE}) on http://127.0.0.1:{port} — start the app with MOCK_LLM_URL=http://127.0.0.1:{port}")
+    uvicorn.run(app, host="127.0.0.1", port=port)
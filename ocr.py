@@ -3,11 +3,13 @@ from fastapi import HTTPException
 from openai import OpenAI
 
 from dto import WarrantyClaimData
+from azureAiClient import openai_base_url
+from llmMetrics import track_llm_call
 
 
 def extract_data_from_base64_openai(base64_image_data: str, mime_type: str) -> WarrantyClaimData:
     try:
-        client = OpenAI() # Assumes OPENAI_API_KEY is set in environment
+        client = OpenAI(base_url=openai_base_url()) # Assumes OPENAI_API_KEY is set in environment
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI client error: {e}")
 
@@ -31,12 +33,14 @@ def extract_data_from_base64_openai(base64_image_data: str, mime_type: str) -> W
     try:
         # Note: The original code used a `client.responses.parse` method which might be specific to an older/custom library version.
         # The standard approach with the official OpenAI Python library v1+ is to use tools for structured output.
-        response = client.chat.completions.create(
-            model="gpt-4o", # Using a powerful model for better accuracy
-            messages=messages,
-            tools=[{"type": "function", "function": {"name": "claim_data_extractor", "parameters": WarrantyClaimData.model_json_schema()}}],
-            tool_choice={"type": "function", "function": {"name": "claim_data_extractor"}}
-        )
+        with track_llm_call("vision", "gpt-4o") as call:
+            response = client.chat.completions.create(
+                model="gpt-4o", # Using a powerful model for better accuracy
+                messages=messages,
+                tools=[{"type": "function", "function": {"name": "claim_data_extractor", "parameters": WarrantyClaimData.model_json_schema()}}],
+                tool_choice={"type": "function", "function": {"name": "claim_data_extractor"}}
+            )
+            call.add_usage(response.usage)
         tool_call_args = response.choices[0].message.tool_calls[0].function.arguments
         # The arguments are a JSON string, so we parse it into our Pydantic model
         extracted_data = WarrantyClaimData.model_validate_json(tool_call_args)
@@ -0,0 +1,271 @@
+import builtins
+import hashlib
+import multiprocessing
+import os
+import queue
+import resource
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import pandas as pd
+
+# Runs LLM-written pandas code outside the server process. Workers are started through a
+# forkserver, a clean single-threaded process, since forking the server itself would copy the
+# locks of its background threads; each receives its own copy of the dataset, small enough that
+# this costs little, and runs in copy-on-write mode, so the generated code can't modify it for
+# later snippets. Each worker runs one snippet at a time under a CPU-time and an address-space
+# limit, the parent enforces a wall-time limit by killing the worker, and only the first
+# SANDBOX_MAX_ROWS rows of a result are sent back. Compiled snippets are cached per worker and
+# results per snippet, both keyed on the code's hash; the frame is read-only, so the same code
+# always gives the same result.
+#
+# This is resource isolation, not a security boundary: the workers run as the server's user.
+# Imports are limited to ALLOWED_IMPORTS and the obvious file entry points (open, pandas'
+# read_*/to_* and numpy's load/save) are removed, but determined code can still reach the
+# filesystem through library internals.
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 2))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", 5))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", 10))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 1024))
+SANDBOX_MAX_ROWS = int(os.getenv("SANDBOX_MAX_ROWS", 10_000))
+SANDBOX_RESULT_CACHE = int(os.getenv("SANDBOX_RESULT_CACHE", 256))
+
+# Modules generated code may import.
+ALLOWED_IMPORTS = {"pandas", "numpy", "datetime", "math", "re", "statistics", "collections", "dateutil"}
+
+
+class SandboxError(Exception):
+    pass
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+# pandas and numpy functions that read or write files; removed in the workers.
+PANDAS_IO = ["ExcelFile", "ExcelWriter", "HDFStore"]
+NUMPY_IO = ["load", "save", "savez", "savez_compressed", "loadtxt", "savetxt", "genfromtxt", "fromfile",
+            "fromregex", "memmap"]
+# DataFrame/Series writers; those that return the text when given no target are allowed to.
+FRAME_WRITERS = ["to_csv", "to_json", "to_html", "to_xml", "to_latex", "to_markdown", "to_string"]
+FRAME_FILE_WRITERS = ["to_excel", "to_parquet", "to_feather", "to_orc", "to_hdf", "to_pickle", "to_stata", "to_sql",
+                      "to_clipboard"]
+
+
+def _no_io(name: str):
+    def blocked(*args, **kwargs):
+        raise PermissionError(f"{name} is not available in the sandbox")
+    return blocked
+
+
+def _no_file_target(name: str, method):
+    def writer(self, *args, **kwargs):
+        if (args and args[0] is not None) or any(kwargs.get(key) is not None for key in ("path_or_buf", "buf")):
+            raise PermissionError(f"{name} to a file is not available in the sandbox")
+        return method(self, *args, **kwargs)
+    return writer
+
+
+def _remove_file_access():
+    import numpy as np
+
+    for name in [name for name in dir(pd) if name.startswith("read_")] + PANDAS_IO:
+        setattr(pd, name, _no_io(f"pd.{name}"))
+    for name in NUMPY_IO:
+        setattr(np, name, _no_io(f"np.{name}"))
+    for cls in (pd.DataFrame, pd.Series):
+        for name in FRAME_WRITERS:
+            if hasattr(cls, name):
+                setattr(cls, name, _no_file_target(f"{cls.__name__}.{name}", getattr(cls, name)))
+        for name in FRAME_FILE_WRITERS:
+            if hasattr(cls, name):
+                setattr(cls, name, _no_io(f"{cls.__name__}.{name}"))
+
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if name.split(".")[0] not in ALLOWED_IMPORTS:
+        raise ImportError(f"import of '{name}' is not allowed")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+def _as_frame(value) -> pd.DataFrame:
+    if isinstance(value, pd.DataFrame):
+        return value
+    if isinstance(value, pd.Series):
+        return value.reset_index() if value.index.name or not isinstance(value.index, pd.RangeIndex) else value.to_frame()
+    return pd.DataFrame({"value": [value]})
+
+
+def _address_space_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker(conn, frame: pd.DataFrame):
+    pd.set_option("mode.copy_on_write", True)
+    _remove_file_access()
+    # The address-space limit sits on top of what the inherited frame and libraries already use.
+    current = _address_space_bytes()
+    if current is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (current + SANDBOX_MEMORY_MB * 1024 * 1024, hard))
+    safe_builtins = dict(vars(builtins), __import__=_restricted_import, open=None, exec=None, eval=None,
+                         compile=None, input=None, breakpoint=None, exit=None, quit=None)
+    compiled = OrderedDict()
+
+    while True:
+        try:
+            digest, code = conn.recv()
+        except EOFError:
+            return
+        try:
+            program = compiled.get(digest)
+            if program is None:
+                program = compiled[digest] = compile(code, f"<generated {digest[:8]}>", "exec")
+                if len(compiled) > 256:
+                    compiled.popitem(last=False)
+            # CPU limit for this snippet only: whatever the worker has used so far plus the budget.
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + SANDBOX_CPU_SECONDS, cpu_hard))
+
+            namespace = {"__builtins__": safe_builtins, "df": frame.copy(deep=False), "pd": pd}
+            exec(program, namespace)
+            if "result_df" not in namespace:
+                raise SandboxError("The generated code did not produce 'result_df'.")
+            result = _as_frame(namespace["result_df"])
+            conn.send(("ok", result.head(SANDBOX_MAX_ROWS), len(result)))
+        except MemoryError:
+            conn.send(("error", f"Memory limit of {SANDBOX_MEMORY_MB} MB exceeded.", 0))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", 0))
+
+
+class _Worker:
+    def __init__(self, context, frame: pd.DataFrame):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker, args=(child_conn, frame), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class PandasSandbox:
+    def __init__(self, load_frame: Callable[[], pd.DataFrame], workers: int = SANDBOX_WORKERS):
+        self.load_frame = load_frame
+        self.size = workers
+        self._frame: Optional[pd.DataFrame] = None
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            # Workers fork from a server that has already imported pandas, so they start quickly.
+            self._context.set_forkserver_preload(["pandas", "numpy", __name__])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+        self._results_lock = threading.Lock()
+        self.executions = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        """Load the dataset and start the workers, if not done yet; otherwise the first run() does."""
+        with self._start_lock:
+            if self._frame is not None:
+                return
+            started = time.perf_counter()
+            self._frame = self.load_frame()
+            for _ in range(self.size):
+                self._idle.put(_Worker(self._context, self._frame))
+            print(f"✅ Pandas sandbox: {self.size} workers, each with the {len(self._frame):,}-row frame "
+                  f"({time.perf_counter() - started:.2f}s).")
+
+    def run(self, code: str) -> pd.DataFrame:
+        """
+        Result of `code` (which must assign `result_df`) against the dataset, capped at
+        SANDBOX_MAX_ROWS rows; raises SandboxError on errors and exceeded limits. Blocking.
+        """
+        digest = code_hash(code)
+        with self._results_lock:
+            cached = self._results.get(digest)
+            if cached is not None:
+                self._results.move_to_end(digest)
+                self.cache_hits += 1
+                return cached[0].copy()
+        try:
+            compile(code, "<generated>", "exec")
+        except SyntaxError as e:
+            self.errors += 1
+            raise SandboxError(f"SyntaxError: {e}") from e
+
+        self.start()
+        worker = self._idle.get()
+        started = time.perf_counter()
+        try:
+            try:
+                worker.conn.send((digest, code))
+                if not worker.conn.poll(SANDBOX_WALL_SECONDS):
+                    self.timeouts += 1
+                    worker = self._replace(worker)
+                    raise SandboxError(f"Wall-time limit of {SANDBOX_WALL_SECONDS:g}s exceeded.")
+                status, payload, total_rows = worker.conn.recv()
+            except (EOFError, OSError):
+                # Killed by the kernel, e.g. SIGXCPU at the CPU-time limit.
+                self.errors += 1
+                worker = self._replace(worker)
+                raise SandboxError(f"Worker died (CPU-time limit of {SANDBOX_CPU_SECONDS}s exceeded or crashed).")
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self._idle.put(worker)
+
+        self.executions += 1
+        if status != "ok":
+            self.errors += 1
+            raise SandboxError(payload)
+        if total_rows > len(payload):
+            print(f"⚠️ Sandbox result capped at {len(payload):,} of {total_rows:,} rows.")
+        with self._results_lock:
+            self._results[digest] = (payload, total_rows)
+            while len(self._results) > SANDBOX_RESULT_CACHE:
+                self._results.popitem(last=False)
+        return payload.copy()
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.stop()
+        self.restarts += 1
+        return _Worker(self._context, self._frame)
+
+    def close(self):
+        with self._start_lock:
+            while not self._idle.empty():
+                self._idle.get_nowait().stop()
+            self._frame = None
+
+    def stats(self) -> dict:
+        lookups = self.executions + self.cache_hits
+        return {
+            "workers": self.size,
+            "executions": self.executions,
+            "cacheHits": self.cache_hits,
+            "hitRatio": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "avgExecutionMs": round(self.busy_seconds / self.executions * 1000, 1) if self.executions else None,
+            "limits": {"cpuSeconds": SANDBOX_CPU_SECONDS, "wallSeconds": SANDBOX_WALL_SECONDS,
+                       "memoryMb": SANDBOX_MEMORY_MB, "maxRows": SANDBOX_MAX_ROWS},
+        }
@@ -0,0 +1,103 @@
+import os
+import re
+import sqlite3
+import time
+from typing import Optional
+
+# Persistent cache from a user's question to the SQL the LLM generated for it. Only SQL that
+# executed successfully is stored, and it is keyed on the schema it was written against, so a
+# hit can skip both the gatekeeper and the SQL-generation round trips. The SQL itself is
+# re-executed on every hit, so answers still reflect current data.
+
+CACHE_TABLE = "prompt_sql_cache"
+DEFAULT_TTL_SECONDS = int(os.getenv("PROMPT_SQL_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question."""
+    normalized = re.sub(r"\s+", " ", (prompt or "").strip().lower())
+    return normalized.rstrip(" ?!.")
+
+
+class PromptSqlCache:
+    def __init__(self, conn: sqlite3.Connection, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.conn = conn
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+                PROMPT_KEY TEXT NOT NULL,
+                SCHEMA_HASH TEXT NOT NULL,
+                PROMPT TEXT NOT NULL,
+                SQL_TEXT TEXT NOT NULL,
+                CREATED_AT REAL NOT NULL,
+                HIT_COUNT INTEGER NOT NULL DEFAULT 0,
+                LAST_HIT_AT REAL,
+                PRIMARY KEY (PROMPT_KEY, SCHEMA_HASH)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, prompt: str, schema_hash: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        row = self.conn.execute(
+            f"SELECT SQL_TEXT, CREATED_AT FROM {CACHE_TABLE} WHERE PROMPT_KEY = ? AND SCHEMA_HASH = ?",
+            (key, schema_hash),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        sql_text, created_at = row
+        now = time.time()
+        if now - created_at > self.ttl_seconds:
+            self.purge(prompt)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            f"UPDATE {CACHE_TABLE} SET HIT_COUNT = HIT_COUNT + 1, LAST_HIT_AT = ? WHERE PROMPT_KEY = ? AND SCHEMA_HASH = ?",
+            (now, key, schema_hash),
+        )
+        self.conn.commit()
+        return sql_text
+
+    def put(self, prompt: str, schema_hash: str, sql_text: str):
+        self.conn.execute(
+            f"""
+            INSERT INTO {CACHE_TABLE} (PROMPT_KEY, SCHEMA_HASH, PROMPT, SQL_TEXT, CREATED_AT)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (PROMPT_KEY, SCHEMA_HASH) DO UPDATE SET
+                PROMPT = excluded.PROMPT, SQL_TEXT = excluded.SQL_TEXT,
+                CREATED_AT = excluded.CREATED_AT, HIT_COUNT = 0, LAST_HIT_AT = NULL
+            """,
+            (normalize_prompt(prompt), schema_hash, prompt, sql_text, time.time()),
+        )
+        self.conn.commit()
+
+    def purge(self, prompt: Optional[str] = None, expired_only: bool = False) -> int:
+        """Delete one prompt's entries, only the expired ones, or everything. Returns rows removed."""
+        if prompt is not None:
+            cursor = self.conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE PROMPT_KEY = ?", (normalize_prompt(prompt),))
+        elif expired_only:
+            cursor = self.conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE CREATED_AT < ?", (time.time() - self.ttl_seconds,))
+        else:
+            cursor = self.conn.execute(f"DELETE FROM {CACHE_TABLE}")
+        self.conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        entries, hits = self.conn.execute(
+            f"SELECT COUNT(*), IFNULL(SUM(HIT_COUNT), 0) FROM {CACHE_TABLE}"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "lifetimeHits": hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "ttlSeconds": self.ttl_seconds,
+        }
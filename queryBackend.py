@@ -0,0 +1,492 @@
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from llmMetrics import llm_metrics
+from schemaSummary import table_fingerprint
+
+# Columnar engine for the analytical queries the LLM generates. SQLite stays the database of
+# record and keeps all writes and point lookups; the user tables are mirrored into a DuckDB
+# file next to it, and read-only aggregate queries (GROUP BY, COUNT, SUM, ...) over mirrored
+# tables run there instead. The few SQLite idioms generated SQL uses are translated
+# (strftime's argument order, case-insensitive LIKE, integer division); statements using
+# anything else SQLite-specific stay on SQLite, and any DuckDB error falls back to SQLite.
+# The mirror is rebuilt in a background thread, per changed table, whenever the SQLite data
+# changes; queries go to SQLite until it has caught up. The thread starts with the server (or
+# the first analytical query) and is stopped and joined on close() or at interpreter exit. A table counts as changed when its
+# fingerprint moves or when triggers have counted an UPDATE or DELETE on it since its copy,
+# so writes elsewhere in the database (caches, logs) never cause a recopy. Ingest only
+# appends, so a table that has just grown gets its new rowids added to the existing copy;
+# it is copied in full only after an UPDATE, DELETE or schema change.
+#
+# ANALYTICS_BACKEND: "auto" (DuckDB if installed), "duckdb" or "sqlite".
+
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "auto").lower()
+MIRROR_CHUNK_ROWS = int(os.getenv("ANALYTICS_MIRROR_CHUNK_ROWS", 250_000))
+MIRROR_META_TABLE = "_mirror_meta"
+# In the SQLite database: per-table count of in-place changes, bumped by triggers.
+MIRROR_CHANGES_TABLE = "_mirror_changes"
+
+ANALYTIC = re.compile(r"\b(GROUP\s+BY|COUNT|SUM|AVG|MIN|MAX|DISTINCT|HAVING|OVER)\b", re.IGNORECASE)
+SQLITE_ONLY = re.compile(
+    r"\b(julianday|datetime|date|time|unixepoch|printf|total|typeof|randomblob|zeroblob|instr)\s*\(|\b(COLLATE|GLOB|REGEXP)\b",
+    re.IGNORECASE,
+)
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?(\w+)', re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+STRFTIME = re.compile(r"\bstrftime\s*\(", re.IGNORECASE)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _appended_rows(stored: Optional[str], fingerprint: str) -> Optional[Tuple[int, int, int]]:
+    """
+    (mirrored max rowid, current max rowid, current row count) when a table has only had rows
+    appended since its stored fingerprint: same DDL, no counted UPDATE or DELETE, a higher
+    max rowid. Fingerprints are table_fingerprint's "ddl|count|max_rowid" plus "|changes".
+    """
+    if stored is None:
+        return None
+    old_ddl, _, old_max, old_changes = stored.rsplit("|", 3)
+    ddl, rows, new_max, changes = fingerprint.rsplit("|", 3)
+    if (old_ddl, old_changes) != (ddl, changes) or not old_max.isdigit() or not new_max.isdigit():
+        return None
+    if int(new_max) <= int(old_max):
+        return None
+    return int(old_max), int(new_max), int(rows)
+
+
+def _duckdb_type(declared: str) -> str:
+    """DuckDB column type for a SQLite declared type, following SQLite's affinity rules.
+    Dates stay VARCHAR: SQLite stores them as text and generated SQL treats them as text."""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "BIGINT"
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB", "NUMERIC", "DECIMAL")):
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def _code_segments(sql: str):
+    """(is_code, text) pieces of a statement, separating string literals from code."""
+    position = 0
+    for match in STRING_LITERAL.finditer(sql):
+        yield True, sql[position:match.start()]
+        yield False, match.group(0)
+        position = match.end()
+    yield True, sql[position:]
+
+
+def _code_only(sql: str) -> str:
+    return " ".join(text for is_code, text in _code_segments(sql) if is_code)
+
+
+def _split_call(sql: str, start: int):
+    """Top-level arguments of the call whose '(' ends at `start`, and the index after its ')'."""
+    depth, args, current, i = 1, [], [], start
+    while i < len(sql):
+        char = sql[i]
+        if char == "'":
+            end = sql.index("'", i + 1)
+            while end + 1 < len(sql) and sql[end + 1] == "'":
+                end = sql.index("'", end + 2)
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                args.append("".join(current).strip())
+                return args, i + 1
+        if char == "," and depth == 1:
+            args.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    raise ValueError("unbalanced parentheses")
+
+
+def to_duckdb_sql(sql: str) -> Optional[str]:
+    """The statement in DuckDB's dialect with SQLite's semantics, or None if it can't be translated."""
+    if SQLITE_ONLY.search(_code_only(sql)):
+        return None
+    # SQLite's LIKE ignores case (for ASCII); DuckDB's doesn't.
+    sql = "".join(re.sub(r"\bLIKE\b", "ILIKE", text, flags=re.IGNORECASE) if is_code else text
+                  for is_code, text in _code_segments(sql))
+    # strftime(format, value) in SQLite is strftime(value, format) in DuckDB.
+    literal_spans = [match.span() for match in STRING_LITERAL.finditer(sql)]
+    out, position = [], 0
+    for match in STRFTIME.finditer(sql):
+        if match.start() < position or any(start <= match.start() < end for start, end in literal_spans):
+            continue
+        try:
+            args, end = _split_call(sql, match.end())
+        except ValueError:
+            return None
+        if len(args) != 2:
+            return None  # modifiers ('start of month', '-1 day', ...) have no direct equivalent
+        value = to_duckdb_sql(args[1]) if STRFTIME.search(args[1]) else args[1]
+        if value is None:
+            return None
+        out.append(sql[position:match.start()] + f"strftime(CAST({value} AS TIMESTAMP), {args[0]})")
+        position = end
+    out.append(sql[position:])
+    return "".join(out)
+
+
+# Read-only queries answered per engine (one latency histogram each) and DuckDB fallbacks.
+analytics_stats = llm_metrics.feature("analytics")
+
+
+class AnalyticsBackend:
+    """Interface for an engine that answers some read-only queries in place of SQLite."""
+
+    name = "sqlite"
+
+    def translate(self, sql: str) -> Optional[str]:
+        """The statement to run on this engine, or None to leave it to SQLite."""
+        return None
+
+    def execute(self, sql: str) -> List[dict]:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DuckDBBackend(AnalyticsBackend):
+    name = "duckdb"
+
+    def __init__(self, db_path: str, version: Callable[[], tuple], exclude: Iterable[str] = ()):
+        import duckdb
+
+        self.db_path = db_path
+        self.mirror_path = os.path.splitext(db_path)[0] + ".duckdb"
+        self.version = version
+        self.exclude = set(exclude) | {MIRROR_CHANGES_TABLE}
+        self.con = duckdb.connect(self.mirror_path)
+        # SQLite divides integers as integers. GLOBAL, so the cursors queries run on see it too.
+        self.con.execute("SET GLOBAL integer_division = true")
+        self.con.execute(f"CREATE TABLE IF NOT EXISTS {MIRROR_META_TABLE} "
+                         f"(TABLE_NAME VARCHAR PRIMARY KEY, FINGERPRINT VARCHAR, ROWS BIGINT, BUILT_AT DOUBLE)")
+        self._lock = threading.Lock()
+        self._mirrored: Dict[str, str] = {}
+        self._mirrored_version = None
+        self._refreshing: Optional[threading.Thread] = None
+        self._started = False
+        self._stopping = threading.Event()
+        self.last_refresh_seconds = None
+
+    def start(self):
+        """Begin mirroring. Called from the server's startup, else by the first analytical query."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        # A refresh thread still copying when the interpreter shuts down takes the process down with it.
+        atexit.register(self.close)
+        self._check_version()
+
+    def _check_version(self) -> tuple:
+        """Start a background refresh if the SQLite data moved since the mirror was last checked."""
+        version = self.version()
+        with self._lock:
+            if self._stopping.is_set():
+                return version
+            if version != self._mirrored_version and not (self._refreshing and self._refreshing.is_alive()):
+                self._refreshing = threading.Thread(target=self._refresh, args=(version,), daemon=True)
+                self._refreshing.start()
+        return version
+
+    def _refresh(self, version):
+        started, started_at = time.perf_counter(), time.time()
+        source = sqlite3.connect(self.db_path)
+        con = self.con.cursor()
+        try:
+            tables = [name for (name,) in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                      if name not in self.exclude and not name.startswith("sqlite_")]
+            stored = dict(con.execute(f"SELECT TABLE_NAME, FINGERPRINT FROM {MIRROR_META_TABLE}").fetchall())
+            current = {}
+            for table in tables:
+                if self._stopping.is_set():
+                    return
+                try:
+                    changes = self._track_changes(source, table)
+                    fingerprint = f"{table_fingerprint(source, table)}|{changes}"
+                except sqlite3.Error as e:
+                    print(f"⚠️ Could not check '{table}' for changes ({e}); its queries stay on SQLite.")
+                    continue
+                if stored.get(table) != fingerprint:
+                    with self._lock:
+                        self._mirrored.pop(table, None)
+                    appended = _appended_rows(stored.get(table), fingerprint)
+                    try:
+                        if appended:
+                            copied = self._append_rows(source, con, table, fingerprint, started_at, *appended)
+                        else:
+                            copied = self._copy_table(source, con, table, fingerprint, started_at)
+                        if not copied:
+                            return
+                    except Exception as e:
+                        print(f"⚠️ Could not mirror '{table}' into DuckDB ({e}); its queries stay on SQLite.")
+                        continue
+                current[table] = fingerprint
+            for table in set(stored) - set(tables):
+                con.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                con.execute(f"DELETE FROM {MIRROR_META_TABLE} WHERE TABLE_NAME = ?", [table])
+            with self._lock:
+                self._mirrored = current
+                self._mirrored_version = version
+            self.last_refresh_seconds = round(time.perf_counter() - started, 2)
+        finally:
+            con.close()
+            source.close()
+
+    @staticmethod
+    def _track_changes(source: sqlite3.Connection, table: str) -> int:
+        """
+        The table's count of in-place changes, which its fingerprint (DDL, row count, highest
+        rowid) can't see. The counting trigger is (re)attached here, e.g. after the table was
+        replaced; the count is bumped then, since changes made without it went uncounted.
+        """
+        source.execute(f"CREATE TABLE IF NOT EXISTS {MIRROR_CHANGES_TABLE} (TABLE_NAME TEXT PRIMARY KEY, CHANGES INTEGER NOT NULL)")
+        literal = "'" + table.replace("'", "''") + "'"
+        bump = (f"INSERT INTO {MIRROR_CHANGES_TABLE} VALUES ({literal}, 1) "
+                f"ON CONFLICT (TABLE_NAME) DO UPDATE SET CHANGES = CHANGES + 1;")
+        for event in ("UPDATE", "DELETE"):
+            trigger = f"{MIRROR_CHANGES_TABLE}_{event.lower()}_{table}"
+            if source.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)).fetchone():
+                continue
+            source.execute(f"CREATE TRIGGER {_quote(trigger)} AFTER {event} ON {_quote(table)} BEGIN {bump} END")
+            source.execute(bump)
+        source.commit()
+        row = source.execute(f"SELECT CHANGES FROM {MIRROR_CHANGES_TABLE} WHERE TABLE_NAME = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _columns(source: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+        return [(row[1], _duckdb_type(row[2])) for row in source.execute(f"PRAGMA table_info({_quote(table)})")]
+
+    def _insert_chunks(self, source: sqlite3.Connection, con, target: str, columns, sql: str, params=None) -> Optional[int]:
+        """Stream a SQLite query into a DuckDB table; rows inserted, or None if close() interrupted it."""
+        casts = ", ".join(f"CAST({_quote(name)} AS {kind})" for name, kind in columns)
+        rows = 0
+        for chunk in pd.read_sql_query(sql, source, params=params, chunksize=MIRROR_CHUNK_ROWS):
+            if self._stopping.is_set():
+                return None
+            # Columns of text and numbers mixed come back as objects; SQLite would compare them as text.
+            for name in chunk.columns[chunk.dtypes == object]:
+                chunk[name] = chunk[name].where(chunk[name].isna(), chunk[name].astype(str))
+            con.register("mirror_chunk", chunk)
+            con.execute(f"INSERT INTO {target} SELECT {casts} FROM mirror_chunk")
+            con.unregister("mirror_chunk")
+            rows += len(chunk)
+        return rows
+
+    def _copy_table(self, source: sqlite3.Connection, con, table: str, fingerprint: str, built_at: float) -> bool:
+        """Copy one table into DuckDB; False if close() interrupted it."""
+        started = time.perf_counter()
+        columns = self._columns(source, table)
+        loading = _quote(table + "__loading")
+        con.execute(f"CREATE OR REPLACE TABLE {loading} ({', '.join(f'{_quote(n)} {t}' for n, t in columns)})")
+        # Only the rows the fingerprint counted, so a later append starts where this copy stops.
+        max_rowid = fingerprint.rsplit("|", 3)[2]
+        select = f"SELECT * FROM {_quote(table)}" + (f" WHERE rowid <= {max_rowid}" if max_rowid.isdigit() else "")
+        rows = self._insert_chunks(source, con, loading, columns, select)
+        if rows is None:
+            return False
+        con.execute("BEGIN")
+        con.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        con.execute(f"ALTER TABLE {loading} RENAME TO {_quote(table)}")
+        con.execute(f"INSERT OR REPLACE INTO {MIRROR_META_TABLE} VALUES (?, ?, ?, ?)", [table, fingerprint, rows, built_at])
+        con.execute("COMMIT")
+        print(f"✅ Mirrored '{table}' into DuckDB ({rows:,} rows) in {time.perf_counter() - started:.2f}s.")
+        return True
+
+    def _append_rows(self, source: sqlite3.Connection, con, table: str, fingerprint: str, built_at: float,
+                     after_rowid: int, max_rowid: int, expected_rows: int) -> bool:
+        """
+        Add the rowids in (after_rowid, max_rowid] to the table's existing copy; False if close()
+        interrupted it. Falls back to a full copy if the result doesn't have the row count the
+        fingerprint saw, e.g. rows were inserted into rowid gaps below the mirrored maximum.
+        """
+        started = time.perf_counter()
+        con.execute("BEGIN")
+        rows = self._insert_chunks(source, con, _quote(table), self._columns(source, table),
+                                   f"SELECT * FROM {_quote(table)} WHERE rowid > ? AND rowid <= ?", (after_rowid, max_rowid))
+        if rows is None:
+            con.execute("ROLLBACK")
+            return False
+        total = con.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+        if total != expected_rows:
+            con.execute("ROLLBACK")
+            print(f"♻️ Appending to the '{table}' mirror left {total:,} rows instead of {expected_rows:,}; copying it in full.")
+            return self._copy_table(source, con, table, fingerprint, built_at)
+        con.execute(f"INSERT OR REPLACE INTO {MIRROR_META_TABLE} VALUES (?, ?, ?, ?)", [table, fingerprint, total, built_at])
+        con.execute("COMMIT")
+        print(f"✅ Appended {rows:,} new rows of '{table}' to its DuckDB mirror ({total:,} rows) "
+              f"in {time.perf_counter() - started:.2f}s.")
+        return True
+
+    def translate(self, sql: str) -> Optional[str]:
+        if not ANALYTIC.search(_code_only(sql)):
+            return None  # point lookups and plain listings stay on SQLite
+        self.start()
+        version = self._check_version()
+        with self._lock:
+            if self._mirrored_version != version:
+                return None
+            tables = set(TABLE_REF.findall(_code_only(sql)))
+            if not tables or not tables <= set(self._mirrored):
+                return None
+        return to_duckdb_sql(sql)
+
+    def execute(self, sql: str) -> List[dict]:
+        cursor = self.con.cursor()
+        try:
+            cursor.execute(sql)
+            headers = [description[0] for description in cursor.description]
+            return [dict(zip(headers, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "mirrorPath": self.mirror_path,
+                "mirroredTables": sorted(self._mirrored),
+                "current": self._mirrored_version == self.version(),
+                "refreshing": bool(self._refreshing and self._refreshing.is_alive()),
+                "lastRefreshSeconds": self.last_refresh_seconds,
+            }
+
+    def close(self):
+        """Stop an in-flight refresh between chunks, wait for it, and close the mirror."""
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            self._stopping.set()
+        if self._refreshing:
+            self._refreshing.join()
+        self.con.close()
+
+
+def make_analytics_backend(db_path: str, version: Callable[[], tuple], exclude: Iterable[str] = ()) -> AnalyticsBackend:
+    if ANALYTICS_BACKEND in ("auto", "duckdb"):
+        try:
+            return DuckDBBackend(db_path, version, exclude)
+        except ImportError:
+            if ANALYTICS_BACKEND == "duckdb":
+                raise
+            print("⚠️ duckdb is not installed; analytical queries run on SQLite.")
+        except Exception as e:
+            print(f"⚠️ DuckDB backend unavailable ({e}); analytical queries run on SQLite.")
+    return AnalyticsBackend()
+
+
+if __name__ == "__main__":
+    # Typical generated analytics queries on SQLite vs the DuckDB mirror over synthetic claims:
+    #   python queryBackend.py [rows ...] [--dir DIR]     (default 1M and 10M rows)
+    import sys
+    import tempfile
+
+    args = sys.argv[1:]
+    directory = args[args.index("--dir") + 1] if "--dir" in args else tempfile.gettempdir()
+    sizes = [int(arg.replace("_", "")) for arg in args if arg.replace("_", "").isdigit()] or [1_000_000, 10_000_000]
+    queries = {
+        "claims by status": "SELECT STS_CD, COUNT(*) AS claims FROM warrenty_table GROUP BY STS_CD",
+        "cost by month": "SELECT strftime('%Y-%m', RPR_DT) AS month, COUNT(*) AS claims, SUM(CLM_EST_AM) AS cost "
+                         "FROM warrenty_table WHERE RPR_DT >= '2023-01-01' GROUP BY month ORDER BY month",
+        "car line by year": "SELECT CRLN_CD, substr(RPR_DT, 1, 4) AS year, AVG(CLM_EST_AM) AS avg_cost, "
+                            "SUM(LBR_HRS_QT) AS hours FROM warrenty_table GROUP BY CRLN_CD, year ORDER BY CRLN_CD, year",
+        "top dealers": "SELECT DLR_CD, SUM(CLM_EST_AM) AS total FROM warrenty_table WHERE STS_CD = 'A' "
+                       "GROUP BY DLR_CD ORDER BY total DESC LIMIT 10",
+        "claims per week": "SELECT STS_CD, COUNT(*) / 7 AS per_week, SUM(RPR_ODO_QT) / COUNT(*) AS odometer "
+                           "FROM warrenty_table GROUP BY STS_CD",
+        "distinct VINs": "SELECT COUNT(DISTINCT VIN_CD) AS vins FROM warrenty_table WHERE PART_CD LIKE '%rad%'",
+        "claims by model": "SELECT c.Model, COUNT(*) AS claims, AVG(w.RPR_ODO_QT) AS odometer FROM warrenty_table w "
+                           "JOIN car_table c ON w.CRLN_CD = c.Code GROUP BY c.Model ORDER BY claims DESC",
+    }
+
+    def build(path: str, rows: int):
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE car_table (Code TEXT, Model TEXT, Release_Year INTEGER);
+            INSERT INTO car_table VALUES ('CX5', 'Mazda CX-5', 2017), ('C30', 'Mazda CX-30', 2020),
+                ('M3S', 'Mazda3 Sedan', 2019), ('MZ5', 'Mazda5', 2010), ('C90', 'Mazda CX-90', 2023);
+            CREATE TABLE warrenty_table ("DISTBTR_CD" TEXT, "DLR_CD" INTEGER, "VIN_CD" TEXT, "STS_CD" TEXT,
+                "CLM_EST_AM" REAL, "WARR_TYPE_CD" TEXT, "RPR_DT" TIMESTAMP, "PART_CD" TEXT, "PNMC_FLAG" TEXT,
+                "PART_AM" REAL, "PART_QT" TEXT, "LBR_HRS_QT" REAL, "LBR_COST" REAL, "SUBLET_CD" TEXT,
+                "SUBLET_AM" REAL, "CRLN_CD" TEXT, "RPR_ODO_QT" INTEGER);
+        """)
+        conn.execute(f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+            INSERT INTO warrenty_table
+            SELECT 'D' || (100 + i % 7), 20000 + i % 400, 'VIN' || (i % ({rows} / 3 + 1)),
+                   substr('AARPP', 1 + i % 5, 1), round(100 + (abs(random()) % 490000) / 100.0, 2),
+                   substr('PPE', 1 + i % 3, 1), datetime('2019-01-01', '+' || (abs(random()) % 2500) || ' days'),
+                   substr('RAD-8005,INJ-9F593,CLT-7563', 1 + (i % 3) * 9, 8), 'R', (i % 50) * 10.0, '1',
+                   (i % 12) / 2.0, (i % 12) * 45.0, 'W1', 0.0, substr('CX5C30M3SMZ5C90', 1 + (i % 5) * 3, 3),
+                   abs(random()) % 150000
+            FROM n
+        """)
+        conn.commit()
+        conn.close()
+
+    def timed(run, repeats: int = 3):
+        best, result = None, None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def same(left: List[dict], right: List[dict]) -> bool:
+        def normal(rows):
+            return sorted(tuple(float(f"{v:.6g}") if isinstance(v, float) else v for v in row.values()) for row in rows)
+        return len(left) == len(right) and normal(left) == normal(right)
+
+    for rows in sizes:
+        path = os.path.join(directory, f"analytics_bench_{rows}.db")
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            build(path, rows)
+            print(f"📦 Built {rows:,} synthetic claims in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        backend = DuckDBBackend(path, lambda: (0, 0))
+        backend.start()
+        backend._refreshing.join()
+        print(f"⏱️ {rows:,} claims: DuckDB mirror ready in {time.perf_counter() - started:.1f}s")
+        sqlite = sqlite3.connect(path)
+        sqlite.row_factory = sqlite3.Row
+        for name, sql in queries.items():
+            translated = backend.translate(sql)
+            sqlite_s, expected = timed(lambda: [dict(row) for row in sqlite.execute(sql)])
+            if translated is None:
+                print(f"   {name:<18} sqlite {sqlite_s * 1000:>9.1f} ms   (stays on SQLite)")
+                continue
+            duck_s, actual = timed(lambda: backend.execute(translated))
+            check = "" if same(expected, actual) else "  ⚠️ results differ"
+            print(f"   {name:<18} sqlite {sqlite_s * 1000:>9.1f} ms   duckdb {duck_s * 1000:>7.1f} ms   "
+                  f"x{sqlite_s / duck_s:>6.1f}{check}")
+        sqlite.close()
+        backend.close()
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+from compression import MINIMUM_SIZE, compress
+
+
+# Response cache for the dashboard endpoints. Their answers only change when new claims
+# land or the calendar date rolls over, so entries are keyed on
+# (endpoint, params, today's date, data version) and never need explicit invalidation:
+# a new version or date simply produces new keys, and stale ones age out of the LRU.
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "_encoded")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        # Weak, since the same entity is served in several content encodings.
+        self.etag = 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """The body in the given content encoding, compressed once and then reused on every hit."""
+        if encoding is None or len(self.body) < MINIMUM_SIZE:
+            return self.body
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(body) for body in self._encoded.values())
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if the client's If-None-Match header already names this body."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag.removeprefix("W/") for tag in tags)
+
+
+def serialize_json(payload: Any) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ResponseCache:
+    def __init__(self, version_fn: Callable[[], Any], max_entries: int = 256):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = defaultdict(int)
+        self._misses: Dict[str, int] = defaultdict(int)
+
+    def make_key(self, endpoint: str, params: Optional[dict] = None) -> tuple:
+        return (endpoint, tuple(sorted((params or {}).items())), date.today().isoformat(), self.version_fn())
+
+    def get_or_compute(self, endpoint: str, params: Optional[dict], compute: Callable[[], Any]) -> CachedResponse:
+        key = self.make_key(endpoint, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits[endpoint] += 1
+                return entry
+            self._misses[endpoint] += 1
+
+        entry = CachedResponse(serialize_json(compute()))
+        self._store(key, entry)
+        return entry
+
+    def warm(self, endpoint: str, params: Optional[dict], compute: Callable[[], Any], key: Optional[tuple] = None):
+        """
+        Compute and store an entry without counting it as a hit or miss. Callers off the
+        thread that owns version_fn's connection pass the key, made there with make_key.
+        """
+        key = key or self.make_key(endpoint, params)
+        with self._lock:
+            if key in self._entries:
+                return
+        self._store(key, CachedResponse(serialize_json(compute())))
+
+    def _store(self, key: tuple, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = sorted(set(self._hits) | set(self._misses))
+            per_endpoint = {}
+            for endpoint in endpoints:
+                hits, misses = self._hits[endpoint], self._misses[endpoint]
+                per_endpoint[endpoint] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hitRatio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry.size for entry in self._entries.values()),
+                "endpoints": per_endpoint,
+            }
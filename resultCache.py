@@ -0,0 +1,126 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+# In-memory LRU of query results keyed on the normalized SQL text and the database data
+# version. Popular questions resolve to the same generated SQL, so identical statements are
+# answered from memory until the data changes; any change of version empties the cache.
+# Results are stored serialized, which gives an exact byte count for the memory bound and
+# hands every caller its own copy. Callers put today's date in the version, since generated SQL
+# for "last month" or "last 7 days" is written with date('now', ...); statements that depend on
+# the time of day or on random() are not cached at all.
+
+DEFAULT_MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+# Results that would change within the day: time-of-day functions and random().
+VOLATILE = re.compile(
+    r"\brandom(blob)?\s*\(|\bcurrent_time(stamp)?\b|\b(datetime|time|julianday|unixepoch|strftime)\s*\([^)]*'now'",
+    re.IGNORECASE,
+)
+
+
+def is_read_only(conn: sqlite3.Connection, sql: str) -> bool:
+    """
+    Whether the statement only reads, judged like sqlite3_stmt_readonly from the program SQLite
+    compiles for it: a write (including WITH ... DELETE/UPDATE/INSERT) opens a write
+    transaction. Statements that don't compile count as writes.
+    """
+    if re.match(r"^\s*(SELECT|WITH)\b", sql, flags=re.IGNORECASE) is None:
+        return False
+    try:
+        program = conn.execute(f"EXPLAIN {sql}").fetchall()
+    except sqlite3.Error:
+        return False
+    # Rows are (addr, opcode, p1, p2, ...); Transaction's p2 is non-zero for a write transaction.
+    return not any(opcode == "OpenWrite" or (opcode == "Transaction" and p2) for _, opcode, _, p2, *_ in program)
+
+
+# Authorizer actions a plain query needs; anything else is denied while a read runs.
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+def read_only_authorizer(action: int, *_) -> int:
+    return sqlite3.SQLITE_OK if action in READ_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def is_cacheable(sql: str) -> bool:
+    return VOLATILE.search(sql) is None
+
+
+class QueryResultCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sync_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, sql: str, version) -> Optional[Any]:
+        key = normalize_sql(sql)
+        with self._lock:
+            self._sync_version(version)
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return orjson.loads(body)
+
+    def put(self, sql: str, version, result: Any):
+        key = normalize_sql(sql)
+        try:
+            body = orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return  # e.g. BLOB columns; not worth caching
+        # A single huge result would just flush everything else; don't cache it.
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            self._sync_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
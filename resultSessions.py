@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+import orjson
+
+from schemaSummary import keywords
+
+# Per-conversation memory of the last result set and the SQL behind it, so follow-ups like
+# "now only for CX-5", "sort by amount" or "top 5" are answered from the rows already in
+# memory instead of a new gatekeeper + SQL generation + base-table query. Follow-ups the rows
+# can't answer (the filter value isn't in the result, or the result was too large to keep
+# whole) are sent to the LLM as an edit of the previous SQL.
+# Sessions are dropped after SESSION_IDLE_SECONDS without use and least-recently-used first
+# when the stored results exceed SESSION_MAX_BYTES.
+
+SESSION_IDLE_SECONDS = int(os.getenv("SESSION_IDLE_SECONDS", 30 * 60))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 128 * 1024 * 1024))
+SESSION_MAX_ROWS = int(os.getenv("SESSION_MAX_ROWS", 50_000))
+
+FOLLOW_UP = re.compile(
+    r"^\s*(now|only|just|and|also|then|but|sort|order|filter|exclude|without|except|remove|drop|top|bottom|"
+    r"first|last|limit|what about|how about|same|instead|show only|keep)\b"
+    r"|\b(it|them|those|these)\b",
+    re.IGNORECASE,
+)
+SORT = re.compile(r"\b(?:sort|order)(?:ed)?\s+(?:it\s+|them\s+|the\s+results?\s+)?by\s+(?P<rest>.+)$", re.IGNORECASE)
+SORT_COLUMN_END = re.compile(
+    r",|\b(and|then|top|first|limit|asc|ascending|desc|descending|highest|lowest|largest|smallest)\b", re.IGNORECASE
+)
+LIMIT = re.compile(r"\b(?P<which>top|first|bottom|last|limit(?: to)?|only)\s+(?P<n>\d+)\b", re.IGNORECASE)
+INCLUDE = re.compile(r"\b(?:only|just|filter(?: it| them)? (?:to|for|on)|keep)\s+(?:for\s+|the\s+|to\s+)?(?P<values>.+)$", re.IGNORECASE)
+EXCLUDE = re.compile(r"\b(?:exclude|without|except|remove|drop)\s+(?:the\s+)?(?P<values>.+)$", re.IGNORECASE)
+# Where a filter's value list ends and another refinement starts.
+CLAUSE_END = re.compile(r"\b(sorted|sort|order|ordered|top|first|bottom|limit|and sort|then)\b.*$", re.IGNORECASE)
+DESCENDING = re.compile(r"\b(desc|descending|highest|largest|most|biggest)\b", re.IGNORECASE)
+# Words that mean "the main number" when sorting.
+MEASURE_WORDS = {"amount", "cost", "value", "total", "count", "number", "sum", "price", "claim", "claims"}
+# Words that name what a question is about or what it measures. A prompt that brings in one the
+# conversation hasn't used ("Top 10 dealers by claim cost" after "claims by status") is a new
+# question even when it starts like a refinement.
+SUBJECT_WORDS = keywords(
+    "dealer distributor customer vin model car vehicle part component sublet labor labour odometer mileage "
+    "status rate average avg mean median ratio percentage percent share trend distribution breakdown forecast"
+)
+
+
+def _tokens(value: Any) -> List[str]:
+    return re.findall(r"[a-z0-9]+", str(value).lower())
+
+
+def _contains(haystack: List[str], needle: List[str]) -> bool:
+    return bool(needle) and any(haystack[i:i + len(needle)] == needle for i in range(len(haystack) - len(needle) + 1))
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _numeric_columns(rows: List[dict]) -> List[str]:
+    return [c for c in rows[0] if all(_is_number(row.get(c)) or row.get(c) is None for row in rows)
+            and any(_is_number(row.get(c)) for row in rows)]
+
+
+def _match_column(phrase: str, rows: List[dict]) -> Optional[str]:
+    by_name = {re.sub(r"[\s_]+", "_", str(column).lower()): column for column in rows[0]}
+    name = re.sub(r"[\s_]+", "_", phrase.strip().lower())
+    if name in by_name:
+        return by_name[name]
+    words = keywords(phrase)
+    best, best_score = None, 0
+    for column in rows[0]:
+        score = len(words & keywords(str(column).replace("_", " ")))
+        if score > best_score:
+            best, best_score = column, score
+    if best is None and words & MEASURE_WORDS:
+        numeric = _numeric_columns(rows)
+        best = numeric[-1] if numeric else None
+    return best
+
+
+def _filter(rows: List[dict], phrase: str, keep: bool) -> Optional[List[dict]]:
+    """Rows whose value in one text column matches any of the phrase's values; None if none match."""
+    values = [_tokens(value) for value in re.split(r",|\bor\b|\band\b|/", CLAUSE_END.sub("", phrase)) if _tokens(value)]
+    if not values:
+        return None
+    text_columns = [c for c in rows[0] if c not in _numeric_columns(rows)]
+    for column in text_columns:
+        cell_tokens = [_tokens(row.get(column)) for row in rows]
+        matches = [any(_contains(cells, value) for value in values) for cells in cell_tokens]
+        # Every value must name something in this column, otherwise it's probably another column's value.
+        if all(any(_contains(cells, value) for cells in cell_tokens) for value in values):
+            return [row for row, matched in zip(rows, matches) if matched == keep]
+    return None
+
+
+def refine_rows(rows: List[dict], follow_up: str) -> Optional[List[dict]]:
+    """Apply a filter/sort/limit follow-up to cached rows; None if it can't be answered from them."""
+    if not rows or not isinstance(rows[0], dict):
+        return None
+    text = follow_up.strip().rstrip("?.!")
+    refined, applied = rows, False
+
+    if (match := EXCLUDE.search(text)) is not None:
+        refined = _filter(refined, match.group("values"), keep=False)
+        if refined is None:
+            return None
+        applied = True
+    elif (match := INCLUDE.search(text)) is not None and not re.fullmatch(r"\d+.*", match.group("values")):
+        refined = _filter(refined, match.group("values"), keep=True)
+        if refined is None:
+            return None
+        applied = True
+
+    sort = SORT.search(text)
+    limit = LIMIT.search(text)
+    if sort is not None:
+        rest = sort.group("rest")
+        column = _match_column(SORT_COLUMN_END.split(rest)[0], refined) if refined else None
+        if column is None:
+            return None
+        descending = DESCENDING.search(rest) is not None
+        present = [row for row in refined if row.get(column) is not None]
+        missing = [row for row in refined if row.get(column) is None]
+        refined = sorted(present, key=lambda row: row[column], reverse=descending) + missing
+        applied = True
+    if limit is not None:
+        n = int(limit.group("n"))
+        which = limit.group("which").lower()
+        if sort is None and which in ("top", "bottom"):
+            numeric = _numeric_columns(refined) if refined else []
+            if numeric:
+                present = [row for row in refined if row.get(numeric[-1]) is not None]
+                refined = sorted(present, key=lambda row: row[numeric[-1]], reverse=which == "top")
+        refined = refined[-n:] if which == "last" else refined[:n]
+        applied = True
+
+    return refined if applied else None
+
+
+class Session:
+    __slots__ = ("prompt", "sql", "rows", "complete", "size", "last_used")
+
+    def __init__(self, prompt: str, sql: Optional[str], rows: List[dict], complete: bool, size: int):
+        self.prompt = prompt
+        self.sql = sql
+        self.rows = rows
+        self.complete = complete
+        self.size = size
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, max_bytes: int = SESSION_MAX_BYTES, idle_seconds: int = SESSION_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.new_questions = 0
+        self.local_follow_ups = 0
+        self.sql_follow_ups = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            self._drop(session_id)
+            self.expired += 1
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def get(self, session_id: Optional[str]) -> Optional[Session]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session_id: Optional[str], prompt: str, sql: Optional[str], rows: List[dict]) -> str:
+        session_id = session_id or uuid.uuid4().hex
+        complete = len(rows) <= SESSION_MAX_ROWS
+        kept = rows if complete else rows[:SESSION_MAX_ROWS]
+        size = len(orjson.dumps(kept, option=orjson.OPT_NON_STR_KEYS, default=str))
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+            self._sessions[session_id] = Session(prompt, sql, kept, complete, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self._drop(next(iter(self._sessions)))
+                self.evicted += 1
+        return session_id
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def record(self, source: str):
+        with self._lock:
+            if source == "session":
+                self.local_follow_ups += 1
+            elif source == "refined-sql":
+                self.sql_follow_ups += 1
+            else:
+                self.new_questions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            follow_ups = self.local_follow_ups + self.sql_follow_ups
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "idleSeconds": self.idle_seconds,
+                "newQuestions": self.new_questions,
+                "localFollowUps": self.local_follow_ups,
+                "sqlFollowUps": self.sql_follow_ups,
+                "baseTableAvoided": round(self.local_follow_ups / follow_ups, 4) if follow_ups else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+def is_follow_up(prompt: str, previous_prompt: str = "", columns: Iterable[str] = ()) -> bool:
+    """A refinement of the previous question: a refinement cue, and no subject or measure it didn't already have."""
+    if FOLLOW_UP.search(prompt or "") is None:
+        return False
+    known = keywords(previous_prompt) | keywords(" ".join(str(column).replace("_", " ") for column in columns))
+    return not (keywords(prompt) & SUBJECT_WORDS) - known
@@ -0,0 +1,211 @@
+import json
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+# Compact, statistics-based description of the database for the SQL-generation prompt.
+# Instead of raw sample rows, each table is described by its column types, cardinalities,
+# the full value list of low-cardinality code columns (STS_CD, CRLN_CD, ...) and value or
+# date ranges; small lookup tables are listed in full since they map codes to names.
+# Summaries are persisted per table with a cheap fingerprint, so they are only recomputed
+# when a table changes, and only the tables a question mentions go into the prompt.
+
+SUMMARY_TABLE = "schema_summary"
+LOW_CARDINALITY_LIMIT = 30    # columns with at most this many values get them listed
+LOOKUP_TABLE_ROWS = 50        # tables this small are listed row by row
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+# Words a question might use for a table that its names and values don't contain.
+TABLE_KEYWORDS = {
+    "warrenty_table": "claim warranty warrenty repair dealer status approved rejected pending cost amount "
+                      "estimate vin labor labour odometer mileage distributor",
+    "car_table": "model car vehicle release year",
+    "part_table": "part price component",
+    "sublet_table": "sublet",
+}
+# Tables every question is assumed to need.
+CORE_TABLES = ("warrenty_table",)
+# Column-name fragments that carry no meaning on their own.
+NOISE_WORDS = {"cd", "am", "qt", "dt", "id", "table", "the", "and", "of", "flag"}
+
+
+def keywords(text: str) -> Set[str]:
+    """Lower-cased word tokens, with a plural 's' dropped so 'claims' matches 'claim'."""
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if len(word) < 2 or word in NOISE_WORDS or word.isdigit():
+            continue
+        words.add(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return words
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_fingerprint(conn: sqlite3.Connection, table: str) -> str:
+    """Cheap change detector for a table: its DDL, row count and highest rowid."""
+    ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    count, max_rowid = conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {_quote(table)}").fetchone()
+    return f"{ddl}|{count}|{max_rowid}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+class SchemaSummary:
+    def __init__(self, conn: sqlite3.Connection, exclude: Iterable[str] = ()):
+        self.conn = conn
+        self.exclude = set(exclude) | {SUMMARY_TABLE}
+        self._summaries: Dict[str, str] = {}
+        self._keywords: Dict[str, Set[str]] = {}
+        self._vocabulary: Optional[Set[str]] = None
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+                TABLE_NAME TEXT PRIMARY KEY,
+                FINGERPRINT TEXT NOT NULL,
+                SUMMARY TEXT NOT NULL,
+                KEYWORDS TEXT NOT NULL,
+                BUILT_AT REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.refresh()
+
+    def _user_tables(self) -> List[str]:
+        rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name").fetchall()
+        return [name for (name,) in rows if name not in self.exclude and not name.startswith("sqlite_")]
+
+    def refresh(self, tables: Optional[Iterable[str]] = None, force: bool = False):
+        """Rebuild the summaries of the given tables (default: all) whose contents changed."""
+        existing = self._user_tables()
+        self.conn.execute(
+            f"DELETE FROM {SUMMARY_TABLE} WHERE TABLE_NAME NOT IN ({','.join('?' * len(existing))})", existing
+        )
+        stored = {
+            name: (fingerprint, summary, words)
+            for name, fingerprint, summary, words in self.conn.execute(
+                f"SELECT TABLE_NAME, FINGERPRINT, SUMMARY, KEYWORDS FROM {SUMMARY_TABLE}"
+            )
+        }
+        self._summaries = {name: stored[name][1] for name in existing if name in stored}
+        self._keywords = {name: set(json.loads(stored[name][2])) for name in existing if name in stored}
+        self._vocabulary = None
+
+        for table in (existing if tables is None else [t for t in tables if t in existing]):
+            fingerprint = table_fingerprint(self.conn, table)
+            if not force and table in stored and stored[table][0] == fingerprint:
+                continue
+            started = time.perf_counter()
+            summary, words = self._summarize(table)
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {SUMMARY_TABLE} VALUES (?, ?, ?, ?, ?)",
+                (table, fingerprint, summary, json.dumps(sorted(words)), time.time()),
+            )
+            self._summaries[table], self._keywords[table] = summary, words
+            print(f"✅ Summarized '{table}' for the SQL prompt in {time.perf_counter() - started:.2f}s.")
+        self.conn.commit()
+
+    def _summarize(self, table: str):
+        columns = [(row[1], row[2] or "") for row in self.conn.execute(f"PRAGMA table_info({_quote(table)})")]
+        stats_sql = ", ".join(
+            f"COUNT(DISTINCT {_quote(name)}), MIN({_quote(name)}), MAX({_quote(name)}), COUNT({_quote(name)})"
+            for name, _ in columns
+        )
+        row_count, *stats = self.conn.execute(f"SELECT COUNT(*), {stats_sql} FROM {_quote(table)}").fetchone()
+        words = keywords(table) | keywords(TABLE_KEYWORDS.get(table, ""))
+
+        if row_count <= LOOKUP_TABLE_ROWS:
+            names = [name for name, _ in columns]
+            rows = self.conn.execute(f"SELECT * FROM {_quote(table)}").fetchall()
+            lines = [f"Table {table} ({row_count} rows, listed in full): "
+                     + ", ".join(f"{name} {kind}".strip() for name, kind in columns),
+                     "|".join(names)]
+            lines += ["|".join("" if value is None else _format_value(value) for value in row) for row in rows]
+            for name in names:
+                words |= keywords(name)
+            for row in rows:
+                words |= keywords(" ".join(str(value) for value in row if isinstance(value, str)))
+            return "\n".join(lines), words
+
+        lines = [f"Table {table} ({row_count:,} rows):"]
+        for index, (name, kind) in enumerate(columns):
+            distinct, low, high, non_null = stats[index * 4: index * 4 + 4]
+            words |= keywords(name)
+            nulls = f", {row_count - non_null:,} null" if non_null < row_count else ""
+            # Columns like PART_CD hold comma-separated lists; their combinations aren't worth listing.
+            is_list = isinstance(high, str) and ("," in high or "," in str(low))
+            if distinct <= LOW_CARDINALITY_LIMIT and not is_list:
+                values = [value for (value,) in self.conn.execute(
+                    f"SELECT DISTINCT {_quote(name)} FROM {_quote(table)} WHERE {_quote(name)} IS NOT NULL ORDER BY 1"
+                )]
+                words |= keywords(" ".join(str(value) for value in values if isinstance(value, str)))
+                detail = ("1 value: " if distinct == 1 else f"{distinct} values: ") + ", ".join(_format_value(value) for value in values)
+            elif isinstance(low, str) and DATE_PATTERN.match(low) and DATE_PATTERN.match(str(high)):
+                detail = f"dates {low} .. {high}"
+            elif isinstance(low, (int, float)) and isinstance(high, (int, float)):
+                detail = f"{distinct:,} distinct, {_format_value(low)} .. {_format_value(high)}"
+            elif is_list:
+                detail = f"comma-separated lists, e.g. {high}"
+            else:
+                detail = f"{distinct:,} distinct, e.g. {_format_value(high)}"
+            lines.append(f"- {name} {kind}: {detail}{nulls}".replace("  ", " "))
+        return "\n".join(lines), words
+
+    def vocabulary(self) -> Set[str]:
+        """Every keyword of every table: the words a question about this database tends to use."""
+        if self._vocabulary is None:
+            self._vocabulary = set().union(*self._keywords.values())
+        return self._vocabulary
+
+    def relevant_tables(self, question: str) -> List[str]:
+        """Core tables plus any whose names, columns or values share a word with the question."""
+        asked = keywords(question)
+        tables = [table for table in self._summaries
+                  if table in CORE_TABLES or asked & self._keywords.get(table, set())]
+        return tables or list(self._summaries)
+
+    def for_prompt(self, question: str) -> str:
+        return "\n\n".join(self._summaries[table] for table in self.relevant_tables(question))
+
+
+if __name__ == "__main__":
+    # Prompt tokens (and, with --llm, SQL-generation latency) for the raw-rows schema
+    # description vs the summary.
+    import asyncio
+    import sys
+
+    import sqliteClient
+    from contextPacker import count_tokens
+
+    db = sqliteClient.SQLiteClient(next((arg for arg in sys.argv[1:] if not arg.startswith("--")), "warrenty2.db"))
+    questions = [
+        "How many claims were approved in the last month?",
+        "Which car model has the highest total claim cost this year?",
+        "What are the most replaced parts and what do they cost?",
+        "Count claims by sublet description",
+    ]
+
+    async def time_generation(messages) -> float:
+        started = time.perf_counter()
+        await db.client.send_system_and_user_message(messeges=messages, model="o4-mini")
+        return time.perf_counter() - started
+
+    async def main():
+        for question in questions:
+            row = {}
+            for mode in ("full", "summary"):
+                sqliteClient.SQL_PROMPT_SCHEMA = mode
+                messages = db.sql_generation_messages(question)
+                row[mode] = count_tokens(messages[0]["content"] + messages[1]["content"])
+                if "--llm" in sys.argv:
+                    row[mode + "_s"] = await time_generation(messages)
+            tables = ", ".join(db.schema_summary.relevant_tables(question))
+            latency = f"  llm {row['full_s']:.2f}s -> {row['summary_s']:.2f}s" if "--llm" in sys.argv else ""
+            print(f"{question[:52]:<54} tokens {row['full']:>6,} -> {row['summary']:>5,}{latency}  [{tables}]")
+
+    asyncio.run(main())
@@ -11,12 +11,15 @@ import datetime
 from typing import List, Optional, Dict, Any
 import base64
 import mimetypes
+import asyncio
+import time
 
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from openai import OpenAI
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 
 
 from dto import OutputTable, StatusRequest, WarrantyClaimData, PredictionResult, DirectPredictionResponse,PromptInput, YearRequest
@@ -24,17 +27,28 @@ from ocr import extract_data_from_base64_openai
 from prediction import engineer_features, get_prediction_artifacts, predict_from_dict
 from chartdata import get_dataset
 from chartdata import OpenAIAssistant
+from chartdata import sandbox as pandas_sandbox
 from dto import OutputResponse,ResponseType
+from dto import SessionPromptInput
 
 import pandas as pd
 import random
 
-from fetchData import generate_claim_data_by_year, generate_claims_forecast, get_claim_status_distribution_by_year, get_claim_summary, get_last_month_claims
+from fetchData import RECENT_CLAIMS_DEFAULT_LIMIT, generate_claim_data_by_year, generate_claims_forecast, get_claim_status_distribution_by_year, get_claim_summary, get_last_month_claims
 from sqliteClient import SQLiteClient
-from azureAiClient import AzureAiClient
+from azureAiClient import EXTRACTION_MODEL, EXTRACTION_PROMPT_VERSION, AsyncAzureAiClient
+from extractionCache import ExtractionCache, content_hash
+from extractionJobs import ExtractionJobs
+from imagePreprocess import PREPROCESS_VERSION, UploadTooLarge, prepare_upload, read_upload
+from forecastEngine import run_forecast_job
+from responseCache import ResponseCache
+from compression import CompressionMiddleware, choose_encoding
+from answerStream import SSE_HEADERS, stream_answer
+from chartBuilder import chart_or_llm
+from llmMetrics import TRACE_HEADER, TraceMiddleware, llm_metrics
 
 # --- FastAPI App Initialization with CORS ---
-app = FastAPI(title="Mazda Warranty Claim Extractor & Predictor")
+app = FastAPI(title="Mazda Warranty Claim Extractor & Predictor", default_response_class=ORJSONResponse)
 # --- 1. Load Data on Startup ---
 # We load the CSV file into a pandas DataFrame when the application starts.
 # This is much more efficient than reading the file for every API request.
@@ -46,11 +60,47 @@ except FileNotFoundError:
     warranty_df = None
 
 db = SQLiteClient('warrenty2.db')
-azure_client= AzureAiClient()
+# Shares its HTTP connection pool with db.client.
+azure_client = AsyncAzureAiClient.shared()
+openai_assistant = OpenAIAssistant(model="o4-mini")
+# Vision extractions keyed on the uploaded file's hash, model and prompt version.
+extraction_cache = ExtractionCache(db.conn)
+extraction_jobs = ExtractionJobs(azure_client, extraction_cache)
 
 
 generated_claims_cache = {}
 
+# How often the batch forecaster refits every claims/parts series (see forecastEngine.py).
+FORECAST_REFRESH_SECONDS = int(os.getenv("FORECAST_REFRESH_SECONDS", 6 * 60 * 60))
+background_tasks = set()
+
+# Dashboard responses, keyed on endpoint, params, today's date and db.data_version.
+response_cache = ResponseCache(version_fn=lambda: db.data_version)
+CACHE_WARM_CHECK_SECONDS = int(os.getenv("CACHE_WARM_CHECK_SECONDS", 60))
+
+# The state of the objects built here is reported with every feature's counters under /llm-metrics/.
+llm_metrics.feature("analytics", info=lambda: {"mirror": db.analytics.stats()})
+llm_metrics.feature("sessions", info=db.sessions.stats)
+llm_metrics.feature("sandbox", info=pandas_sandbox.stats)
+llm_metrics.feature("inflight", info=db.inflight.stats)
+llm_metrics.feature("extractionJobs", info=extraction_jobs.stats)
+llm_metrics.feature("caches", info=lambda: {
+    "dashboard": response_cache.stats(),
+    "promptSql": db.sql_cache.stats(),
+    "sqlResults": db.result_cache.stats(),
+    "extraction": extraction_cache.stats(),
+})
+
+
+async def refresh_forecast_periodically():
+    while True:
+        try:
+            # Runs on its own connection in a worker thread so the fit never blocks requests.
+            await asyncio.to_thread(run_forecast_job, db.db_name)
+        except Exception as e:
+            print(f"Scheduled forecast refresh failed: {e}")
+        await asyncio.sleep(FORECAST_REFRESH_SECONDS)
+
 
 
 def find_or_generate_claim_result(model_input: dict) -> PredictionResult:
@@ -133,12 +183,15 @@ def find_or_generate_claim_result(model_input: dict) -> PredictionResult:
 
 
 
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(TraceMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],
 )
 
 
@@ -153,6 +206,26 @@ async def startup_event():
     except Exception as e:
         print(f"FATAL: Failed to load ML model artifacts at startup: {e}")
 
+    # Started now rather than on the first chart request, which would otherwise wait for it.
+    try:
+        await asyncio.to_thread(pandas_sandbox.start)
+    except Exception as e:
+        print(f"⚠️ Pandas sandbox failed to start; it will retry on first use: {e}")
+    # The DuckDB mirror builds in the background while SQLite answers.
+    db.analytics.start()
+
+    for job in (refresh_forecast_periodically(), warm_dashboard_cache_periodically()):
+        task = asyncio.create_task(job)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await azure_client.aclose()
+    pandas_sandbox.close()
+    db.analytics.close()
+
 @app.post("/extract-warranty-claim")
 async def extract_warranty_claim(file: UploadFile = File(...)):
     try:
@@ -160,23 +233,85 @@ async def extract_warranty_claim(file: UploadFile = File(...)):
         mime_type, _ = mimetypes.guess_type(file.filename)
 
         if not mime_type or not mime_type.startswith("image/"):
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={"error": "Only image files are currently supported. Other file types will be supported in future."}
             )
 
-        # Read and encode the image file
-        contents = await file.read()
-        base64_image = base64.b64encode(contents).decode("utf-8")
+        # Read the upload in chunks, refusing anything past the size cap
+        contents = await read_upload(file)
+        # Re-uploads of the same scan are answered from the extraction cache.
+        digest = content_hash(contents)
+        prompt_version = f"{EXTRACTION_PROMPT_VERSION}:{PREPROCESS_VERSION}"
+        cached = extraction_cache.get(digest, EXTRACTION_MODEL, prompt_version)
+        if cached is not None:
+            print(f"♻️ Reusing extraction for upload {digest[:12]}")
+            llm_metrics.record_cache_hit("vision", EXTRACTION_MODEL)
+            return ORJSONResponse(content=cached.model_dump())
+
+        # Shrink the image to what the model looks at before encoding it
+        prepared = await prepare_upload(contents, mime_type)
+        base64_image = base64.b64encode(prepared.data).decode("utf-8")
 
         # Call the OpenAI processing function
-        result = azure_client.extract_warranty_claim_from_base64(base64_image, mime_type)
-        return JSONResponse(content=result.model_dump())
-
+        started = time.perf_counter()
+        result = await azure_client.extract_warranty_claim_from_base64(base64_image, prepared.mime_type)
+        extraction_cache.put(digest, EXTRACTION_MODEL, prompt_version, result, len(contents),
+                             time.perf_counter() - started)
+        return ORJSONResponse(content=result.model_dump())
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {e}")
 
 
+@app.post("/extraction-jobs/", status_code=202)
+async def create_extraction_job(files: List[UploadFile] = File(...)):
+    """
+    Start extracting one claim from several images and/or PDFs (every PDF page is extracted).
+    Poll GET /extraction-jobs/{job_id} for progress and /extraction-jobs/{job_id}/result for the merged claim.
+    """
+    try:
+        uploads = []
+        for file in files:
+            mime_type, _ = mimetypes.guess_type(file.filename or "")
+            if not mime_type or not (mime_type.startswith("image/") or mime_type == "application/pdf"):
+                raise ValueError(f"{file.filename}: only image and PDF files are supported.")
+            uploads.append((file.filename, mime_type, await read_upload(file)))
+        job = extraction_jobs.submit(uploads)
+        return {"success": True, "data": job.summary()}
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start extraction job: {e}")
+
+
+@app.get("/extraction-jobs/{job_id}")
+async def get_extraction_job(job_id: str):
+    """Status of an extraction job and of each of its pages."""
+    job = extraction_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found or expired.")
+    return {"success": True, "data": job.summary()}
+
+
+@app.get("/extraction-jobs/{job_id}/result")
+async def get_extraction_job_result(job_id: str):
+    """The merged WarrantyClaimData of a completed job; 409 while it is still running."""
+    job = extraction_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found or expired.")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Extraction job failed: {job.error}")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Extraction job is {job.status} "
+                                                    f"({sum(p.status in ('done', 'failed') for p in job.pages)}/{len(job.pages)} pages).")
+    return ORJSONResponse(content=job.result.model_dump())
+
+
 # --- MODIFIED ENDPOINT ---
 @app.post("/predict-from-json/", response_model=DirectPredictionResponse)
 async def predict_from_json(claim_data: WarrantyClaimData):
@@ -285,15 +420,18 @@ async def create_response(data: PromptInput):
         #         type= ResponseType.chart,
         #         content= "{\n  \"title\": \"Warranty Claim Counts by Car Model\",\n  \"config\": \"{ type: 'bar', data: { labels: ['MAZDA3_HATCHBACK','MAZDA3_SEDAN','MAZDA_CX_30','MAZDA_CX_5','MAZDA_CX_50','MAZDA_CX_50_HYBRID','MAZDA_CX_70','MAZDA_CX_70_PHEV','MAZDA_CX_90','MAZDA_CX_90_PHEV','MAZDA_MX_5_MIATA','MAZDA_MX_5_MIATA_RF'], datasets: [{ label: 'Claim Count', data: [809,882,831,858,850,806,795,846,878,785,819,841], backgroundColor: ['rgba(75,192,192,0.6)','rgba(54,162,235,0.6)','rgba(255,206,86,0.6)','rgba(255,99,132,0.6)','rgba(153,102,255,0.6)','rgba(255,159,64,0.6)','rgba(201,203,207,0.6)','rgba(0,123,255,0.6)','rgba(40,167,69,0.6)','rgba(220,53,69,0.6)','rgba(23,162,184,0.6)','rgba(108,117,125,0.6)'], borderColor: ['rgba(75,192,192,1)','rgba(54,162,235,1)','rgba(255,206,86,1)','rgba(255,99,132,1)','rgba(153,102,255,1)','rgba(255,159,64,1)','rgba(201,203,207,1)','rgba(0,123,255,1)','rgba(40,167,69,1)','rgba(220,53,69,1)','rgba(23,162,184,1)','rgba(108,117,125,1)'], borderWidth: 1 }] }, options: { responsive: true, maintainAspectRatio: false, plugins: { legend: { position: 'top' }, tooltip: { enabled: true, mode: 'index', intersect: false } }, scales: { x: { title: { display: true, text: 'Car Model' }, ticks: { maxRotation: 45, minRotation: 45 } }, y: { beginAtZero: true, title: { display: true, text: 'Claim Count' } } } } }\"\n}"
         # )
-        openaiAssistant= OpenAIAssistant(model="o4-mini");
         print("Received prompt:", data.prompt)
 
-        resdf=db.get_data_from_ai(data.prompt)  # Ensure dataset is loaded
-        print(type(resdf),print(resdf))
-        # print("Dataset loaded successfully.",resdf.to_string())
-        # Parse the response string into a dictionary
-        print("Generating chart.js code for the provided prompt...")
-        response = azure_client.generate_chart_js_code(data.prompt, resdf)
+        # The chart is built as soon as the rows are in, while the gatekeeper may still be running;
+        # common result shapes are charted locally and only the rest go to the LLM.
+        response = await db.get_data_from_ai(
+            data.prompt,
+            follow_up=lambda rows: chart_or_llm(data.prompt, rows, azure_client.generate_chart_js_code),
+            stage="chart",
+        )
+        if isinstance(response, str):
+            # Rejected by the gatekeeper; pass its reply through.
+            return OutputResponse(type=ResponseType.language, content=response)
         print("Response from AI data provider:", response)
         return response
     except HTTPException as e:
@@ -320,11 +458,13 @@ async def create_response(data: PromptInput):
         # )
 
         print("Received prompt:", data.prompt)
-        resdf= db.get_data_from_ai(data.prompt)  # Ensure dataset is loaded
-        #print("Dataset loaded successfully.",resdf.to_string())
-        # Parse the response string into a dictionary
         print("Generating human readble answer for the provided prompt...")
-        response = openaiAssistant.dataframe_to_natural_language(data.prompt, resdf)
+        response = await db.get_data_from_ai(
+            data.prompt,
+            # OpenAIAssistant is synchronous, so keep it off the event loop.
+            follow_up=lambda rows: asyncio.to_thread(openai_assistant.dataframe_to_natural_language, data.prompt, pd.DataFrame(rows)),
+            stage="chatbot",
+        )
         print("Response from AI data provider:", response)
         return OutputResponse(
             type=ResponseType.language,
@@ -347,7 +487,7 @@ async def create_response(data: PromptInput):
     confidence probabilities.
     """
     try:
-        result = db.get_natural_language_response(data.prompt)
+        result = await db.get_natural_language_response(data.prompt)
         return OutputResponse(
             type=ResponseType.language,
             content=result)
@@ -361,6 +501,74 @@ async def create_response(data: PromptInput):
         print(e)
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
 
+@app.post("/ai-chatbot-sql/stream/")
+async def stream_chatbot_sql(data: PromptInput):
+    """
+    Streaming variant of /ai-chatbot-sql/ over server-sent events: a `table` event with the
+    query result, `token` events with the markdown answer as it is generated, then `done`.
+    """
+    body = stream_answer(
+        "ai-chatbot-sql",
+        get_rows=lambda: db.get_data_from_ai(data.prompt),
+        stream_tokens=lambda rows: db.stream_describe_data(data.prompt, rows),
+    )
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/ai-chatbot/stream/")
+async def stream_chatbot(data: PromptInput):
+    """Streaming variant of /ai-chatbot/; same events as /ai-chatbot-sql/stream/."""
+    body = stream_answer(
+        "ai-chatbot",
+        get_rows=lambda: db.get_data_from_ai(data.prompt),
+        # OpenAIAssistant streams synchronously, so pull its deltas from a worker thread.
+        stream_tokens=lambda rows: iterate_in_threadpool(
+            openai_assistant.stream_dataframe_to_natural_language(data.prompt, pd.DataFrame(rows))
+        ),
+    )
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/ai-session/")
+async def ask_in_session(data: SessionPromptInput):
+    """
+    Conversational variant of /ai-smart-table/. The response carries a sessionId to send with
+    the next question; follow-ups ("only CX-5", "sort by amount", "top 5") are answered from
+    the session's last result, or by editing its SQL, instead of starting over.
+    """
+    try:
+        result = await db.ask_in_session(data.session_id, data.prompt)
+        return {"success": True, "data": result}
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException as e:
+        print(e)
+        raise e
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+
+@app.delete("/ai-session/{session_id}")
+async def end_session(session_id: str):
+    if not db.sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    return {"success": True}
+
+
+@app.get("/llm-metrics/")
+async def get_llm_metrics(format: str = "json"):
+    """
+    Latency/queue-time histograms, tokens, estimated cost, retries and cache hits of model calls,
+    per endpoint, operation and model, and under `features` the counters, latencies and state of
+    everything else (charts, gatekeeper, streams, caches, sandbox, ...). format=prometheus
+    returns the text exposition format.
+    """
+    if format == "prometheus":
+        return Response(content=llm_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+    return {"success": True, "data": llm_metrics.stats()}
+
+
 @app.post("/ai-smart-table/", response_model=OutputTable)
 async def create_response(data: PromptInput):
     """
@@ -369,7 +577,7 @@ async def create_response(data: PromptInput):
     confidence probabilities.
     """
     try:
-        result = db.get_data_from_ai(data.prompt)
+        result = await db.get_data_from_ai(data.prompt)
         return OutputTable(
             type=ResponseType.table,
             content=result)
@@ -386,16 +594,92 @@ async def create_response(data: PromptInput):
 
 
 
-@app.post("/ai-data-card/")
-async def create_response(status_code: StatusRequest):
-    print("status_code: ", status_code)
+def claim_summary_payload(client, status_code: str):
+    summary = get_claim_summary(db=client, status_code=status_code)
+
+    if not summary:
+        raise HTTPException(status_code=404, detail="No summary data found.")
+
+    return {"success": True, "data": summary}
+
+
+def last_month_claims_payload(client, **filters):
+    claims, next_cursor = get_last_month_claims(client, **filters)
+    return {"success": True, "data": claims, "nextCursor": next_cursor}
+
+
+# Dashboard endpoint -> function building its JSON payload from a database client and the request params.
+DASHBOARD_PAYLOADS = {
+    "ai-data-card": claim_summary_payload,
+    "generate-claim-data": lambda client, year: {"success": True, "data": generate_claim_data_by_year(client, year)},
+    "claim-status-distribution": lambda client, year: {"success": True, "data": get_claim_status_distribution_by_year(client, year)},
+    "forecast-claims": lambda client, **filters: {"success": True, "data": generate_claims_forecast(client, **filters)},
+    "last-month-claims": last_month_claims_payload,
+}
+
+
+def dashboard_response(request: Request, endpoint: str, **params) -> Response:
+    """
+    Serve a dashboard payload from the response cache, answering 304 when the client's ETag
+    is current. The body is sent pre-compressed in the encoding the client accepts.
+    """
+    entry = response_cache.get_or_compute(endpoint, params, lambda: DASHBOARD_PAYLOADS[endpoint](db, **params))
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if entry.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    body = entry.encoded(encoding)
+    if body is not entry.body:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def common_dashboard_requests():
+    """The endpoint/params combinations every dashboard load asks for; warmed ahead of time."""
+    year = datetime.date.today().year
+    requests = [("ai-data-card", {"status_code": code}) for code in ("T", "A", "R", "P")]
+    requests += [("generate-claim-data", {"year": y}) for y in (year, year - 1)]
+    requests += [("claim-status-distribution", {"year": y}) for y in (year, year - 1)]
+    requests += [("forecast-claims", {"start_date": None, "end_date": None, "model": None})]
+    requests += [("last-month-claims", {"limit": RECENT_CLAIMS_DEFAULT_LIMIT, "cursor": None, "status": None, "model": None, "dealer": None})]
+    return requests
+
+
+def warm_dashboard_cache(requests: list):
+    """Build the given (endpoint, params, cache key) payloads; runs in a worker thread on its own connection."""
+    reader = db.reader()
     try:
-        summary = get_claim_summary(db=db, status_code=status_code.status_code)
+        for endpoint, params, key in requests:
+            try:
+                response_cache.warm(endpoint, params, lambda: DASHBOARD_PAYLOADS[endpoint](reader, **params), key=key)
+            except Exception as e:
+                print(f"Failed to warm {endpoint} {params}: {e}")
+    finally:
+        reader.close()
+
+
+async def warm_dashboard_cache_periodically():
+    # Cache keys embed today's date and db.data_version, so a change in either (midnight,
+    # or an ingest/forecast refresh committing to the database) means the common keys are cold.
+    warmed_for = None
+    while True:
+        current = (datetime.date.today(), db.data_version)
+        if current != warmed_for:
+            # Keys are made here, since db.data_version reads db.conn, which belongs to this thread;
+            # the payloads themselves (including forecast fits) are built off the event loop.
+            requests = [(endpoint, params, response_cache.make_key(endpoint, params))
+                        for endpoint, params in common_dashboard_requests()]
+            await asyncio.to_thread(warm_dashboard_cache, requests)
+            warmed_for = current
+        await asyncio.sleep(CACHE_WARM_CHECK_SECONDS)
 
-        if not summary:
-            raise HTTPException(status_code=404, detail="No summary data found.")
 
-        return JSONResponse(status_code=200, content={"success": True, "data": summary})
+@app.post("/ai-data-card/")
+async def create_response(status_code: StatusRequest, request: Request):
+    print("status_code: ", status_code)
+    try:
+        return dashboard_response(request, "ai-data-card", status_code=status_code.status_code)
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(ve)}")
@@ -405,15 +689,14 @@ async def create_response(status_code: StatusRequest):
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @app.post("/generate-claim-data/")
-async def generate_claim_data(payload: YearRequest):
+async def generate_claim_data(payload: YearRequest, request: Request):
     try:
         year = payload.year
 
         if not (1900 <= year <= 2100):
             raise ValueError("Invalid year. Must be between 1900 and 2100.")
 
-        output = generate_claim_data_by_year(db, year)
-        return {"success": True, "data": output}
+        return dashboard_response(request, "generate-claim-data", year=year)
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -422,15 +705,14 @@ async def generate_claim_data(payload: YearRequest):
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @app.post("/claim-status-distribution/")
-async def claim_status_distribution(payload: YearRequest):
+async def claim_status_distribution(payload: YearRequest, request: Request):
     try:
         year = payload.year
 
         if not (1900 <= year <= 2100):
             raise ValueError("Invalid year. Must be between 1900 and 2100.")
 
-        output = get_claim_status_distribution_by_year(db, year)
-        return {"success": True, "data": output}
+        return dashboard_response(request, "claim-status-distribution", year=year)
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -440,24 +722,51 @@ async def claim_status_distribution(payload: YearRequest):
     
 
 @app.get("/forecast-claims/")
-async def get_forecast_claims():
+async def get_forecast_claims(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    model: Optional[str] = None,
+):
+    """Daily actual vs predicted claims and parts, optionally limited to a YYYY-MM-DD range and one model."""
     try:
-        forecast = generate_claims_forecast(db)
-        return {"success": True, "data": forecast}
+        return dashboard_response(request, "forecast-claims", start_date=start_date, end_date=end_date, model=model)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
     
     
 
 @app.get("/last-month-claims/")
-async def get_lastmonth_data():
+async def get_lastmonth_data(
+    request: Request,
+    limit: int = RECENT_CLAIMS_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    model: Optional[str] = None,
+    dealer: Optional[str] = None,
+):
+    """
+    Keyset-paginated feed of the last 30 days of claims, newest first. Pass the returned
+    nextCursor back as `cursor` for the following page; it is null on the last page.
+    """
     try:
-        forecast = get_last_month_claims(db)
-        return {"success": True, "data": forecast}
+        return dashboard_response(
+            request, "last-month-claims",
+            limit=limit, cursor=cursor, status=status, model=model, dealer=dealer
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
-    
-    
+
+
+@app.delete("/ai-sql-cache/")
+async def purge_sql_cache(prompt: Optional[str] = None, expired_only: bool = False):
+    """Drop cached prompt-to-SQL entries: one prompt, only the expired ones, or all of them."""
+    removed = db.sql_cache.purge(prompt=prompt, expired_only=expired_only)
+    return {"success": True, "data": {"removed": removed}}
 
 
 
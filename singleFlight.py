@@ -0,0 +1,59 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# Coalesces concurrent identical work. The first caller for a (stage, key) pair starts the
+# work; callers arriving while it is in flight await the same task instead of starting their
+# own, and all of them get its result (or exception). Nothing is kept once the task finishes,
+# so this is not a cache. A caller that is cancelled (e.g. a disconnected client) only stops
+# waiting; the shared task is cancelled when its last waiter leaves.
+
+
+class _InFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Tuple[str, Hashable], _InFlight] = {}
+        self._executed: Dict[str, int] = defaultdict(int)
+        self._shared: Dict[str, int] = defaultdict(int)
+
+    async def run(self, stage: str, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        call_key = (stage, key)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = _InFlight(asyncio.ensure_future(work()))
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda _: self._forget(call_key, call))
+            self._executed[stage] += 1
+        else:
+            self._shared[stage] += 1
+            print(f"♻️ Joined in-flight '{stage}' for {key!r}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, call_key, call: _InFlight):
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+
+    def stats(self) -> dict:
+        stages = sorted(set(self._executed) | set(self._shared))
+        return {
+            "inFlight": len(self._calls),
+            "duplicateCallsSaved": sum(self._shared.values()),
+            "stages": {
+                stage: {"executed": self._executed[stage], "shared": self._shared[stage]}
+                for stage in stages
+            },
+        }
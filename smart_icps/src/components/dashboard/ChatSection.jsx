@@ -19,47 +19,81 @@ const ChatSection = ({ height = '500px' }) => {
   const [isLoading, setIsLoading] = useState(false);
   const scrollAreaRef = useRef(null);
 
-  const getAIResponse = async (userInput) => {
-    try {
-      const response = await fetch(`${config.API_BASE_URL}/ai-chatbot-sql/`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ prompt: userInput })
-      });
-  
-      if (!response.ok) {
-        throw new Error(`API Error: ${response.status}`);
+  // Markdown preview of the result rows, shown while the answer is still streaming in.
+  const rowsToMarkdown = (rows, maxRows = 10) => {
+    if (!Array.isArray(rows) || rows.length === 0) return '';
+    const columns = Object.keys(rows[0]);
+    const lines = [
+      `| ${columns.join(' | ')} |`,
+      `| ${columns.map(() => '---').join(' | ')} |`,
+      ...rows.slice(0, maxRows).map(row => `| ${columns.map(col => row[col] ?? '').join(' | ')} |`),
+    ];
+    if (rows.length > maxRows) lines.push(`\n_${rows.length - maxRows} more rows_`);
+    return lines.join('\n') + '\n\n';
+  };
+
+  // Reads the server-sent events of /ai-chatbot-sql/stream/ and reports the message text so far.
+  const streamAIResponse = async (userInput, onUpdate) => {
+    const response = await fetch(`${config.API_BASE_URL}/ai-chatbot-sql/stream/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ prompt: userInput })
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`API Error: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let table = '';
+    let answer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'table') table = rowsToMarkdown(data.content);
+        else if (event === 'token') answer += data.content;
+        else if (event === 'error') answer = answer || "Sorry, there was an error contacting the AI server.";
+        onUpdate(table + answer);
       }
-  
-      const data = await response.json();
-      
-      // Assuming the API returns { message: "some response" }
-      return data.content || "I couldn't understand the response.";
-    } catch (error) {
-      console.error("Error fetching AI response:", error);
-      return "Sorry, there was an error contacting the AI server.";
     }
+    return table + answer;
   };
-  
+
 
   const handleSend = async () => {
     if (input.trim() === '' || isLoading) return;
 
     const userMessage = { id: Date.now(), role: 'user', content: input };
+    const aiMessageId = Date.now() + 1;
     setMessages(prev => [...prev, userMessage]);
     setInput('');
     setIsLoading(true);
 
+    const updateAIMessage = (content) => {
+      setIsLoading(false);
+      setMessages(prev => prev.some(m => m.id === aiMessageId)
+        ? prev.map(m => (m.id === aiMessageId ? { ...m, content } : m))
+        : [...prev, { id: aiMessageId, role: 'assistant', content }]);
+    };
+
     try {
-      const aiResponseContent = await getAIResponse(input);
-      const aiMessage = { id: Date.now() + 1, role: 'assistant', content: aiResponseContent };
-      setMessages(prev => [...prev, aiMessage]);
+      const content = await streamAIResponse(input, updateAIMessage);
+      if (!content) updateAIMessage("I couldn't understand the response.");
     } catch (error) {
         console.error("API Error:", error);
-        const errorMessage = { id: Date.now() + 1, role: 'assistant', content: "Sorry, something went wrong. Please try again." };
-        setMessages(prev => [...prev, errorMessage]);
+        updateAIMessage("Sorry, something went wrong. Please try again.");
     } finally {
         setIsLoading(false);
     }
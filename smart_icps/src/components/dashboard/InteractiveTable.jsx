@@ -28,21 +28,30 @@ const InteractiveTable = () => {
     const [activeFilters, setActiveFilters] = useState([]);
     const [isFilterOpen, setIsFilterOpen] = useState(false);
 
-    // Fetch data from the API on component mount
+    const [nextCursor, setNextCursor] = useState(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+    // The feed is keyset-paginated: each response carries the cursor for the next page.
+    const fetchClaimsPage = async (cursor) => {
+        const params = new URLSearchParams();
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${config.API_BASE_URL}/last-month-claims/?${params.toString()}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        setNextCursor(data.nextCursor || null);
+        // Add a unique ID to each row for React keys
+        return data.data.map((item, index) => ({ ...item, id: item.claimId ?? item.vincd + '-' + index }));
+    };
+
+    // Fetch the first page from the API on component mount
     useEffect(() => {
         const fetchClaims = async () => {
             setIsLoading(true);
             setError(null);
             try {
-                const response = await fetch(`${config.API_BASE_URL}/last-month-claims/`);
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                const data = await response.json();
-                console.log("Fetched claims data:", data);
-                // Add a unique ID to each row for React keys
-                const dataWithIds = data.data.map((item, index) => ({ ...item, id: item.vincd + '-' + index }));
-                setClaimsData(dataWithIds);
+                setClaimsData(await fetchClaimsPage(null));
             } catch (e) {
                 setError(e.message);
                 console.error("Failed to fetch claims data:", e);
@@ -54,6 +63,21 @@ const InteractiveTable = () => {
         fetchClaims();
     }, []);
 
+    // Load the next page when the table is scrolled near its bottom
+    const handleTableScroll = async (e) => {
+        const { scrollTop, clientHeight, scrollHeight } = e.currentTarget;
+        if (!nextCursor || isLoadingMore || scrollTop + clientHeight < scrollHeight - 200) return;
+        setIsLoadingMore(true);
+        try {
+            const page = await fetchClaimsPage(nextCursor);
+            setClaimsData(prev => [...prev, ...page]);
+        } catch (e) {
+            console.error("Failed to fetch more claims:", e);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     const allStatuses = useMemo(() => [...new Set(claimsData.map(item => item.status))], [claimsData]);
 
     // Memoized calculation for filtered and sorted data
@@ -155,7 +179,7 @@ const InteractiveTable = () => {
 
         return (
             <>
-                <div className="overflow-auto h-[70vh] border-b border-gray-200">
+                <div className="overflow-auto h-[70vh] border-b border-gray-200" onScroll={handleTableScroll}>
                     <table className="w-full text-left">
                         <thead className="bg-gray-900 sticky top-0 z-10">
                             <tr>
@@ -213,7 +237,7 @@ const InteractiveTable = () => {
 
                 <div className="p-4 flex justify-start items-center bg-gray-50 rounded-b-lg">
                     <p className="text-sm text-gray-600">
-                        Showing <span className="font-medium">{processedData.length}</span> results.
+                        Showing <span className="font-medium">{processedData.length}</span> results{nextCursor ? ', scroll for more' : ''}.
                     </p>
                 </div>
             </>
@@ -1,29 +1,127 @@
 import sqlite3
+import datetime
+import hashlib
+import asyncio
+import os
+import time
 from openai import OpenAI
 import pandas as pd
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
 import re
-from azureAiClient import AzureAiClient
+from azureAiClient import AsyncAzureAiClient
+from claimsCube import CUBE_TABLE, SOURCE_TABLE, claims_cube_is_current, ensure_claims_cube, rebuild_claims_cube
+from claimParts import PARTS_PENDING_TABLE, PARTS_STATE_TABLE, PARTS_TABLE, rebuild_claim_parts, sync_claim_parts
+from forecastEngine import FORECAST_TABLE
+from promptSqlCache import CACHE_TABLE as PROMPT_SQL_CACHE_TABLE, PromptSqlCache, normalize_prompt
+from resultCache import QueryResultCache, is_cacheable, is_read_only, read_only_authorizer
+from contextPacker import pack_rows
+from answerTemplates import answer_stats, render_answer
+from schemaSummary import SUMMARY_TABLE as SCHEMA_SUMMARY_TABLE, SchemaSummary
+from gatekeeper import LOG_TABLE as GATEKEEPER_LOG_TABLE, Gatekeeper
+from singleFlight import SingleFlight
+from resultSessions import SessionStore, is_follow_up, refine_rows
+from gatekeeper import GREETING, rejection_reply
+from queryBackend import MIRROR_CHANGES_TABLE, analytics_stats, make_analytics_backend
+from llmMetrics import llm_metrics
+from extractionCache import CACHE_TABLE as EXTRACTION_CACHE_TABLE
+
+# Indexes backing the keyset-paginated recent-claims feed. They are dropped with the table
+# when warrenty_table is replaced, so they are re-created after every upload.
+CLAIM_INDEXES = {
+    "idx_warrenty_rpr_dt": "RPR_DT",
+    "idx_warrenty_sts_rpr_dt": "STS_CD, RPR_DT",
+    "idx_warrenty_crln_rpr_dt": "CRLN_CD, RPR_DT",
+    "idx_warrenty_dlr_rpr_dt": "DLR_CD, RPR_DT",
+}
+
+# Bookkeeping tables the app maintains itself; they are left out of the schema shown to the LLM.
+SYSTEM_TABLES = (CUBE_TABLE, PARTS_TABLE, PARTS_STATE_TABLE, PARTS_PENDING_TABLE, FORECAST_TABLE, PROMPT_SQL_CACHE_TABLE,
+                 SCHEMA_SUMMARY_TABLE, GATEKEEPER_LOG_TABLE, EXTRACTION_CACHE_TABLE, MIRROR_CHANGES_TABLE)
+
+# Nearly every question passes the gatekeeper, so by default it runs concurrently with SQL
+# generation instead of in front of it; set SPECULATIVE_GATEKEEPING=false for the serial flow.
+SPECULATIVE_GATEKEEPING = os.getenv("SPECULATIVE_GATEKEEPING", "true").lower() in ("1", "true", "yes")
+# How the database is described to the SQL generator: "summary" (statistics of the tables the
+# question mentions, see schemaSummary.py) or "full" (structure and first rows of every table).
+SQL_PROMPT_SCHEMA = os.getenv("SQL_PROMPT_SCHEMA", "summary")
 
 class SQLiteClient:
     def __init__(self, db_name: str = 'mydb.db'):
+        self.db_name = db_name
         self.conn = sqlite3.connect(db_name)
         self.cursor = self.conn.cursor()
-        self.client = AzureAiClient()
+        self.client = AsyncAzureAiClient.shared()
+        # Bumped on every write made through this client; see data_version.
+        self._write_version = 0
+        ensure_claims_cube(self.conn)
+        sync_claim_parts(self.conn)
+        self.ensure_claim_indexes()
+        self.sql_cache = PromptSqlCache(self.conn)
+        self.result_cache = QueryResultCache()
+        self.schema_summary = SchemaSummary(self.conn, exclude=SYSTEM_TABLES)
+        self.gatekeeper = Gatekeeper(self.conn, self.client, self.schema_summary.vocabulary)
+        self.inflight = SingleFlight()
+        self.sessions = SessionStore()
+        self.analytics = make_analytics_backend(db_name, lambda: self.data_version, exclude=SYSTEM_TABLES)
 
-    def query(self, sql: str):
-        return self.conn.execute(sql).fetchall()
+    def query(self, sql: str, params: tuple = ()):
+        return self.conn.execute(sql, params).fetchall()
 
     def list_tables(self):
         self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         return [row[0] for row in self.cursor.fetchall()]
     
     def execute(self, sql: str):
-        cursor = self.conn.execute(sql)
-        rows = cursor.fetchall()
+        # Read-only statements are answered from the result cache until the data version or the date moves.
+        read_only = is_read_only(self.conn, sql)
+        cacheable = read_only and is_cacheable(sql)
+        if cacheable:
+            cached = self.result_cache.get(sql, self.result_version)
+            if cached is not None:
+                return cached
+        if read_only:
+            result = self._execute_analytics(sql)
+            if result is not None:
+                if cacheable:
+                    self.result_cache.put(sql, self.result_version, result)
+                return result
+
+        started = time.perf_counter()
+        if read_only:
+            # Enforced as well as checked: SQLite refuses to prepare anything but reads.
+            self.conn.set_authorizer(read_only_authorizer)
+            try:
+                cursor = self.conn.execute(sql)
+                rows = cursor.fetchall()
+            finally:
+                self.conn.set_authorizer(None)
+        else:
+            cursor = self.conn.execute(sql)
+            rows = cursor.fetchall()
+        if not read_only:
+            self._write_version += 1
         headers = [description[0] for description in cursor.description]
         # Convert rows to list of dictionaries
         result = [dict(zip(headers, row)) for row in rows]
+        if read_only:
+            analytics_stats.observe("sqlite", (time.perf_counter() - started) * 1000)
+        if cacheable:
+            self.result_cache.put(sql, self.result_version, result)
+        return result
+
+    def _execute_analytics(self, sql: str) -> Optional[List[dict]]:
+        """Rows of a read-only query from the analytical backend, or None if it should run on SQLite."""
+        translated = self.analytics.translate(sql)
+        if translated is None:
+            return None
+        started = time.perf_counter()
+        try:
+            result = self.analytics.execute(translated)
+        except Exception as e:
+            analytics_stats.count(fallbacks=1)
+            print(f"⚠️ {self.analytics.name} could not run the query ({e}); falling back to SQLite.")
+            return None
+        analytics_stats.observe(self.analytics.name, (time.perf_counter() - started) * 1000)
         return result
         
     def get_table_structure(self, table_name: str):
@@ -45,16 +143,49 @@ class SQLiteClient:
         except sqlite3.Error as e:
             return f"⚠️ Error: {e}"
 
+    @property
+    def data_version(self) -> tuple:
+        """
+        Changes whenever the database contents may have changed: writes through this
+        client bump the local counter, and PRAGMA data_version moves when another
+        connection commits. Use it to key caches derived from table data.
+        """
+        return self._write_version, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @property
+    def result_version(self) -> tuple:
+        """data_version plus today's date, for results of SQL that may use date('now')."""
+        return self.data_version, datetime.date.today().isoformat()
+
+    def ensure_claim_indexes(self):
+        if SOURCE_TABLE not in self.list_tables():
+            return
+        for index_name, columns in CLAIM_INDEXES.items():
+            try:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {SOURCE_TABLE} ({columns})")
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not create index '{index_name}': {e}")
+        self.conn.commit()
+
+    def has_claims_cube(self) -> bool:
+        return claims_cube_is_current(self.conn)
+
     def close(self):
+        self.analytics.close()
         self.conn.commit()
         self.conn.close()
 
+    def reader(self) -> "SQLiteReader":
+        """A connection of its own with the read helpers, for work done in another thread."""
+        return SQLiteReader(self.db_name)
+
     def upload_excel(
         self,
         excel_path: str,
         sheet_names: List[str] = None,
         table_name: str = None,
-        force_types: dict = None  # Example: {'Invoice_Date': 'TEXT', 'Amount': 'REAL'}
+        force_types: dict = None,  # Example: {'Invoice_Date': 'TEXT', 'Amount': 'REAL'}
+        if_exists: str = 'replace'  # 'append' to add new claims to an existing table
     ):
 
 
@@ -90,9 +221,23 @@ class SQLiteClient:
                             print(f"❌ Failed to convert column '{col}' to {dtype}: {e}")
 
             # Write DataFrame to SQLite
-            df.to_sql(clean_sheet_name, self.conn, if_exists='replace', index=False)
+            df.to_sql(clean_sheet_name, self.conn, if_exists=if_exists, index=False)
             print(f"✅ Sheet '{sheet_name}' uploaded to table '{clean_sheet_name}'.")
 
+            # Replacing the claims table drops the rollup trigger, so rebuild the cube;
+            # appended rows were already folded in by the trigger.
+            if clean_sheet_name == SOURCE_TABLE:
+                if if_exists == 'replace':
+                    rebuild_claims_cube(self.conn)
+                    rebuild_claim_parts(self.conn)
+                else:
+                    ensure_claims_cube(self.conn)
+                    sync_claim_parts(self.conn)
+                self.ensure_claim_indexes()
+            self._write_version += 1
+            self.result_cache.clear()
+            self.schema_summary.refresh([clean_sheet_name])
+
             # Fetch and return DDL
             self.cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{clean_sheet_name}';")
             ddl = self.cursor.fetchone()[0]
@@ -100,42 +245,52 @@ class SQLiteClient:
 
         return ddl_statements
 
+    def schema_hash(self) -> str:
+        """Fingerprint of the user-table DDL; generated SQL is only reused against the schema it was written for."""
+        rows = self.conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY name"
+        ).fetchall()
+        ddl = "\n".join(f"{name}:{sql}" for name, sql in rows if name not in SYSTEM_TABLES)
+        return hashlib.sha256(ddl.encode("utf-8")).hexdigest()[:16]
+
     def get_all_details(self):
         output = ""
         for i in self.list_tables():
+            if i in SYSTEM_TABLES:
+                continue
             output += f"Table name: {i}\n"
             output += f"Table structure: [ {self.get_table_structure(i)} ]\n"
             output += f"First 5 rows: \n {self.get_first_rows(i)}\n"
             output += "-" * 32 + "\n"
         return output
 
-    def get_data_from_ai(self, prompt: str):
-        is_valid, reply = self.client.gatekeep_question(prompt)
-        if not is_valid:
-            return reply
+    def describe_schema(self, prompt: str) -> str:
+        if SQL_PROMPT_SCHEMA == "full":
+            return self.get_all_details()
+        return self.schema_summary.for_prompt(prompt)
+
+    def sql_generation_messages(self, prompt: str) -> list:
         system_prompt = f"""
         You are an expert writing query for a sqlite database.
         your task is to write a query to answer the user's question.
-        You will be provided with the data's schema, a sample of the data (the first 5 rows), and a user's question.
+        You will be provided with the data's schema, a sample or statistics of its values, and a user's question.
         You will return the query in a string format.
         Rules:
             - Use only existing tables and columns.
             - Use SELECT only (no INSERT/UPDATE/DELETE).
             - Return only the SQL text (no markdown, backticks, comments, or explanation).
-        database structure: {self.get_all_details()}
+        database structure: {self.describe_schema(prompt)}
         """
         user_prompt = f"""
             User prompt: {prompt}
         """
-        content = self.client.send_system_and_user_message(
-            model="o4-mini",
-            messeges=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-        )
-        
-       
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    @staticmethod
+    def clean_generated_sql(content: str) -> str:
         # Strip code fences if present (safer than removeprefix/removesuffix)
         generated_code = re.sub(r'^```(?:sql)?\s*|\s*```$', '', content, flags=re.IGNORECASE).strip()
 
@@ -152,27 +307,281 @@ class SQLiteClient:
         print(generated_code)
         print("-----------------------------\n")  
 
+        return generated_code
+
+    async def generate_sql(self, prompt: str) -> str:
+        content = await self.client.send_system_and_user_message(
+            model="o4-mini",
+            messeges=self.sql_generation_messages(prompt),
+            operation="sql",
+        )
+        return self.clean_generated_sql(content)
+
+    async def get_data_from_ai(self, prompt: str, follow_up: Optional[Callable[[Any], Awaitable[Any]]] = None,
+                               stage: Optional[str] = None):
+        """
+        Answer a question with rows from the database. If `follow_up` is given (e.g. the chart or
+        natural-language LLM call) it is awaited with the rows and its result returned instead.
+        A question the gatekeeper rejects returns the gatekeeper's reply in either case.
+
+        Concurrent calls for the same question share one gatekeeper/SQL/query run, and calls
+        with the same `stage` name (e.g. "chart") also share one follow-up.
+        """
+        key = normalize_prompt(prompt)
+        fetched = await self.inflight.run("rows", key, lambda: self._fetch_rows(prompt))
+        if isinstance(fetched, str):
+            return fetched
+        result, verdict, _ = fetched
+
+        answer = None
+        if follow_up:
+            run_follow_up = (lambda: self.inflight.run(stage, key, lambda: follow_up(result))) if stage \
+                else (lambda: follow_up(result))
+            answer = asyncio.ensure_future(run_follow_up())
+        if verdict is not None:
+            # Speculative run: the follow-up started before the gatekeeper's verdict was in. The
+            # verdict is shared with other callers, so a cancelled caller must not cancel it.
+            try:
+                is_valid, reply = await asyncio.shield(verdict)
+            except BaseException:
+                if answer:
+                    answer.cancel()
+                raise
+            if not is_valid:
+                if answer:
+                    answer.cancel()
+                return reply
+        return await answer if answer else result
+
+    async def get_data_and_sql_from_ai(self, prompt: str):
+        """get_data_from_ai without a follow-up, returning (rows, sql) or (the gatekeeper's reply, None)."""
+        fetched = await self.inflight.run("rows", normalize_prompt(prompt), lambda: self._fetch_rows(prompt))
+        if isinstance(fetched, str):
+            return fetched, None
+        result, verdict, sql = fetched
+        if verdict is not None:
+            is_valid, reply = await asyncio.shield(verdict)
+            if not is_valid:
+                return reply, None
+        return result, sql
+
+    def refine_sql_messages(self, previous_prompt: str, previous_sql: str, follow_up: str) -> list:
+        system_prompt = f"""
+        You are an expert writing query for a sqlite database.
+        The user asked a question, got the result of the query below, and now asks a follow-up.
+        Rewrite the query so it answers the follow-up, changing as little as possible.
+        Rules:
+            - Use only existing tables and columns.
+            - Use SELECT only (no INSERT/UPDATE/DELETE).
+            - Return only the SQL text (no markdown, backticks, comments, or explanation).
+        database structure: {self.describe_schema(previous_prompt + " " + follow_up)}
+        """
+        user_prompt = f"""
+            Previous question: {previous_prompt}
+            Previous query: {previous_sql}
+            Follow-up: {follow_up}
+        """
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    async def refine_sql(self, previous_prompt: str, previous_sql: str, follow_up: str) -> str:
+        content = await self.client.send_system_and_user_message(
+            model="o4-mini",
+            messeges=self.refine_sql_messages(previous_prompt, previous_sql, follow_up),
+            operation="refine_sql",
+        )
+        return self.clean_generated_sql(content)
+
+    async def ask_in_session(self, session_id: Optional[str], prompt: str) -> dict:
+        """
+        Answer a question within a conversation. Follow-ups are applied to the session's last
+        result when possible, otherwise to its SQL; anything else goes through get_data_from_ai.
+        """
+        session = self.sessions.get(session_id)
+        rows, sql, source = None, None, "new"
+        columns = session.rows[0].keys() if session is not None and session.rows and isinstance(session.rows[0], dict) else ()
+        if session is not None and is_follow_up(prompt, session.prompt, columns):
+            if GREETING.match(prompt):
+                return {"sessionId": session_id, "reply": rejection_reply(prompt), "source": "rejected"}
+            if session.complete:
+                rows = refine_rows(session.rows, prompt)
+            if rows is not None:
+                sql, source = session.sql, "session"
+                print(f"♻️ Answered follow-up from session {session_id} ({len(session.rows)} -> {len(rows)} rows).")
+            elif session.sql:
+                # An edit of the previous SQL is a new query, so it is gatekept like one.
+                gate = asyncio.create_task(self.gatekeeper.gatekeep(f"{session.prompt}; {prompt}"))
+                try:
+                    sql = await self.refine_sql(session.prompt, session.sql, prompt)
+                except BaseException:
+                    gate.cancel()
+                    raise
+                is_valid, reply = await gate
+                if not is_valid:
+                    return {"sessionId": session_id, "reply": reply, "source": "rejected"}
+                if not is_read_only(self.conn, sql):
+                    raise ValueError("Refined query is not a SELECT statement.")
+                rows, source = self.execute(sql), "refined-sql"
+
+        if rows is None:
+            rows, sql = await self.get_data_and_sql_from_ai(prompt)
+            if isinstance(rows, str):
+                return {"sessionId": session_id, "reply": rows, "source": "rejected"}
+
+        # A refinement keeps the conversation's original question as context for the next one.
+        context_prompt = f"{session.prompt}; {prompt}" if source != "new" else prompt
+        session_id = self.sessions.put(session_id, context_prompt, sql if source != "session" else session.sql, rows)
+        self.sessions.record(source)
+        return {"sessionId": session_id, "source": source, "sql": sql, "rows": rows}
+
+    async def _fetch_rows(self, prompt: str):
+        """
+        The gatekeeper's reply for a rejected question, otherwise (rows, verdict, sql) where verdict
+        is None when the question is already validated, or a task resolving to (is_valid, reply)
+        when the rows were produced speculatively ahead of the gatekeeper.
+        """
+        # Questions seen before reuse their validated SQL, skipping both LLM round trips.
+        schema_hash = self.schema_hash()
+        cached_sql = self.sql_cache.get(prompt, schema_hash)
+        if cached_sql:
+            print("♻️ Reusing cached SQL for prompt:", cached_sql)
+            llm_metrics.record_cache_hit("sql", "o4-mini")
+            try:
+                return self.execute(cached_sql), None, cached_sql
+            except sqlite3.Error as e:
+                print(f"⚠️ Cached SQL failed ({e}); regenerating.")
+                self.sql_cache.purge(prompt)
+
+        if SPECULATIVE_GATEKEEPING:
+            return await self._fetch_rows_speculatively(prompt, schema_hash)
+
+        is_valid, reply = await self.gatekeeper.gatekeep(prompt)
+        if not is_valid:
+            return reply
+
+        generated_code = await self.generate_sql(prompt)
         result = self.execute(generated_code)
+        self._remember_sql(prompt, schema_hash, generated_code)
+        return result, None, generated_code
 
-        return result
-    
-    def get_natural_language_response(self, prompt: str):
-        data=self.get_data_from_ai(prompt)
-        messages = [
+    async def _fetch_rows_speculatively(self, prompt: str, schema_hash: str):
+        """
+        _fetch_rows with the gatekeeper running alongside SQL generation and the query. The
+        verdict is only awaited by get_data_from_ai before anything is returned, so a valid
+        question costs roughly one LLM latency less. Work for a rejected question is cancelled.
+        """
+        gate = asyncio.create_task(self.gatekeeper.gatekeep(prompt))
+        sql_call = asyncio.create_task(
+            self.client.send_system_and_user_message(messeges=self.sql_generation_messages(prompt), model="o4-mini",
+                                                     operation="sql")
+        )
+
+        try:
+            done, _ = await asyncio.wait({gate, sql_call}, return_when=asyncio.FIRST_COMPLETED)
+            if gate in done and not gate.result()[0]:
+                sql_call.cancel()
+                return gate.result()[1]
+
+            generated_code = self.clean_generated_sql(await sql_call)
+            # Only reads run ahead of the verdict.
+            if not is_read_only(self.conn, generated_code):
+                is_valid, reply = await gate
+                if not is_valid:
+                    return reply
+            result = self.execute(generated_code)
+        except asyncio.CancelledError:
+            sql_call.cancel()
+            gate.cancel()
+            raise
+        except Exception:
+            sql_call.cancel()
+            # Off-topic questions tend to produce unusable SQL; the gatekeeper's reply wins.
+            is_valid, reply = await gate
+            if not is_valid:
+                return reply
+            raise
+
+        async def confirm():
+            is_valid, reply = await gate
+            if is_valid:
+                self._remember_sql(prompt, schema_hash, generated_code)
+            else:
+                print("🚫 Gatekeeper rejected the prompt; discarding speculative results.")
+            return is_valid, reply
+
+        return result, asyncio.create_task(confirm()), generated_code
+
+    def _remember_sql(self, prompt: str, schema_hash: str, generated_code: str):
+        if is_read_only(self.conn, generated_code):
+            self.sql_cache.put(prompt, schema_hash, generated_code)
+
+    @staticmethod
+    def describe_data_messages(prompt: str, data) -> list:
+        return [
             {"role": "developer", "content": "You are a data analyst who explains datasets in plain English based on user's question, make sure you return output in markdown format."},
-            {"role": "user", "content": f"Question:{prompt}\n\nData:\n{data}"}
+            {"role": "user", "content": f"Question:{prompt}\n\nData:\n{pack_rows(data, label='answer').text}"}
         ]
 
-        response =self.client.send_system_and_user_message(
+    async def describe_data(self, prompt: str, data) -> str:
+        response = await self.client.send_system_and_user_message(
             model="gpt-4o-mini",
-            messeges=messages,
-            temperature=0.3
+            messeges=self.describe_data_messages(prompt, data),
+            temperature=0.3,
+            operation="answer",
         )
 
         return response
+
+    async def answer_data(self, prompt: str, data) -> str:
+        """Templated answer for empty, single-value or tiny results; the LLM's explanation otherwise."""
+        answer = render_answer(prompt, data)
+        answer_stats.count(templated=int(answer is not None), llm=int(answer is None))
+        if answer is not None:
+            return answer
+        return await self.describe_data(prompt, data)
+
+    def stream_describe_data(self, prompt: str, data) -> AsyncIterator[str]:
+        answer = render_answer(prompt, data)
+        answer_stats.count(templated=int(answer is not None), llm=int(answer is None))
+        if answer is not None:
+            async def templated():
+                yield answer
+            return templated()
+        return self.client.stream_system_and_user_message(
+            model="gpt-4o-mini",
+            messeges=self.describe_data_messages(prompt, data),
+            operation="answer",
+        )
+
+    async def get_natural_language_response(self, prompt: str):
+        # A rejected question comes back as the gatekeeper's reply, which is already the answer.
+        return await self.get_data_from_ai(prompt, follow_up=lambda data: self.answer_data(prompt, data), stage="answer")
        
     
 
 
+class SQLiteReader:
+    """
+    The query helpers of SQLiteClient on a separate connection. sqlite3 connections belong to
+    the thread that opened them, so background threads open one of these there.
+    """
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name)
+        # Another connection's data_version numbers mean nothing here, so versions from this
+        # reader never equal anything cached from SQLiteClient.
+        self._identity = object()
+
+    query = SQLiteClient.query
+    has_claims_cube = SQLiteClient.has_claims_cube
 
+    @property
+    def data_version(self) -> tuple:
+        return self._identity, self.conn.execute("PRAGMA data_version").fetchone()[0]
 
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -1,4 +1,6 @@
 from fetchData import generate_claim_data_by_year, generate_claims_forecast, get_claim_status_distribution_by_year, get_claim_summary, get_last_month_claims
+import asyncio
+
 from sqliteClient import SQLiteClient
 
 
@@ -29,16 +31,16 @@ db = SQLiteClient('warrenty2.db')
 # pprint.pprint(output)
 # db.close()
 
-# output = db.get_natural_language_response("How many claims were approved in the last month?");print(output)
-# output = db.get_natural_language_response("What is the total number of rejected claims in July 2025?");print(output)
-# output = db.get_natural_language_response("List all pending claims from the last 7 days.");print(output)
-# output = db.get_natural_language_response("What was the highest claim amount approved in 2025?");print(output)
-# output = db.get_natural_language_response("Show me the daily count of claims for the past 30 days.");print(output)
-# output = db.get_natural_language_response("Which dealer submitted the most claims this year?");print(output)
-# output = db.get_natural_language_response("How many claims were submitted by dealer code 40300?");print(output)
+# output = asyncio.run(db.get_natural_language_response("How many claims were approved in the last month?"));print(output)
+# output = asyncio.run(db.get_natural_language_response("What is the total number of rejected claims in July 2025?"));print(output)
+# output = asyncio.run(db.get_natural_language_response("List all pending claims from the last 7 days."));print(output)
+# output = asyncio.run(db.get_natural_language_response("What was the highest claim amount approved in 2025?"));print(output)
+# output = asyncio.run(db.get_natural_language_response("Show me the daily count of claims for the past 30 days."));print(output)
+# output = asyncio.run(db.get_natural_language_response("Which dealer submitted the most claims this year?"));print(output)
+# output = asyncio.run(db.get_natural_language_response("How many claims were submitted by dealer code 40300?"));print(output)
 
 
-output = db.get_data_from_ai("List all pending claims from the last 7 days.");print(output)
+output = asyncio.run(db.get_data_from_ai("List all pending claims from the last 7 days."));print(output)
 
 
 